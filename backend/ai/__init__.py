@@ -1,10 +1,26 @@
+import importlib
 from .base_client import BaseAIClient
-from .openai_client import OpenAIClient
-from .siliconflow_client import SiliconFlowClient
-from .baidu_client import BaiduClient
-from .alibaba_client import AlibabaClient
-from .zhipu_client import ZhipuClient
+from .stream import StreamDelta
 from .factory import AIClientFactory
+from .singleflight import make_key, singleflight
+from models.config import Config
+
+# 按需导入的客户端类：类名 -> 模块，访问时才导入，与AIClientFactory的注册表一致
+_lazy_clients = {
+    'OpenAICompatibleClient': '.openai_compatible',
+    'OpenAIClient': '.openai_client',
+    'SiliconFlowClient': '.siliconflow_client',
+    'BaiduClient': '.baidu_client',
+    'AlibabaClient': '.alibaba_client',
+    'ZhipuClient': '.zhipu_client'
+}
+
+def __getattr__(name: str):
+    """首次访问客户端类时导入其模块"""
+    module_name = _lazy_clients.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module_name, __name__), name)
 
 # 为了保持向后兼容，提供统一的AIClient类
 class AIClient:
@@ -22,7 +38,7 @@ class AIClient:
             api_key_or_record: API密钥字符串或ApiKey对象
             stream: 是否流式调用
             **kwargs: 其他参数
-            
+        
         Returns:
             AI响应内容或流式响应迭代器
         """
@@ -37,16 +53,49 @@ class AIClient:
                 api_key = api_key_or_record
                 base_url = None
             
-            client = AIClientFactory.create_client(provider, api_key, base_url)
+            client = AIClientFactory.get_client(provider, api_key, base_url)
+            if Config.AI_SINGLEFLIGHT_ENABLED:
+                # 进行中的相同请求共享同一次上游调用，流式响应分发给所有等待者；
+                # 合并的是包含缓存查询的call_api，与未开启合并时一样读写响应缓存和近似缓存
+                key = make_key(provider, model, message, kwargs)
+                if stream:
+                    return singleflight.stream(key, lambda: client.call_api(model, message, stream=True, **kwargs))
+                return singleflight.do(key, lambda: client.call_api(model, message, **kwargs), shared=str)
             return client.call_api(model, message, stream=stream, **kwargs)
         except Exception as e:
             if stream:
                 return None
             else:
                 return f"抱歉，调用{provider} AI API时发生错误: {str(e)}"
+    
+    @staticmethod
+    async def acall_ai_api(provider: str, model: str, message: str, api_key_or_record, stream: bool = False, **kwargs):
+        """
+        统一的异步AI API调用接口，参数与call_ai_api一致
+        
+        Returns:
+            AI响应内容或异步流式响应迭代器
+        """
+        try:
+            if hasattr(api_key_or_record, 'api_key'):
+                api_key = api_key_or_record.api_key
+                base_url = api_key_or_record.base_url
+            else:
+                api_key = api_key_or_record
+                base_url = None
+            
+            client = AIClientFactory.get_client(provider, api_key, base_url)
+            return await client.acall_api(model, message, stream=stream, **kwargs)
+        except Exception as e:
+            if stream:
+                return None
+            else:
+                return f"抱歉，调用{provider} AI API时发生错误: {str(e)}"
 
 __all__ = [
     'BaseAIClient',
+    'StreamDelta',
+    'OpenAICompatibleClient',
     'OpenAIClient',
     'SiliconFlowClient',
     'BaiduClient',
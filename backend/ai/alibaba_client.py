@@ -1,27 +1,12 @@
-import requests
-import json
-from typing import Union, Iterator, Any
+from typing import Iterator, Optional
 from .base_client import BaseAIClient
-
-class MockChoice:
-    """模拟OpenAI的Choice对象"""
-    def __init__(self, content=None, reasoning_content=None):
-        self.delta = MockDelta(content, reasoning_content)
-
-class MockDelta:
-    """模拟OpenAI的Delta对象"""
-    def __init__(self, content=None, reasoning_content=None):
-        self.content = content
-        self.reasoning_content = reasoning_content
-
-class MockStreamChunk:
-    """模拟OpenAI的流式响应块"""
-    def __init__(self, content=None, reasoning_content=None):
-        self.choices = [MockChoice(content, reasoning_content)]
+from .stream import StreamDelta
 
 class AlibabaClient(BaseAIClient):
     """阿里云百炼AI客户端"""
     
+    display_name = '阿里云百炼'
+    
     def __init__(self, api_key: str, base_url: str = None):
         if not base_url:
             raise ValueError("base_url is required for AlibabaClient")
@@ -31,29 +16,17 @@ class AlibabaClient(BaseAIClient):
     def provider_name(self) -> str:
         return 'alibaba'
     
-    def call_sync(self, model: str, message: str, **kwargs) -> str:
-        """
-        同步调用阿里云百炼API
-        
-        Args:
-            model: 模型名称
-            message: 用户消息
-            **kwargs: 其他参数
-            
-        Returns:
-            AI响应内容
-        """
-        params = self._get_default_params()
-        params.update(kwargs)
-        
+    def _build_request(self, model: str, message: str, params: dict, stream: bool) -> dict:
         parameters = {
             "temperature": params.get('temperature', 0.7),
             "max_tokens": params.get('max_tokens', 2048)
         }
+        if stream:
+            parameters['incremental_output'] = True
         
         # 添加stop参数支持
-        if 'stop' in kwargs and kwargs['stop']:
-            parameters['stop'] = kwargs['stop']
+        if params.get('stop'):
+            parameters['stop'] = params['stop']
         
         payload = {
             "model": model,
@@ -67,99 +40,53 @@ class AlibabaClient(BaseAIClient):
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        if stream:
+            headers['X-DashScope-SSE'] = 'enable'
         
-        try:
-            response = requests.post(
-                self.base_url, 
-                json=payload, 
-                headers=headers, 
-                timeout=params.get('timeout', 30)
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            if 'output' in result and 'text' in result['output']:
-                return result['output']['text']
-            else:
-                return "抱歉，模型没有返回有效响应。"
-                
-        except requests.exceptions.RequestException as e:
-            return self._handle_error(e, "阿里云百炼API调用")
-        except Exception as e:
-            return self._handle_error(e, "处理阿里云百炼响应")
+        return {
+            'url': self.base_url,
+            'headers': headers,
+            'json': payload
+        }
+    
+    def _parse_response(self, result: dict) -> Optional[str]:
+        if 'output' in result and 'text' in result['output']:
+            return result['output']['text']
+        return None
     
-    def call_stream(self, model: str, message: str, **kwargs) -> Union[Iterator[MockStreamChunk], None]:
+    def _parse_stream_data(self, data: dict) -> Iterator[StreamDelta]:
         """
-        流式调用阿里云百炼API
+        解析阿里云百炼的流式数据块
         
         Args:
-            model: 模型名称
-            message: 用户消息
-            **kwargs: 其他参数
-            
-        Returns:
-            流式响应迭代器或None
-        """
-        params = self._get_default_params()
-        params.update(kwargs)
-        
-        parameters = {
-            "temperature": params.get('temperature', 0.7),
-            "max_tokens": params.get('max_tokens', 2048),
-            "incremental_output": True
-        }
-        
-        # 添加stop参数支持
-        if 'stop' in kwargs and kwargs['stop']:
-            parameters['stop'] = kwargs['stop']
+            data: 已反序列化的流式数据块
         
-        payload = {
-            "model": model,
-            "input": {
-                "messages": [{"role": "user", "content": message}]
-            },
-            "parameters": parameters
-        }
+        Yields:
+            流式响应增量
+        """
+        output = data.get('output') or {}
+        content = output.get('text')
+        reasoning = output.get('reasoning_content')
+        # 未结束时finish_reason为字符串"null"
+        finish_reason = output.get('finish_reason')
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "X-DashScope-SSE": "enable"
-        }
+        # result_format为message时（QwQ等推理模型），内容位于choices中
+        choices = output.get('choices')
+        if choices:
+            message = choices[0].get('message') or {}
+            content = message.get('content')
+            reasoning = message.get('reasoning_content')
+            finish_reason = choices[0].get('finish_reason')
+        if finish_reason == 'null':
+            finish_reason = None
         
-        try:
-            response = requests.post(
-                self.base_url, 
-                json=payload, 
-                headers=headers, 
-                stream=True, 
-                timeout=params.get('timeout', 30)
-            )
-            response.raise_for_status()
-            return self._parse_stream_response(response)
-        except Exception as e:
-            return None
-    
-    def _parse_stream_response(self, response) -> Iterator[MockStreamChunk]:
-        """
-        解析阿里云百炼的SSE流式响应
+        usage = None
+        if finish_reason and data.get('usage'):
+            usage = {
+                'prompt_tokens': data['usage'].get('input_tokens', 0),
+                'completion_tokens': data['usage'].get('output_tokens', 0),
+                'total_tokens': data['usage'].get('total_tokens', 0)
+            }
         
-        Args:
-            response: requests响应对象
-            
-        Yields:
-            模拟OpenAI格式的流式响应块
-        """
-        for line in response.iter_lines(decode_unicode=True):
-            if line and line.startswith('data:'):
-                try:
-                    data_str = line[5:].strip()
-                    if data_str == '[DONE]':
-                        return
-                    data = json.loads(data_str)
-                    if 'output' in data and 'text' in data['output']:
-                        content = data['output']['text']
-                        if content:
-                            yield MockStreamChunk(content=content)
-                except (json.JSONDecodeError, KeyError):
-                    continue
\ No newline at end of file
+        if content or reasoning or finish_reason:
+            yield StreamDelta(content or None, reasoning or None, finish_reason, usage)
\ No newline at end of file
@@ -1,10 +1,18 @@
-import requests
-from typing import Union, Iterator, Any
+from typing import Iterator, Optional
 from .base_client import BaseAIClient
+from .prompt_cache import normalize_usage, should_cache_prefix
+from .stream import StreamDelta
+
+# 提示词缓存断点，缓存有效期为5分钟，每次命中后刷新
+CACHE_CONTROL = {"type": "ephemeral"}
 
 class AnthropicClient(BaseAIClient):
     """Anthropic AI客户端"""
     
+    display_name = 'Anthropic'
+    # 529表示Anthropic服务过载，同样可以重试
+    retry_options = {'retry_statuses': (429, 500, 502, 503, 504, 529)}
+    
     def __init__(self, api_key: str, base_url: str = None):
         # 如果没有提供base_url，使用默认的Anthropic API地址
         if not base_url:
@@ -15,29 +23,12 @@ class AnthropicClient(BaseAIClient):
     def provider_name(self) -> str:
         return 'anthropic'
     
-    def call_sync(self, model: str, message: str, **kwargs) -> str:
-        """
-        同步调用Anthropic API
-        
-        Args:
-            model: 模型名称
-            message: 用户消息
-            **kwargs: 其他参数
-            
-        Returns:
-            AI响应内容
-        """
-        params = self._get_default_params()
-        params.update(kwargs)
-        
-        url = f"{self.base_url}/v1/messages"
-        
-        # 构建消息列表
-        messages = []
-        
-        # Anthropic API的系统消息是单独的参数
-        system_message = kwargs.get('system_message', '')
-        
+    def _build_request(self, model: str, message: str, params: dict, stream: bool) -> dict:
+        # 构建消息列表，历史对话在前
+        messages = [{
+            "role": item['role'],
+            "content": item['content']
+        } for item in params.get('history') or ()]
         messages.append({
             "role": "user",
             "content": message
@@ -50,128 +41,65 @@ class AnthropicClient(BaseAIClient):
             "temperature": params.get('temperature', 0.7),
             "top_p": params.get('top_p', 1.0)
         }
-        
-        # 如果有系统消息，添加到payload中
-        if system_message:
-            payload["system"] = system_message
-        
-        # 添加stop参数支持（Anthropic使用stop_sequences）
-        if 'stop' in kwargs and kwargs['stop']:
-            payload['stop_sequences'] = kwargs['stop'] if isinstance(kwargs['stop'], list) else [kwargs['stop']]
-        
-        headers = {
-            "x-api-key": self.api_key,
-            "Content-Type": "application/json",
-            "anthropic-version": "2023-06-01"
-        }
-        
-        try:
-            response = requests.post(
-                url, 
-                json=payload, 
-                headers=headers, 
-                timeout=params.get('timeout', 60)
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            if 'content' in result and len(result['content']) > 0:
-                return result['content'][0]['text']
-            else:
-                return "抱歉，模型没有返回有效响应。"
-                
-        except requests.exceptions.RequestException as e:
-            return self._handle_error(e, "Anthropic API调用")
-        except Exception as e:
-            return self._handle_error(e, "Anthropic API调用")
-    
-    def call_stream(self, model: str, message: str, **kwargs) -> Union[Iterator[Any], None]:
-        """
-        流式调用Anthropic API
-        
-        Args:
-            model: 模型名称
-            message: 用户消息
-            **kwargs: 其他参数
-            
-        Returns:
-            流式响应迭代器或None
-        """
-        params = self._get_default_params()
-        params.update(kwargs)
-        
-        url = f"{self.base_url}/v1/messages"
-        
-        # 构建消息列表
-        messages = []
+        if stream:
+            payload['stream'] = True
         
         # Anthropic API的系统消息是单独的参数
-        system_message = kwargs.get('system_message', '')
-        
-        messages.append({
-            "role": "user",
-            "content": message
-        })
-        
-        payload = {
-            "model": model,
-            "max_tokens": params.get('max_tokens', 2048),
-            "messages": messages,
-            "temperature": params.get('temperature', 0.7),
-            "top_p": params.get('top_p', 1.0),
-            "stream": True
-        }
-        
-        # 如果有系统消息，添加到payload中
+        system_message = params.get('system_message', '')
         if system_message:
             payload["system"] = system_message
         
+        # 系统消息和历史对话组成的前缀足够长时设置缓存断点：系统消息和最后一条历史消息各设一个，
+        # 历史对话变化时仍能命中系统消息的缓存
+        if should_cache_prefix(params):
+            if system_message:
+                payload["system"] = [{"type": "text", "text": system_message, "cache_control": CACHE_CONTROL}]
+            if len(messages) > 1:
+                last = messages[-2]
+                last['content'] = [{"type": "text", "text": last['content'], "cache_control": CACHE_CONTROL}]
+        
         # 添加stop参数支持（Anthropic使用stop_sequences）
-        if 'stop' in kwargs and kwargs['stop']:
-            payload['stop_sequences'] = kwargs['stop'] if isinstance(kwargs['stop'], list) else [kwargs['stop']]
+        if params.get('stop'):
+            payload['stop_sequences'] = params['stop'] if isinstance(params['stop'], list) else [params['stop']]
         
-        headers = {
-            "x-api-key": self.api_key,
-            "Content-Type": "application/json",
-            "anthropic-version": "2023-06-01"
+        return {
+            'url': f"{self.base_url}/v1/messages",
+            'headers': {
+                "x-api-key": self.api_key,
+                "Content-Type": "application/json",
+                "anthropic-version": "2023-06-01"
+            },
+            'json': payload
         }
-        
-        try:
-            response = requests.post(
-                url, 
-                json=payload, 
-                headers=headers, 
-                stream=True,
-                timeout=params.get('timeout', 60)
+    
+    def _parse_response(self, result: dict) -> Optional[str]:
+        if 'content' in result and len(result['content']) > 0:
+            return result['content'][0]['text']
+        return None
+    
+    def _parse_stream_data(self, data: dict) -> Iterator[StreamDelta]:
+        event_type = data.get('type')
+        if event_type == 'content_block_delta':
+            delta = data.get('delta', {})
+            if delta.get('type') == 'thinking_delta':
+                # 扩展思考模式下的推理过程
+                if delta.get('thinking'):
+                    yield StreamDelta(reasoning=delta['thinking'])
+            elif delta.get('text'):
+                yield StreamDelta(delta['text'])
+        elif event_type == 'message_start':
+            # 输入token数和缓存token数在message_start中返回，输出token数在message_delta中返回
+            usage = data.get('message', {}).get('usage')
+            if usage:
+                usage = normalize_usage(usage)
+                # message_start中的输出token数只是占位，以message_delta为准
+                usage.pop('completion_tokens', None)
+                yield StreamDelta(usage=usage)
+        elif event_type == 'message_delta':
+            yield StreamDelta(
+                finish_reason=data.get('delta', {}).get('stop_reason'),
+                usage=normalize_usage(data.get('usage'))
             )
-            response.raise_for_status()
-            
-            def stream_generator():
-                for line in response.iter_lines():
-                    if line:
-                        line = line.decode('utf-8')
-                        if line.startswith('data: '):
-                            data = line[6:]
-                            if data.strip() == '[DONE]':
-                                break
-                            try:
-                                import json
-                                chunk = json.loads(data)
-                                if chunk.get('type') == 'content_block_delta':
-                                    delta = chunk.get('delta', {})
-                                    if 'text' in delta:
-                                        yield delta['text']
-                            except json.JSONDecodeError:
-                                continue
-            
-            return stream_generator()
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Anthropic流式API调用错误: {e}")
-            return None
-        except Exception as e:
-            print(f"Anthropic流式API调用异常: {e}")
-            return None
     
     def _get_default_params(self) -> dict:
         """获取默认参数"""
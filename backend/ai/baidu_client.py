@@ -1,31 +1,27 @@
-import requests
-import json
-from typing import Union, Iterator, Any
-from .base_client import BaseAIClient
+from typing import AsyncIterator, Iterator, Optional
 
-class MockChoice:
-    """模拟OpenAI的Choice对象"""
-    def __init__(self, content=None, reasoning_content=None):
-        self.delta = MockDelta(content, reasoning_content)
+import httpx
+import requests
 
-class MockDelta:
-    """模拟OpenAI的Delta对象"""
-    def __init__(self, content=None, reasoning_content=None):
-        self.content = content
-        self.reasoning_content = reasoning_content
+from .baidu_token import baidu_token_manager
+from .base_client import BaseAIClient
+from .stream import StreamDelta
+from .timeouts import StreamDeadline
 
-class MockStreamChunk:
-    """模拟OpenAI的流式响应块"""
-    def __init__(self, content=None, reasoning_content=None):
-        self.choices = [MockChoice(content, reasoning_content)]
+# access_token无效、过期的错误码
+ACCESS_TOKEN_ERRORS = (110, 111)
 
 class BaiduClient(BaseAIClient):
     """百度文心一言AI客户端"""
     
+    display_name = '百度文心一言'
+    
     def __init__(self, api_key: str, base_url: str = None):
         if not base_url:
             raise ValueError("base_url is required for BaiduClient")
         super().__init__(api_key, base_url)
+        # 配置为"API Key:Secret Key"时预先换取access_token，避免首个请求等待换取
+        baidu_token_manager.prefetch(api_key)
         # 百度API的模型端点映射
         self.model_endpoints = {
             'ernie-bot': 'completions',
@@ -45,129 +41,87 @@ class BaiduClient(BaseAIClient):
         
         Args:
             model: 模型名称
-            
+        
         Returns:
             完整的API端点URL
         """
         endpoint = self.model_endpoints.get(model, 'completions')
-        return f"{self.base_url}/{endpoint}?access_token={self.api_key}"
+        return f"{self.base_url}/{endpoint}?access_token={baidu_token_manager.get_token(self.api_key)}"
     
-    def call_sync(self, model: str, message: str, **kwargs) -> str:
-        """
-        同步调用百度文心一言API
-        
-        Args:
-            model: 模型名称
-            message: 用户消息
-            **kwargs: 其他参数
-            
-        Returns:
-            AI响应内容
-        """
-        params = self._get_default_params()
-        params.update(kwargs)
-        
-        url = self._get_endpoint_url(model)
-        
+    def _build_request(self, model: str, message: str, params: dict, stream: bool) -> dict:
         payload = {
             "messages": [{"role": "user", "content": message}],
             "temperature": params.get('temperature', 0.7),
             "max_output_tokens": params.get('max_tokens', 2048)
         }
+        if stream:
+            payload['stream'] = True
         
         # 添加stop参数支持
-        if 'stop' in kwargs and kwargs['stop']:
-            payload['stop'] = kwargs['stop']
+        if params.get('stop'):
+            payload['stop'] = params['stop']
         
-        headers = {
-            "Content-Type": "application/json"
+        return {
+            'url': self._get_endpoint_url(model),
+            'headers': {
+                "Content-Type": "application/json"
+            },
+            'json': payload
         }
-        
+    
+    def _check_error(self, result: dict):
+        """110/111表示access_token无效或已过期，丢弃缓存的令牌，下次调用时重新换取"""
+        if result.get('error_code') in ACCESS_TOKEN_ERRORS:
+            baidu_token_manager.invalidate(self.api_key)
+    
+    def _parse_response(self, result: dict) -> Optional[str]:
+        self._check_error(result)
+        return result.get('result')
+    
+    def _iter_stream(self, response: requests.Response, deadline: Optional[StreamDeadline] = None) -> Iterator[StreamDelta]:
+        # 流式调用出错时百度返回普通JSON响应体而不是SSE事件，检查错误码后结束
+        if 'application/json' not in response.headers.get('Content-Type', ''):
+            return super()._iter_stream(response, deadline)
         try:
-            response = requests.post(
-                url, 
-                json=payload, 
-                headers=headers, 
-                timeout=params.get('timeout', 30)
-            )
-            response.raise_for_status()
-            
             result = response.json()
-            if 'result' in result:
-                return result['result']
-            else:
-                return "抱歉，模型没有返回有效响应。"
-                
-        except requests.exceptions.RequestException as e:
-            return self._handle_error(e, "百度文心一言API调用")
-        except Exception as e:
-            return self._handle_error(e, "处理百度文心一言响应")
+        except ValueError:
+            result = {}
+        finally:
+            response.close()
+        self._stream_error(result)
+        return iter(())
     
-    def call_stream(self, model: str, message: str, **kwargs) -> Union[Iterator[MockStreamChunk], None]:
-        """
-        流式调用百度文心一言API
-        
-        Args:
-            model: 模型名称
-            message: 用户消息
-            **kwargs: 其他参数
-            
-        Returns:
-            流式响应迭代器或None
-        """
-        params = self._get_default_params()
-        params.update(kwargs)
-        
-        url = self._get_endpoint_url(model)
-        
-        payload = {
-            "messages": [{"role": "user", "content": message}],
-            "temperature": params.get('temperature', 0.7),
-            "max_output_tokens": params.get('max_tokens', 2048),
-            "stream": True
-        }
-        
-        # 添加stop参数支持
-        if 'stop' in kwargs and kwargs['stop']:
-            payload['stop'] = kwargs['stop']
-        
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
+    async def _aiter_stream(self, response: httpx.Response, deadline: Optional[StreamDeadline] = None) -> AsyncIterator[StreamDelta]:
+        if 'application/json' not in response.headers.get('Content-Type', ''):
+            async for chunk in super()._aiter_stream(response, deadline):
+                yield chunk
+            return
         try:
-            response = requests.post(
-                url, 
-                json=payload, 
-                headers=headers, 
-                stream=True, 
-                timeout=params.get('timeout', 30)
-            )
-            response.raise_for_status()
-            return self._parse_stream_response(response)
-        except Exception as e:
-            return None
+            result = (await response.aread()) and response.json()
+        except ValueError:
+            result = {}
+        finally:
+            await response.aclose()
+        self._stream_error(result or {})
     
-    def _parse_stream_response(self, response) -> Iterator[MockStreamChunk]:
+    def _stream_error(self, result: dict):
+        """处理流式调用返回的错误响应体"""
+        self._check_error(result)
+        print(f"{self.display_name}流式API调用错误: {result.get('error_msg') or result.get('error_code') or '未知错误'}")
+    
+    def _parse_stream_data(self, data: dict) -> Iterator[StreamDelta]:
         """
-        解析百度文心一言的SSE流式响应
+        解析百度文心一言的流式数据块
         
         Args:
-            response: requests响应对象
-            
+            data: 已反序列化的流式数据块
+        
         Yields:
-            模拟OpenAI格式的流式响应块
+            流式响应增量
         """
-        for line in response.iter_lines(decode_unicode=True):
-            if line and line.startswith('data:'):
-                try:
-                    data_str = line[5:].strip()
-                    if data_str == '[DONE]':
-                        return
-                    data = json.loads(data_str)
-                    if 'result' in data:
-                        content = data['result']
-                        if content:
-                            yield MockStreamChunk(content=content)
-                except (json.JSONDecodeError, KeyError):
-                    continue
\ No newline at end of file
+        self._check_error(data)
+        content = data.get('result')
+        finish_reason = data.get('finish_reason') or ('stop' if data.get('is_end') else None)
+        usage = data.get('usage') if data.get('is_end') else None
+        if content or finish_reason or usage:
+            yield StreamDelta(content or None, None, finish_reason, usage)
\ No newline at end of file
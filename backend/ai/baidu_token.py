@@ -0,0 +1,192 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+import requests
+
+from models.config import Config
+from .http_pool import HTTPPoolManager
+from .singleflight import SingleFlight
+
+class AccessTokenError(Exception):
+    """用API Key/Secret Key换取access_token失败"""
+
+class BaiduTokenManager:
+    """
+    百度千帆access_token管理器
+    
+    API密钥配置为"API Key:Secret Key"时，按OAuth client_credentials方式换取access_token，
+    缓存在进程内存和本地SQLite文件中，同一台机器上的多个worker共享同一个令牌。
+    令牌在过期前AI_BAIDU_TOKEN_REFRESH_BEFORE秒内被使用时在后台刷新，请求继续使用当前令牌；
+    客户端创建时预先换取，只有首次使用且预取尚未完成时请求才需要等待换取结果。
+    同一进程内同一密钥的并发换取只发起一次，刷新前先查看共享存储，其他worker已刷新时直接复用。
+    配置的密钥中没有冒号时视为已换取好的access_token，原样使用。
+    """
+    
+    def __init__(self, path: Optional[str] = None, refresh_before: Optional[float] = None):
+        """
+        初始化令牌管理器，未指定的参数取配置
+        
+        Args:
+            path: 共享存储的SQLite文件路径
+            refresh_before: 距离过期多少秒时开始后台刷新
+        """
+        self.path = path or Config.AI_BAIDU_TOKEN_DB
+        self.refresh_before = Config.AI_BAIDU_TOKEN_REFRESH_BEFORE if refresh_before is None else refresh_before
+        # 密钥摘要 -> (access_token, 过期时间)
+        self._tokens: Dict[str, Tuple[str, float]] = {}
+        self._refreshing: Set[str] = set()
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+    
+    @staticmethod
+    def is_credential(api_key: str) -> bool:
+        """密钥是否为"API Key:Secret Key"形式的凭据"""
+        return ':' in api_key
+    
+    def get_token(self, api_key: str) -> str:
+        """
+        获取可用的access_token
+        
+        Args:
+            api_key: 配置的API密钥
+        
+        Returns:
+            access_token
+        
+        Raises:
+            AccessTokenError: 没有可用令牌且换取失败
+        """
+        if not self.is_credential(api_key):
+            return api_key
+        key = self._key(api_key)
+        cached = self._get_cached(key)
+        now = time.time()
+        if cached and cached[1] > now:
+            if cached[1] - now < self.refresh_before:
+                self.prefetch(api_key)
+            return cached[0]
+        return self._flight.do(key, lambda: self._refresh(api_key))
+    
+    def prefetch(self, api_key: str):
+        """
+        在后台换取或刷新令牌，已有足够新的令牌或已在刷新时不做任何事
+        
+        Args:
+            api_key: 配置的API密钥
+        """
+        if not self.is_credential(api_key):
+            return
+        key = self._key(api_key)
+        cached = self._get_cached(key)
+        if cached and cached[1] - time.time() >= self.refresh_before:
+            return
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        threading.Thread(target=self._background_refresh, args=(api_key, key),
+                         name=f"baidu-token-{key[:8]}", daemon=True).start()
+    
+    def invalidate(self, api_key: str):
+        """
+        丢弃令牌，在提供商返回令牌无效或过期时调用，下次使用时重新换取
+        
+        Args:
+            api_key: 配置的API密钥
+        """
+        if not self.is_credential(api_key):
+            return
+        key = self._key(api_key)
+        with self._lock:
+            self._tokens.pop(key, None)
+        try:
+            self._connect().execute('DELETE FROM tokens WHERE key = ?', (key,))
+        except sqlite3.Error as e:
+            print(f"删除百度access_token缓存失败: {e}")
+    
+    def _background_refresh(self, api_key: str, key: str):
+        try:
+            self._flight.do(key, lambda: self._refresh(api_key))
+        except Exception as e:
+            print(f"后台刷新百度access_token失败: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+    
+    def _get_cached(self, key: str) -> Optional[Tuple[str, float]]:
+        """依次查询内存和共享存储中的令牌"""
+        with self._lock:
+            cached = self._tokens.get(key)
+        if cached is None:
+            cached = self._load(key)
+            if cached is not None:
+                with self._lock:
+                    self._tokens[key] = cached
+        return cached
+    
+    def _refresh(self, api_key: str) -> str:
+        """换取新令牌；其他worker已写入足够新的令牌时直接复用"""
+        key = self._key(api_key)
+        stored = self._load(key)
+        if stored and stored[1] - time.time() >= self.refresh_before:
+            with self._lock:
+                self._tokens[key] = stored
+            return stored[0]
+        
+        client_id, client_secret = api_key.split(':', 1)
+        try:
+            # 与文心一言的调用共用连接池，定期刷新令牌时复用已建立的连接
+            response = HTTPPoolManager.get_session('baidu').post(Config.AI_BAIDU_TOKEN_URL, params={
+                'grant_type': 'client_credentials',
+                'client_id': client_id,
+                'client_secret': client_secret
+            }, timeout=10)
+            result = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise AccessTokenError(f"百度access_token换取失败: {e}")
+        if 'access_token' not in result:
+            raise AccessTokenError(f"百度access_token换取失败: {result.get('error_description') or result.get('error') or response.status_code}")
+        
+        token = (result['access_token'], time.time() + float(result.get('expires_in', 2592000)))
+        with self._lock:
+            self._tokens[key] = token
+        try:
+            self._connect().execute('INSERT OR REPLACE INTO tokens (key, token, expires_at) VALUES (?, ?, ?)',
+                                    (key, token[0], token[1]))
+        except sqlite3.Error as e:
+            print(f"写入百度access_token缓存失败: {e}")
+        return token[0]
+    
+    def _load(self, key: str) -> Optional[Tuple[str, float]]:
+        """从共享存储读取未过期的令牌"""
+        try:
+            row = self._connect().execute('SELECT token, expires_at FROM tokens WHERE key = ? AND expires_at > ?',
+                                          (key, time.time())).fetchone()
+        except sqlite3.Error as e:
+            print(f"读取百度access_token缓存失败: {e}")
+            return None
+        return (row[0], row[1]) if row else None
+    
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的SQLite连接，首次使用时建表"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS tokens (key TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL)')
+            self._local.conn = conn
+        return conn
+    
+    @staticmethod
+    def _key(api_key: str) -> str:
+        """共享存储中只保存凭据的摘要"""
+        return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+# 进程内共享的百度access_token管理器
+baidu_token_manager = BaiduTokenManager()
\ No newline at end of file
@@ -1,9 +1,46 @@
+import asyncio
+import json
+import threading
+import time
+import httpx
+import requests
+from urllib3.exceptions import ReadTimeoutError
 from abc import ABC, abstractmethod
-from typing import Union, Iterator, Any
+from typing import Union, Iterator, AsyncIterator, Optional, Any, Awaitable, Callable, Tuple
+from models.config import Config
+from .circuit_breaker import CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError
+from .http_pool import HTTPPoolManager
+from .key_pool import key_pool
+from .prompt_cache import normalize_usage, prompt_cache_tracker
+from .rate_limiter import RateLimitExceeded, rate_limiter
+from .response_cache import CachedResponse, CachedStream, arecord_stream, record_stream, response_cache
+from .retry import RetryPolicy, get_status_code, get_retry_after
+from .similarity_cache import similarity_cache
+from .singleflight import make_key
+from .sse import SSEEvent, iter_sse, aiter_sse
+from .stream import Completion, StreamDelta
+from .timeouts import (PHASE_PARAMS, ConnectTimeoutError, PhaseTimeoutError, StreamDeadline, atrack_deadline,
+                       get_phase_timeouts)
+from .token_estimator import PromptSample, measure_prompt, token_estimator
 
 class BaseAIClient(ABC):
     """AI客户端抽象基类"""
     
+    # 子类可覆盖的连接池参数（pool_connections、pool_maxsize、pool_block、keep_alive）
+    pool_options: dict = {}
+    
+    # 子类可覆盖的重试参数（deadline、base_delay、max_delay、retry_statuses）
+    retry_options: dict = {}
+    
+    # 用于错误信息的提供商显示名称
+    display_name: str = 'AI'
+    
+    # 是否把seed参数发送给提供商，只有发送时指定了seed的请求才视为确定性请求
+    supports_seed: bool = False
+    
+    # 是否发送system_message，不发送时估算输入token也不计入
+    supports_system_message: bool = True
+    
     def __init__(self, api_key: str, base_url: str = None):
         """
         初始化AI客户端
@@ -14,8 +51,10 @@ class BaseAIClient(ABC):
         """
         self.api_key = api_key
         self.base_url = base_url
+        self._sdk_client = None
+        self._async_sdk_clients = {}
+        self._sdk_lock = threading.Lock()
     
-    @abstractmethod
     def call_sync(self, model: str, message: str, **kwargs) -> str:
         """
         同步调用AI API
@@ -24,14 +63,54 @@ class BaseAIClient(ABC):
             model: 模型名称
             message: 用户消息
             **kwargs: 其他参数
-            
+        
         Returns:
-            AI响应内容
+            AI响应内容，成功时为附带token用量的Completion
         """
-        pass
+        try:
+            return self._complete(model, message, **kwargs) or "抱歉，模型没有返回有效响应。"
+        except Exception as e:
+            return self._sync_error_message(e)
     
-    @abstractmethod
-    def call_stream(self, model: str, message: str, **kwargs) -> Union[Iterator[Any], None]:
+    def call_uncached(self, model: str, message: str, **kwargs) -> Tuple[Optional[str], Optional[str]]:
+        """
+        不经过响应缓存和近似缓存的同步调用，供批处理等每个请求都要实际执行的场景使用
+        
+        Args:
+            model: 模型名称
+            message: 用户消息
+            **kwargs: 其他参数
+        
+        Returns:
+            (AI响应内容, 错误信息)：成功时内容为附带token用量的Completion，响应中没有内容时为None；
+            调用失败时内容为None，错误信息与call_sync返回的相同
+        
+        Raises:
+            RateLimitExceeded: 密钥额度不足且排队超时，请求未发出，调用方可以等待后重试
+            CircuitOpenError: 熔断器处于打开状态，请求未发出
+        """
+        try:
+            return self._complete(model, message, **kwargs), None
+        except (RateLimitExceeded, CircuitOpenError):
+            raise
+        except Exception as e:
+            return None, self._sync_error_message(e)
+    
+    def _complete(self, model: str, message: str, **kwargs) -> Optional[str]:
+        """
+        发起同步调用并解析响应，失败时抛出异常
+        
+        Returns:
+            附带token用量的AI响应内容，响应中没有内容时返回None
+        """
+        params = self._get_default_params()
+        params.update(kwargs)
+        request = self._build_request(model, message, params, stream=False)
+        prompt = self._measure_prompt(message, params)
+        response = self._send(request, params, tokens=self._estimate_request_tokens(model, prompt, params))
+        return self._completion(model, response.json(), prompt)
+    
+    def call_stream(self, model: str, message: str, **kwargs) -> Union[Iterator[StreamDelta], None]:
         """
         流式调用AI API
         
@@ -39,29 +118,194 @@ class BaseAIClient(ABC):
             model: 模型名称
             message: 用户消息
             **kwargs: 其他参数
-            
+        
         Returns:
-            流式响应迭代器或None
+            产出StreamDelta的流式响应迭代器，失败时返回None
+        
+        Raises:
+            PhaseTimeoutError: 连接超时或等待首token超时；迭代过程中超过首token或空闲超时时由迭代器抛出
         """
-        pass
+        params = self._get_default_params()
+        params.update(kwargs)
+        deadline = StreamDeadline(self.display_name, params)
+        prompt = self._measure_prompt(message, params)
+        try:
+            request = self._build_request(model, message, params, stream=True)
+            response = self._send(request, params, stream=True, tokens=self._estimate_request_tokens(model, prompt, params),
+                                  deadline=deadline)
+        except PhaseTimeoutError as e:
+            print(f"{self.display_name}流式API调用超时: {e}")
+            raise
+        except Exception as e:
+            print(f"{self.display_name}流式API调用错误: {e}")
+            return None
+        
+        return self._track_usage(self._iter_stream(response, deadline), model, prompt)
     
-    def call_api(self, model: str, message: str, stream: bool = False, **kwargs) -> Union[str, Iterator[Any], None]:
+    async def acall_sync(self, model: str, message: str, **kwargs) -> str:
         """
-        统一的API调用接口
+        异步调用AI API，不占用工作线程等待响应
+        
+        Args:
+            model: 模型名称
+            message: 用户消息
+            **kwargs: 其他参数
+        
+        Returns:
+            AI响应内容，成功时为附带token用量的Completion
+        """
+        try:
+            return await self._acomplete(model, message, **kwargs) or "抱歉，模型没有返回有效响应。"
+        except Exception as e:
+            return self._sync_error_message(e)
+    
+    async def _acomplete(self, model: str, message: str, **kwargs) -> Optional[str]:
+        """
+        _complete的异步版本
+        
+        Returns:
+            附带token用量的AI响应内容，响应中没有内容时返回None
+        """
+        params = self._get_default_params()
+        params.update(kwargs)
+        request = self._build_request(model, message, params, stream=False)
+        prompt = self._measure_prompt(message, params)
+        response = await self._asend(request, params, tokens=self._estimate_request_tokens(model, prompt, params))
+        return self._completion(model, response.json(), prompt)
+    
+    def _completion(self, model: str, result: dict, prompt: PromptSample) -> Optional[Completion]:
+        """
+        解析同步响应的内容和token用量，用量同时计入提示词缓存统计并用于校准token估算
+        
+        Args:
+            model: 模型名称
+            result: 响应JSON
+            prompt: 发起请求时measure_prompt的统计结果
+        
+        Returns:
+            附带token用量的回复内容，响应中没有内容时返回None
+        """
+        usage = self._parse_usage(result)
+        prompt_cache_tracker.record(self.provider_name, model, usage)
+        token_estimator.observe(self.provider_name, model, prompt, usage)
+        content = self._parse_response(result)
+        return Completion(content, usage) if content else None
+    
+    async def acall_stream(self, model: str, message: str, **kwargs) -> Union[AsyncIterator[StreamDelta], None]:
+        """
+        异步流式调用AI API
+        
+        Args:
+            model: 模型名称
+            message: 用户消息
+            **kwargs: 其他参数
+        
+        Returns:
+            产出StreamDelta的异步流式响应迭代器，失败时返回None
+        
+        Raises:
+            PhaseTimeoutError: 同call_stream
+        """
+        params = self._get_default_params()
+        params.update(kwargs)
+        deadline = StreamDeadline(self.display_name, params)
+        prompt = self._measure_prompt(message, params)
+        try:
+            request = self._build_request(model, message, params, stream=True)
+            response = await self._asend(request, params, stream=True,
+                                         tokens=self._estimate_request_tokens(model, prompt, params), deadline=deadline)
+        except PhaseTimeoutError as e:
+            print(f"{self.display_name}流式API调用超时: {e}")
+            raise
+        except Exception as e:
+            print(f"{self.display_name}流式API调用错误: {e}")
+            return None
+        
+        return self._atrack_usage(atrack_deadline(self._aiter_stream(response, deadline), deadline), model, prompt)
+    
+    def call_api(self, model: str, message: str, stream: bool = False, similarity: bool = False,
+                 **kwargs) -> Union[str, Iterator[StreamDelta], None]:
+        """
+        统一的API调用接口，确定性请求（temperature为0，或提供商支持seed且指定了seed）优先从响应缓存返回，
+        开启近似缓存时与已缓存消息高度相似的请求也直接返回缓存响应
         
         Args:
             model: 模型名称
             message: 用户消息
             stream: 是否使用流式输出
+            similarity: 是否使用近似缓存，由模型配置决定
             **kwargs: 其他参数
-            
+        
         Returns:
             同步调用返回字符串，流式调用返回迭代器
         """
+        cache_key, scope = self._get_cache_keys(model, message, kwargs, similarity)
+        if cache_key is None and scope is None:
+            if stream:
+                return self.call_stream(model, message, **kwargs)
+            else:
+                return self.call_sync(model, message, **kwargs)
+        
+        cached = self._get_cached(message, cache_key, scope)
+        if cached is not None:
+            return CachedStream(cached) if stream else cached.content
+        
+        def store(response: CachedResponse):
+            self._set_cached(message, cache_key, scope, response)
+        
         if stream:
-            return self.call_stream(model, message, **kwargs)
-        else:
-            return self.call_sync(model, message, **kwargs)
+            stream_response = self.call_stream(model, message, **kwargs)
+            return record_stream(stream_response, store) if stream_response else None
+        
+        try:
+            content = self._complete(model, message, **kwargs)
+        except Exception as e:
+            return self._sync_error_message(e)
+        if content:
+            # 缓存中只保存文本，命中缓存时没有用量
+            store(CachedResponse(str(content)))
+        return content or "抱歉，模型没有返回有效响应。"
+    
+    async def acall_api(self, model: str, message: str, stream: bool = False, similarity: bool = False,
+                        **kwargs) -> Union[str, AsyncIterator[StreamDelta], None]:
+        """
+        统一的异步API调用接口
+        
+        Args:
+            model: 模型名称
+            message: 用户消息
+            stream: 是否使用流式输出
+            similarity: 是否使用近似缓存，由模型配置决定
+            **kwargs: 其他参数
+        
+        Returns:
+            同步调用返回字符串，流式调用返回异步迭代器
+        """
+        cache_key, scope = self._get_cache_keys(model, message, kwargs, similarity)
+        if cache_key is None and scope is None:
+            if stream:
+                return await self.acall_stream(model, message, **kwargs)
+            else:
+                return await self.acall_sync(model, message, **kwargs)
+        
+        cached = self._get_cached(message, cache_key, scope)
+        if cached is not None:
+            return CachedStream(cached) if stream else cached.content
+        
+        def store(response: CachedResponse):
+            self._set_cached(message, cache_key, scope, response)
+        
+        if stream:
+            stream_response = await self.acall_stream(model, message, **kwargs)
+            return arecord_stream(stream_response, store) if stream_response else None
+        
+        try:
+            content = await self._acomplete(model, message, **kwargs)
+        except Exception as e:
+            return self._sync_error_message(e)
+        if content:
+            store(CachedResponse(str(content)))
+        return content or "抱歉，模型没有返回有效响应。"
     
     @property
     @abstractmethod
@@ -74,6 +318,585 @@ class BaseAIClient(ABC):
         """
         pass
     
+    def _build_request(self, model: str, message: str, params: dict, stream: bool) -> dict:
+        """
+        构建提供商请求，同步和异步调用共用
+        
+        Args:
+            model: 模型名称
+            message: 用户消息
+            params: 合并默认值后的参数
+            stream: 是否为流式请求
+        
+        Returns:
+            包含url、headers、json以及可选查询参数params的字典
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} 未实现 _build_request")
+    
+    def _parse_response(self, result: dict) -> Optional[str]:
+        """
+        从同步响应中提取回复内容
+        
+        Args:
+            result: 响应JSON
+        
+        Returns:
+            回复内容，无有效内容时返回None
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} 未实现 _parse_response")
+    
+    def _parse_usage(self, result: dict) -> Optional[dict]:
+        """
+        从同步响应中提取token用量
+        
+        Args:
+            result: 响应JSON
+        
+        Returns:
+            统一格式的用量（见normalize_usage），响应中没有用量时返回None
+        """
+        return normalize_usage(result.get('usage'))
+    
+    def _parse_stream_data(self, data: dict) -> Iterator[StreamDelta]:
+        """
+        解析单个流式数据块
+        
+        Args:
+            data: 已反序列化的流式数据块
+        
+        Yields:
+            流式响应增量
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} 未实现 _parse_stream_data")
+    
+    def _parse_stream_event(self, event: SSEEvent) -> Optional[list]:
+        """
+        解析一个SSE事件
+        
+        Args:
+            event: 已解码的SSE事件
+        
+        Returns:
+            解析出的流式增量列表；遇到结束标记[DONE]时返回None
+        """
+        if event.is_done:
+            return None
+        try:
+            return list(self._parse_stream_data(event.json()))
+        except (json.JSONDecodeError, KeyError, IndexError, TypeError):
+            return []
+    
+    def _iter_stream(self, response: requests.Response, deadline: Optional[StreamDeadline] = None) -> Iterator[StreamDelta]:
+        """
+        增量解码同步SSE字节流，结束后归还连接
+        
+        指定截止时间时，每次读取前把套接字的读超时设为剩余时间，上游完全没有数据时也能按时中止。
+        
+        Args:
+            response: requests响应对象
+            deadline: 首token和空闲间隔的截止时间
+        
+        Yields:
+            流式响应增量
+        
+        Raises:
+            PhaseTimeoutError: 超过截止时间
+        """
+        data = response.iter_content(chunk_size=None)
+        if deadline:
+            data = self._read_before_deadline(response, data, deadline)
+        done = False
+        try:
+            for event in iter_sse(data):
+                # 结束标记之后继续读完剩余数据，使连接可以归还连接池
+                if done:
+                    continue
+                chunks = self._parse_stream_event(event)
+                if chunks is None:
+                    done = True
+                    continue
+                for chunk in chunks:
+                    yield chunk
+                    if deadline:
+                        deadline.record(chunk)
+        except requests.exceptions.ConnectionError as e:
+            # requests把读取正文时的套接字超时包装为ConnectionError
+            if deadline and e.args and isinstance(e.args[0], ReadTimeoutError):
+                raise deadline.error() from e
+            raise
+        finally:
+            response.close()
+    
+    @staticmethod
+    def _read_before_deadline(response: requests.Response, data: Iterator[bytes],
+                              deadline: StreamDeadline) -> Iterator[bytes]:
+        """
+        每次从套接字读取前检查截止时间，并把套接字的读超时设为剩余时间
+        
+        心跳和SSE注释不推迟截止时间，持续收到心跳但迟迟没有内容时同样超时。
+        
+        Args:
+            response: requests响应对象
+            data: 响应正文的字节块迭代器
+            deadline: 截止时间
+        
+        Yields:
+            响应正文的字节块
+        """
+        sock = getattr(getattr(response.raw, 'connection', None), 'sock', None)
+        if sock is not None:
+            sock.settimeout(max(deadline.remaining(), 0.001))
+        for chunk in data:
+            yield chunk
+            # 上一块中的增量已经被消费并记录，此时的剩余时间即下一次读取的等待上限
+            deadline.check()
+            if sock is not None:
+                sock.settimeout(max(deadline.remaining(), 0.001))
+    
+    async def _aiter_stream(self, response: httpx.Response, deadline: Optional[StreamDeadline] = None) -> AsyncIterator[StreamDelta]:
+        """
+        增量解码异步SSE字节流，结束后归还连接
+        
+        截止时间由atrack_deadline按剩余时间等待每个增量来保证，这里只转换httpx兜底的读超时。
+        
+        Args:
+            response: httpx响应对象
+            deadline: 首token和空闲间隔的截止时间
+        
+        Yields:
+            流式响应增量
+        """
+        done = False
+        try:
+            async for event in aiter_sse(response.aiter_bytes()):
+                # 结束标记之后继续读完剩余数据，使连接可以归还连接池
+                if done:
+                    continue
+                chunks = self._parse_stream_event(event)
+                if chunks is None:
+                    done = True
+                    continue
+                for chunk in chunks:
+                    yield chunk
+        except httpx.ReadTimeout as e:
+            if deadline is None:
+                raise
+            raise deadline.error() from e
+        finally:
+            await response.aclose()
+    
+    @property
+    def session(self) -> requests.Session:
+        """
+        当前提供商共享的HTTP会话，复用已建立的TCP/TLS连接
+        
+        Returns:
+            requests.Session实例
+        """
+        return HTTPPoolManager.get_session(self.provider_name, self.pool_options)
+    
+    @property
+    def async_session(self) -> httpx.AsyncClient:
+        """
+        当前提供商在当前事件循环中共享的异步HTTP客户端
+        
+        Returns:
+            httpx.AsyncClient实例
+        """
+        return HTTPPoolManager.get_async_client(self.provider_name, self.pool_options)
+    
+    @property
+    def circuit_breaker(self) -> CircuitBreaker:
+        """
+        当前提供商端点（provider, base_url）的熔断器
+        
+        Returns:
+            CircuitBreaker实例
+        """
+        return CircuitBreakerRegistry.get(self.provider_name, self.base_url)
+    
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        """
+        当前提供商的重试策略，retry_options中未指定的参数取配置
+        
+        Returns:
+            RetryPolicy实例
+        """
+        return RetryPolicy(**self.retry_options)
+    
+    def _send(self, request: dict, params: dict, stream: bool = False, tokens: int = 0,
+              deadline: Optional[StreamDeadline] = None) -> requests.Response:
+        """
+        通过共享连接池发送请求，经过限流和熔断器检查并按重试策略重试临时错误
+        
+        Args:
+            request: _build_request构建的请求
+            params: 合并默认值后的参数
+            stream: 是否为流式请求
+            tokens: 预估的token数，用于TPM限流
+            deadline: 流式请求的截止时间，指定时等待响应头的时间以首token超时为限
+        
+        Returns:
+            状态码检查通过的响应
+        
+        Raises:
+            ConnectTimeoutError: 重试后仍无法在连接超时时间内建立连接
+            FirstTokenTimeoutError: 流式请求在首token超时时间内没有返回响应头
+        """
+        connect_timeout = get_phase_timeouts(params)[0]
+        read_timeout = deadline.first_token_timeout if deadline else params.get('timeout', 30)
+        
+        def attempt():
+            try:
+                response = self._post(
+                    request['url'],
+                    json=request['json'],
+                    headers=request['headers'],
+                    params=request.get('params'),
+                    stream=stream,
+                    timeout=(connect_timeout, read_timeout)
+                )
+            except requests.exceptions.Timeout as e:
+                raise self._phase_timeout(e, connect_timeout, deadline) or e
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError:
+                response.close()
+                raise
+            return response
+        
+        return self._call_with_retry(attempt, tokens)
+    
+    async def _asend(self, request: dict, params: dict, stream: bool = False, tokens: int = 0,
+                     deadline: Optional[StreamDeadline] = None) -> httpx.Response:
+        """
+        通过当前事件循环的共享异步连接池发送请求，经过限流和熔断器检查并按重试策略重试临时错误
+        
+        Args:
+            request: _build_request构建的请求
+            params: 合并默认值后的参数
+            stream: 是否为流式请求
+            tokens: 预估的token数，用于TPM限流
+            deadline: 流式请求的截止时间，httpx的读超时只作兜底，按剩余时间中止由调用方负责
+        
+        Returns:
+            状态码检查通过的响应
+        
+        Raises:
+            ConnectTimeoutError: 同_send
+            FirstTokenTimeoutError: 同_send
+        """
+        client = self.async_session
+        connect_timeout = get_phase_timeouts(params)[0]
+        read_timeout = deadline.read_timeout if deadline else params.get('timeout', 30)
+        
+        async def attempt():
+            http_request = client.build_request(
+                'POST',
+                request['url'],
+                json=request['json'],
+                headers=request['headers'],
+                params=request.get('params'),
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout)
+            )
+            try:
+                response = await client.send(http_request, stream=stream)
+            except httpx.TimeoutException as e:
+                raise self._phase_timeout(e, connect_timeout, deadline) or e
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError:
+                await response.aclose()
+                raise
+            return response
+        
+        return await self._acall_with_retry(attempt, tokens)
+    
+    def _call_with_retry(self, attempt: Callable[[], Any], tokens: int = 0) -> Any:
+        """
+        执行提供商调用，每次尝试前检查熔断器并扣减密钥的RPM/TPM额度，失败时按重试策略退避重试
+        
+        只包裹收到响应头之前的阶段，流式响应开始向用户转发后不会再重试。
+        
+        Args:
+            attempt: 执行一次请求的函数
+            tokens: 预估的token数，用于TPM限流
+        
+        Returns:
+            attempt的返回值
+        
+        Raises:
+            RateLimitExceeded: 密钥额度不足且排队超时
+            CircuitOpenError: 熔断器处于打开状态
+            Exception: 不可重试或超过截止时间时抛出最后一次请求的异常
+        """
+        policy = self.retry_policy
+        breaker = self.circuit_breaker
+        deadline = time.monotonic() + policy.deadline
+        retries = 0
+        while True:
+            # 先检查熔断器，被熔断拒绝的请求不占用密钥的限流额度
+            if not breaker.allow_request():
+                raise CircuitOpenError(self._circuit_open_message())
+            try:
+                rate_limiter.acquire(self.api_key, tokens)
+            except RateLimitExceeded:
+                breaker.release()
+                raise
+            started = time.monotonic()
+            try:
+                result = attempt()
+            except Exception as e:
+                self._record_error(breaker, e, started)
+                delay = policy.get_delay(e, retries, deadline)
+                if delay is None:
+                    raise
+                print(f"{self.display_name}请求失败，{delay:.2f}秒后重试: {e}")
+                time.sleep(delay)
+                retries += 1
+                continue
+            # 流式调用以收到响应头的耗时作为延迟统计
+            breaker.record_success(time.monotonic() - started)
+            return result
+    
+    async def _acall_with_retry(self, attempt: Callable[[], Awaitable[Any]], tokens: int = 0) -> Any:
+        """
+        _call_with_retry的异步版本，排队和退避期间不阻塞事件循环
+        
+        Args:
+            attempt: 执行一次请求的协程函数
+            tokens: 预估的token数，用于TPM限流
+        
+        Returns:
+            attempt的返回值
+        """
+        policy = self.retry_policy
+        breaker = self.circuit_breaker
+        deadline = time.monotonic() + policy.deadline
+        retries = 0
+        while True:
+            # 先检查熔断器，被熔断拒绝的请求不占用密钥的限流额度
+            if not breaker.allow_request():
+                raise CircuitOpenError(self._circuit_open_message())
+            try:
+                await rate_limiter.aacquire(self.api_key, tokens)
+            except RateLimitExceeded:
+                breaker.release()
+                raise
+            started = time.monotonic()
+            try:
+                result = await attempt()
+            except Exception as e:
+                self._record_error(breaker, e, started)
+                delay = policy.get_delay(e, retries, deadline)
+                if delay is None:
+                    raise
+                print(f"{self.display_name}请求失败，{delay:.2f}秒后重试: {e}")
+                await asyncio.sleep(delay)
+                retries += 1
+                continue
+            breaker.record_success(time.monotonic() - started)
+            return result
+    
+    def _record_error(self, breaker: CircuitBreaker, error: Exception, started: float):
+        """
+        按异常类型记录调用结果
+        
+        连接错误、超时、5xx、408和429计为失败；其余4xx说明提供商正常响应（如密钥错误），
+        不应触发熔断，按成功调用记录。429同时让当前密钥进入冷却期，后续请求改用同一提供商的其他密钥。
+        
+        Args:
+            breaker: 熔断器
+            error: 异常对象
+            started: 发起请求时的time.monotonic()
+        """
+        status = get_status_code(error)
+        key_pool.record_error(self.api_key, status, get_retry_after(error) if status == 429 else None)
+        if status is not None and status < 500 and status not in (408, 429):
+            breaker.record_success(time.monotonic() - started)
+        else:
+            breaker.record_failure()
+    
+    def _get_cache_keys(self, model: str, message: str, kwargs: dict, similarity: bool) -> Tuple[Optional[str], Optional[str]]:
+        """
+        计算缓存键：响应缓存键由提供商、模型、消息和生成参数的规范化哈希组成，
+        近似缓存的作用域不含消息，同一作用域内的相似消息可以互相命中
+        
+        Returns:
+            (响应缓存键, 近似缓存作用域)，未开启对应缓存或请求不满足条件时为None
+        """
+        params = self._get_default_params()
+        params.update(kwargs)
+        # 超时时间不影响生成结果
+        params.pop('timeout', None)
+        for name in PHASE_PARAMS:
+            params.pop(name, None)
+        cache_key = None
+        if Config.AI_RESPONSE_CACHE_ENABLED and response_cache.is_cacheable(params, self.supports_seed):
+            cache_key = make_key(self.provider_name, model, message, params)
+        scope = make_key(self.provider_name, model, '', params) if similarity else None
+        return cache_key, scope
+    
+    def _get_cached(self, message: str, cache_key: Optional[str], scope: Optional[str]) -> Optional[CachedResponse]:
+        """依次查询响应缓存和近似缓存"""
+        cached = response_cache.get(cache_key) if cache_key else None
+        if cached is None and scope:
+            cached = similarity_cache.get(scope, message)
+        return cached
+    
+    def _set_cached(self, message: str, cache_key: Optional[str], scope: Optional[str], response: CachedResponse):
+        """把完整响应写入开启的缓存"""
+        if cache_key:
+            response_cache.set(cache_key, response)
+        if scope:
+            similarity_cache.set(scope, message, response)
+    
+    def _sync_error_message(self, error: Exception) -> str:
+        """
+        把同步调用的异常转换为返回给用户的错误信息
+        
+        Args:
+            error: 异常对象
+        
+        Returns:
+            错误信息
+        """
+        if isinstance(error, (CircuitOpenError, RateLimitExceeded, PhaseTimeoutError)):
+            return str(error)
+        if isinstance(error, (requests.exceptions.RequestException, httpx.HTTPError)):
+            return self._handle_error(error, f"{self.display_name} API调用")
+        return self._handle_error(error, f"处理{self.display_name}响应")
+    
+    def _phase_timeout(self, error: Optional[BaseException], connect_timeout: float,
+                       deadline: Optional[StreamDeadline] = None) -> Optional[PhaseTimeoutError]:
+        """
+        把requests或httpx的超时异常转换为对应阶段的超时异常
+        
+        Args:
+            error: 传输层异常，OpenAI SDK的APITimeoutError传入其__cause__
+            connect_timeout: 连接超时时间（秒）
+            deadline: 流式请求的截止时间，此时收到响应头之前的读超时视为首token超时
+        
+        Returns:
+            阶段超时异常，不属于阶段超时时返回None
+        """
+        if isinstance(error, (requests.exceptions.ConnectTimeout, httpx.ConnectTimeout)):
+            return ConnectTimeoutError(f"{self.display_name}在{connect_timeout:g}秒内未能建立连接，请检查网络或稍后重试", connect_timeout)
+        if deadline is not None and isinstance(error, (requests.exceptions.ReadTimeout, httpx.ReadTimeout)):
+            return deadline.error()
+        return None
+    
+    def _measure_prompt(self, message: str, params: dict) -> PromptSample:
+        """统计请求实际发送的输入，供估算token和校准使用"""
+        return measure_prompt(message, params, self.supports_system_message)
+    
+    def _estimate_request_tokens(self, model: str, prompt: PromptSample, params: dict) -> int:
+        """
+        预估一次请求占用的TPM额度：按该模型校准后的系数估算的输入token（含系统消息和历史对话）加max_tokens
+        
+        Args:
+            model: 模型名称
+            prompt: measure_prompt的统计结果
+            params: 合并默认值后的参数
+        
+        Returns:
+            预估的token数
+        """
+        return token_estimator.estimate(self.provider_name, model, prompt) + int(params.get('max_tokens') or 0)
+    
+    def _track_usage(self, stream: Iterator[StreamDelta], model: str, prompt: PromptSample) -> Iterator[StreamDelta]:
+        """
+        透传流式响应，结束时把用量计入提示词缓存统计并用于校准token估算
+        
+        Args:
+            stream: 流式响应迭代器
+            model: 模型名称
+            prompt: 发起请求时measure_prompt的统计结果
+        
+        Returns:
+            流式响应迭代器
+        """
+        stream = prompt_cache_tracker.track(stream, self.provider_name, model)
+        return token_estimator.track(stream, self.provider_name, model, prompt)
+    
+    def _atrack_usage(self, stream: AsyncIterator[StreamDelta], model: str,
+                      prompt: PromptSample) -> AsyncIterator[StreamDelta]:
+        """_track_usage的异步版本"""
+        stream = prompt_cache_tracker.atrack(stream, self.provider_name, model)
+        return token_estimator.atrack(stream, self.provider_name, model, prompt)
+    
+    def _circuit_open_message(self) -> str:
+        """熔断期间直接返回的错误信息"""
+        return f"{self.display_name}服务暂时不可用（已熔断），请稍后重试"
+    
+    def get_pool_stats(self) -> dict:
+        """
+        获取当前提供商的连接池统计信息
+        
+        Returns:
+            包含in_use、idle、handshakes的统计字典
+        """
+        return HTTPPoolManager.get_stats(self.provider_name).get(self.provider_name, {})
+    
+    def _post(self, url: str, **kwargs) -> requests.Response:
+        """
+        通过共享连接池发送POST请求
+        
+        Args:
+            url: 请求地址
+            **kwargs: 传递给requests的参数
+        
+        Returns:
+            响应对象
+        """
+        return self.session.post(url, **kwargs)
+    
+    def _get_openai_client(self):
+        """
+        获取复用的OpenAI SDK客户端（用于兼容OpenAI协议的流式调用）
+        
+        Returns:
+            openai.OpenAI实例，其内部httpx连接池随客户端实例一起复用
+        """
+        if self._sdk_client is None:
+            with self._sdk_lock:
+                if self._sdk_client is None:
+                    from openai import OpenAI
+                    # 重试由_call_with_retry统一处理，关闭SDK自带的重试
+                    self._sdk_client = OpenAI(
+                        base_url=self.base_url,
+                        api_key=self.api_key,
+                        max_retries=0
+                    )
+        return self._sdk_client
+    
+    def _get_async_openai_client(self):
+        """
+        获取当前事件循环复用的异步OpenAI SDK客户端
+        
+        Returns:
+            openai.AsyncOpenAI实例，使用提供商共享的异步连接池
+        """
+        loop = asyncio.get_running_loop()
+        entry = self._async_sdk_clients.get(id(loop))
+        if entry is None or entry[1] is not loop:
+            from openai import AsyncOpenAI
+            entry = (
+                AsyncOpenAI(
+                    base_url=self.base_url,
+                    api_key=self.api_key,
+                    http_client=self.async_session,
+                    max_retries=0
+                ),
+                loop
+            )
+            self._async_sdk_clients = {
+                key: value for key, value in self._async_sdk_clients.items() if not value[1].is_closed()
+            }
+            self._async_sdk_clients[id(loop)] = entry
+        return entry[0]
+    
     def _get_default_params(self) -> dict:
         """
         获取默认参数
@@ -94,7 +917,7 @@ class BaseAIClient(ABC):
         Args:
             error: 异常对象
             context: 错误上下文
-            
+        
         Returns:
             错误消息
         """
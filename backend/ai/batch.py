@@ -0,0 +1,131 @@
+import json
+import threading
+from collections import namedtuple
+from typing import List, Optional, Tuple
+
+from models.config import Config
+from .circuit_breaker import CircuitOpenError
+from .factory import AIClientFactory
+from .key_pool import key_pool
+from .rate_limiter import RateLimitExceeded, rate_limiter
+
+LOCAL = 'local'
+NATIVE = 'native'
+
+# 上传文件中每行可以指定的生成参数
+ITEM_PARAMS = ('system_message', 'history', 'temperature', 'max_tokens', 'top_p', 'seed', 'stop',
+               'frequency_penalty', 'presence_penalty')
+
+# 提供商批处理的终止状态
+NATIVE_FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+# 执行期间使用的密钥，与数据库会话解耦，供工作线程使用
+BatchKey = namedtuple('BatchKey', ('api_key', 'base_url', 'weight'))
+
+def parse_batch_file(data: bytes) -> List[dict]:
+    """
+    解析上传的JSONL请求文件
+    
+    每行一个JSON对象：message为必填的用户消息，custom_id可选（默认为"line-行号"），
+    其余可选字段见ITEM_PARAMS。
+    
+    Args:
+        data: 文件内容
+    
+    Returns:
+        [{'custom_id': ..., 'message': ..., 'params': {...}}]
+    
+    Raises:
+        ValueError: 文件格式错误，错误信息包含行号
+    """
+    items = []
+    seen = set()
+    for number, line in enumerate(data.decode('utf-8-sig').splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"第{number}行不是有效的JSON: {e}")
+        if not isinstance(record, dict) or not isinstance(record.get('message'), str) or not record['message']:
+            raise ValueError(f"第{number}行缺少message字段")
+        custom_id = str(record.get('custom_id') or f"line-{number}")
+        if len(custom_id) > 200:
+            raise ValueError(f"第{number}行的custom_id超过200个字符")
+        if custom_id in seen:
+            raise ValueError(f"第{number}行的custom_id重复: {custom_id}")
+        seen.add(custom_id)
+        items.append({
+            'custom_id': custom_id,
+            'message': record['message'],
+            'params': {name: record[name] for name in ITEM_PARAMS if record.get(name) is not None}
+        })
+        if len(items) > Config.AI_BATCH_MAX_ITEMS:
+            raise ValueError(f"请求数超过上限{Config.AI_BATCH_MAX_ITEMS}")
+    if not items:
+        raise ValueError("文件中没有请求")
+    return items
+
+def resolve_mode(provider: str, mode: Optional[str] = None) -> str:
+    """
+    确定任务的执行方式
+    
+    Args:
+        provider: 提供商名称
+        mode: auto、native或local，为空时取配置
+    
+    Returns:
+        native或local：auto在提供商支持OpenAI Batch API时使用native
+    
+    Raises:
+        ValueError: mode无效，或指定了native但提供商不支持
+    """
+    mode = mode or Config.AI_BATCH_MODE
+    if mode not in ('auto', NATIVE, LOCAL):
+        raise ValueError(f"不支持的执行方式: {mode}")
+    if provider not in AIClientFactory.get_supported_providers():
+        provider = 'openai'
+    supported = getattr(AIClientFactory.get_client_class(provider), 'supports_batch_api', False)
+    if mode == NATIVE and not supported:
+        raise ValueError(f"{provider} 不支持原生批处理")
+    return NATIVE if supported and mode != LOCAL else LOCAL
+
+def execute_request(provider: str, model: str, keys: List[BatchKey], message: str, params: dict,
+                    stop: threading.Event) -> Optional[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    执行批处理中的单个请求，每次尝试由密钥池选择密钥，不读写响应缓存
+    
+    额度不足或熔断时请求未发出，等待恢复后重试，超过AI_BATCH_MAX_ATTEMPTS次才计为失败。
+    
+    Args:
+        provider: 提供商名称
+        model: 模型名称
+        keys: 提供商的活跃密钥
+        message: 用户消息
+        params: 生成参数
+        stop: 任务停止信号，设置后不再发起新的尝试并中断等待
+    
+    Returns:
+        (状态, 回复内容, 错误信息)；任务停止时返回None，请求保持待处理
+    """
+    for attempt in range(1, Config.AI_BATCH_MAX_ATTEMPTS + 1):
+        if stop.is_set():
+            return None
+        record = key_pool.select(provider, keys)
+        client = AIClientFactory.get_client(provider, record.api_key, record.base_url)
+        try:
+            with key_pool.lease(client.api_key):
+                content, error = client.call_uncached(model, message, **params)
+        except (RateLimitExceeded, CircuitOpenError) as e:
+            if attempt == Config.AI_BATCH_MAX_ATTEMPTS:
+                return 'failed', None, str(e)
+            # 批处理不要求低延迟，等额度恢复或熔断冷却后再试
+            delay = e.retry_after if isinstance(e, RateLimitExceeded) else Config.AI_BREAKER_OPEN_SECONDS
+            stop.wait(delay)
+            continue
+        if error is not None:
+            return 'failed', None, error
+        if not content:
+            return 'failed', None, "模型没有返回有效响应"
+        return 'completed', content, None
+    return None
\ No newline at end of file
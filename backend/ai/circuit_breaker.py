@@ -0,0 +1,236 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+from models.config import Config
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求未发出即失败"""
+    pass
+
+class CircuitBreaker:
+    """
+    单个提供商端点的熔断器
+    
+    closed: 正常放行，按最近调用的错误率和慢调用率判断是否熔断
+    open: 熔断中，直接拒绝请求，冷却时间过后进入half_open
+    half_open: 放行少量探测请求，全部成功则恢复closed，任一失败或过慢则重新open
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, name: str, window: Optional[int] = None, min_calls: Optional[int] = None,
+                 failure_rate: Optional[float] = None, slow_call_seconds: Optional[float] = None,
+                 slow_call_rate: Optional[float] = None, open_seconds: Optional[float] = None,
+                 half_open_calls: Optional[int] = None):
+        """
+        初始化熔断器，未指定的参数取配置
+        
+        Args:
+            name: 熔断器名称
+            window: 统计最近多少次调用
+            min_calls: 窗口内至少多少次调用才开始判断
+            failure_rate: 触发熔断的错误率（0-1）
+            slow_call_seconds: 超过该耗时（秒）的调用视为慢调用
+            slow_call_rate: 触发熔断的慢调用率（0-1）
+            open_seconds: 熔断后的冷却时间（秒）
+            half_open_calls: half_open状态下放行的探测请求数
+        """
+        self.name = name
+        self.min_calls = min_calls or Config.AI_BREAKER_MIN_CALLS
+        self.failure_rate = failure_rate or Config.AI_BREAKER_FAILURE_RATE
+        self.slow_call_seconds = slow_call_seconds or Config.AI_BREAKER_SLOW_CALL_SECONDS
+        self.slow_call_rate = slow_call_rate or Config.AI_BREAKER_SLOW_CALL_RATE
+        self.open_seconds = open_seconds or Config.AI_BREAKER_OPEN_SECONDS
+        self.half_open_calls = half_open_calls or Config.AI_BREAKER_HALF_OPEN_CALLS
+        
+        self.state = self.CLOSED
+        # 每次调用的结果：(是否失败, 是否慢调用)
+        self._outcomes = deque(maxlen=window or Config.AI_BREAKER_WINDOW)
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._rejected = 0
+        self._open_count = 0
+        self._lock = threading.Lock()
+    
+    def available(self) -> bool:
+        """
+        是否可能放行请求（不占用探测名额），用于选择备用提供商
+        
+        Returns:
+            熔断中且未到冷却时间时返回False
+        """
+        return not (self.state == self.OPEN and time.monotonic() - self._opened_at < self.open_seconds)
+    
+    def allow_request(self) -> bool:
+        """
+        判断是否放行一次请求，half_open状态下会占用一个探测名额
+        
+        Returns:
+            是否放行
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self._rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._probes_in_flight = 0
+                self._probe_successes = 0
+            
+            if self.state == self.HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_calls:
+                    self._rejected += 1
+                    return False
+                self._probes_in_flight += 1
+            return True
+    
+    def record_success(self, latency: float):
+        """
+        记录一次成功调用
+        
+        Args:
+            latency: 调用耗时（秒），超过慢调用阈值时按慢调用统计
+        """
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+                if slow:
+                    self._open()
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self._close()
+                return
+            if self.state == self.CLOSED:
+                self._outcomes.append((False, slow))
+                self._evaluate()
+    
+    def record_failure(self):
+        """记录一次失败调用（连接错误、超时、5xx、429等）"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+                self._open()
+                return
+            if self.state == self.CLOSED:
+                self._outcomes.append((True, False))
+                self._evaluate()
+    
+    def release(self):
+        """请求放行后没有发出（如限流排队超时）时调用，归还half_open状态下占用的探测名额"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+    
+    def reset(self):
+        """手动恢复为closed状态并清空统计"""
+        with self._lock:
+            self._close()
+    
+    def get_stats(self) -> dict:
+        """
+        获取熔断器状态
+        
+        Returns:
+            包含状态、错误率、慢调用率、拒绝次数等信息的字典
+        """
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = sum(1 for failed, _ in self._outcomes if failed)
+            slow_calls = sum(1 for _, slow in self._outcomes if slow)
+            state = self.state
+            if state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                state = self.HALF_OPEN
+            return {
+                'state': state,
+                'calls': calls,
+                'failure_rate': round(failures / calls, 3) if calls else 0.0,
+                'slow_call_rate': round(slow_calls / calls, 3) if calls else 0.0,
+                'rejected': self._rejected,
+                'open_count': self._open_count,
+                'retry_after': round(max(self.open_seconds - (time.monotonic() - self._opened_at), 0), 1)
+                if self.state == self.OPEN else 0
+            }
+    
+    def _evaluate(self):
+        """根据窗口内的错误率和慢调用率判断是否需要熔断（调用方持有锁）"""
+        calls = len(self._outcomes)
+        if calls < self.min_calls:
+            return
+        failures = sum(1 for failed, _ in self._outcomes if failed)
+        slow_calls = sum(1 for _, slow in self._outcomes if slow)
+        if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate:
+            self._open()
+    
+    def _open(self):
+        if self.state != self.OPEN:
+            print(f"熔断器 {self.name} 已打开，{self.open_seconds}秒内的请求将直接失败")
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._open_count += 1
+        self._outcomes.clear()
+    
+    def _close(self):
+        self.state = self.CLOSED
+        self._outcomes.clear()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+class CircuitBreakerRegistry:
+    """按(提供商, base_url)划分的熔断器注册表"""
+    
+    _breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+    _lock = threading.Lock()
+    
+    @classmethod
+    def get(cls, provider: str, base_url: Optional[str] = None) -> CircuitBreaker:
+        """
+        获取指定提供商端点的熔断器，不存在时创建
+        
+        Args:
+            provider: 提供商名称
+            base_url: 基础URL
+        
+        Returns:
+            熔断器实例
+        """
+        key = (provider, base_url or '')
+        breaker = cls._breakers.get(key)
+        if breaker is None:
+            with cls._lock:
+                breaker = cls._breakers.get(key)
+                if breaker is None:
+                    breaker = CircuitBreaker(f"{provider}@{base_url}" if base_url else provider)
+                    cls._breakers[key] = breaker
+        return breaker
+    
+    @classmethod
+    def get_stats(cls) -> Dict[str, dict]:
+        """
+        获取所有熔断器的状态
+        
+        Returns:
+            以"提供商@base_url"为键的状态字典
+        """
+        with cls._lock:
+            breakers = list(cls._breakers.values())
+        return {breaker.name: breaker.get_stats() for breaker in sorted(breakers, key=lambda b: b.name)}
+    
+    @classmethod
+    def reset(cls, provider: Optional[str] = None):
+        """
+        恢复熔断器
+        
+        Args:
+            provider: 提供商名称，为空时恢复所有熔断器
+        """
+        with cls._lock:
+            breakers = [b for (name, _), b in cls._breakers.items() if provider is None or name == provider]
+        for breaker in breakers:
+            breaker.reset()
\ No newline at end of file
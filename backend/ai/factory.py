@@ -1,37 +1,38 @@
-from typing import Dict, Type, Optional
+import importlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Type, Optional, Tuple, Union
+from models.config import Config
 from .base_client import BaseAIClient
-from .openai_client import OpenAIClient
-from .siliconflow_client import SiliconFlowClient
-from .baidu_client import BaiduClient
-from .alibaba_client import AlibabaClient
-from .zhipu_client import ZhipuClient
-from .deepseek_client import DeepSeekClient
-from .moonshot_client import MoonshotClient
-from .modasheng_client import ModashengClient
-from .aihubmix_client import AIHubMixClient
-from .anthropic_client import AnthropicClient
-from .gemini_client import GeminiClient
-from .volcengine_client import VolcengineClient
+from .rate_limiter import rate_limiter
 
 class AIClientFactory:
     """AI客户端工厂类"""
     
-    # 注册的客户端类映射
-    _clients: Dict[str, Type[BaseAIClient]] = {
-        'openai': OpenAIClient,
-        'siliconflow': SiliconFlowClient,
-        'baidu': BaiduClient,
-        'alibaba': AlibabaClient,
-        'zhipu': ZhipuClient,
-        'deepseek': DeepSeekClient,
-        'moonshot': MoonshotClient,
-        'modasheng': ModashengClient,
-        'aihubmix': AIHubMixClient,
-        'anthropic': AnthropicClient,
-        'gemini': GeminiClient,
-        'volcengine': VolcengineClient
+    # 注册的客户端类映射，值为"模块:类名"形式的导入路径（相对于ai包），首次使用时才导入并替换为类，
+    # 使worker启动和命令行脚本不必导入未使用的客户端模块
+    _clients: Dict[str, Union[str, Type[BaseAIClient]]] = {
+        'openai': '.openai_client:OpenAIClient',
+        'siliconflow': '.siliconflow_client:SiliconFlowClient',
+        'baidu': '.baidu_client:BaiduClient',
+        'alibaba': '.alibaba_client:AlibabaClient',
+        'zhipu': '.zhipu_client:ZhipuClient',
+        'deepseek': '.deepseek_client:DeepSeekClient',
+        'moonshot': '.moonshot_client:MoonshotClient',
+        'modasheng': '.modasheng_client:ModashengClient',
+        'aihubmix': '.aihubmix_client:AIHubMixClient',
+        'anthropic': '.anthropic_client:AnthropicClient',
+        'gemini': '.gemini_client:GeminiClient',
+        'volcengine': '.volcengine_client:VolcengineClient'
     }
     
+    # 长生命周期客户端实例注册表：(provider, api_key, base_url) -> (client, 创建时间)
+    _instances: 'OrderedDict[Tuple[str, str, str], Tuple[BaseAIClient, float]]' = OrderedDict()
+    # 已解析的base_url缓存：(provider, api_key) -> (base_url, 解析时间)
+    _resolved_base_urls: Dict[Tuple[str, str], Tuple[str, float]] = {}
+    _instances_lock = threading.Lock()
+    
     @classmethod
     def create_client(cls, provider: str, api_key: str, base_url: str = None) -> BaseAIClient:
         """
@@ -53,9 +54,89 @@ class AIClientFactory:
         if base_url is None:
             base_url = cls._get_base_url_from_db(provider, api_key)
         
-        client_class = cls._clients[provider]
+        client_class = cls.get_client_class(provider)
         return client_class(api_key, base_url)
     
+    @classmethod
+    def get_client(cls, provider: str, api_key: str, base_url: str = None) -> BaseAIClient:
+        """
+        获取可复用的长生命周期客户端实例，不存在时创建并登记
+        
+        Args:
+            provider: 提供商名称，如果不支持则默认使用openai
+            api_key: API密钥
+            base_url: 可选的基础URL，如果不提供则从数据库获取（结果会被缓存）
+            
+        Returns:
+            对应的AI客户端实例
+        """
+        if provider not in cls._clients:
+            provider = 'openai'
+        
+        now = time.monotonic()
+        ttl = Config.AI_CLIENT_REGISTRY_TTL
+        
+        if base_url is None:
+            cached = cls._resolved_base_urls.get((provider, api_key))
+            if cached and now - cached[1] < ttl:
+                base_url = cached[0]
+            else:
+                base_url = cls._get_base_url_from_db(provider, api_key)
+                cls._resolved_base_urls[(provider, api_key)] = (base_url, now)
+        
+        key = (provider, api_key, base_url)
+        with cls._instances_lock:
+            entry = cls._instances.get(key)
+            if entry and now - entry[1] < ttl:
+                cls._instances.move_to_end(key)
+                return entry[0]
+        
+        client = cls.get_client_class(provider)(api_key, base_url)
+        
+        with cls._instances_lock:
+            cls._instances[key] = (client, now)
+            cls._instances.move_to_end(key)
+            while len(cls._instances) > Config.AI_CLIENT_REGISTRY_SIZE:
+                cls._instances.popitem(last=False)
+        return client
+    
+    @classmethod
+    def evict(cls, provider: Optional[str] = None):
+        """
+        清除注册表中的客户端实例和密钥配额缓存，在API密钥或提供商配置变更后调用
+        
+        Args:
+            provider: 提供商名称，为空时清除全部
+        """
+        rate_limiter.evict()
+        with cls._instances_lock:
+            if provider is None:
+                cls._instances.clear()
+                cls._resolved_base_urls.clear()
+                return
+            for key in [k for k in cls._instances if k[0] == provider]:
+                del cls._instances[key]
+            for key in [k for k in cls._resolved_base_urls if k[0] == provider]:
+                cls._resolved_base_urls.pop(key, None)
+    
+    @classmethod
+    def get_client_class(cls, provider: str) -> Type[BaseAIClient]:
+        """
+        获取提供商的客户端类，首次使用时按注册的导入路径导入
+        
+        Args:
+            provider: 提供商名称
+            
+        Returns:
+            客户端类
+        """
+        client_class = cls._clients[provider]
+        if isinstance(client_class, str):
+            module_name, class_name = client_class.split(':')
+            client_class = getattr(importlib.import_module(module_name, __package__), class_name)
+            cls._clients[provider] = client_class
+        return client_class
+    
     @classmethod
     def get_supported_providers(cls) -> list:
         """
@@ -118,12 +199,12 @@ class AIClientFactory:
         return default_urls.get(provider, '')
     
     @classmethod
-    def register_client(cls, provider: str, client_class: Type[BaseAIClient]):
+    def register_client(cls, provider: str, client_class: Union[str, Type[BaseAIClient]]):
         """
         注册新的AI客户端类
         
         Args:
             provider: 提供商名称
-            client_class: 客户端类
+            client_class: 客户端类，或"模块:类名"形式的导入路径（首次使用时导入）
         """
         cls._clients[provider] = client_class
\ No newline at end of file
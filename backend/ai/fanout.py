@@ -0,0 +1,63 @@
+import queue
+import threading
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from .stream import StreamDelta
+from .timeouts import PhaseTimeoutError
+
+class FanOutStream:
+    """
+    并发读取多个流式响应，按到达顺序合并为一个事件序列
+    
+    每个流在独立的后台线程中发起和读取，总耗时取决于最慢的一个而不是各自耗时之和。
+    迭代产出(序号, 事件类型, 数据)：delta事件的数据为StreamDelta；每个流结束时产出一个end事件，
+    正常结束时数据为None，发起失败或中途出错时为错误信息，超时时为PhaseTimeoutError（其code区分超时阶段）。
+    迭代器关闭（如客户端断开）时通知所有后台线程在下一个增量到达时停止读取并关闭连接。
+    """
+    
+    def __init__(self, openers: List[Callable[[], Optional[Iterator[StreamDelta]]]]):
+        """
+        初始化合并流
+        
+        Args:
+            openers: 发起流式调用的函数列表，在后台线程中调用，返回产出StreamDelta的迭代器，失败时返回None
+        """
+        self.openers = openers
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+    
+    def __iter__(self) -> Iterator[Tuple[int, str, object]]:
+        for index, opener in enumerate(self.openers):
+            threading.Thread(target=self._run, args=(index, opener), name=f"fanout-{index}", daemon=True).start()
+        remaining = len(self.openers)
+        try:
+            while remaining:
+                item = self._queue.get()
+                if item[1] == 'end':
+                    remaining -= 1
+                yield item
+        finally:
+            self._cancelled.set()
+    
+    def _run(self, index: int, opener: Callable[[], Optional[Iterator[StreamDelta]]]):
+        """发起一个流式调用，把增量放入队列，结束时放入end事件"""
+        stream = None
+        error = None
+        try:
+            stream = opener()
+            if stream is None:
+                error = "流式API调用失败"
+                return
+            for delta in stream:
+                if self._cancelled.is_set():
+                    return
+                self._queue.put((index, 'delta', delta))
+        except PhaseTimeoutError as e:
+            error = e
+        except Exception as e:
+            error = f"流式API调用错误: {e}"
+        finally:
+            close = getattr(stream, 'close', None)
+            if close is not None:
+                close()
+            self._queue.put((index, 'end', error))
\ No newline at end of file
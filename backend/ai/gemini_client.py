@@ -1,10 +1,12 @@
-import requests
-from typing import Union, Iterator, Any
+from typing import Iterator, Optional
 from .base_client import BaseAIClient
+from .stream import StreamDelta
 
 class GeminiClient(BaseAIClient):
     """Google Gemini AI客户端"""
     
+    display_name = 'Gemini'
+    
     def __init__(self, api_key: str, base_url: str = None):
         # 如果没有提供base_url，使用默认的Gemini API地址
         if not base_url:
@@ -15,29 +17,20 @@ class GeminiClient(BaseAIClient):
     def provider_name(self) -> str:
         return 'gemini'
     
-    def call_sync(self, model: str, message: str, **kwargs) -> str:
-        """
-        同步调用Gemini API
-        
-        Args:
-            model: 模型名称
-            message: 用户消息
-            **kwargs: 其他参数
-            
-        Returns:
-            AI响应内容
-        """
-        params = self._get_default_params()
-        params.update(kwargs)
-        
-        # Gemini API使用不同的URL格式
-        url = f"{self.base_url}/v1beta/models/{model}:generateContent"
+    def _build_request(self, model: str, message: str, params: dict, stream: bool) -> dict:
+        # Gemini API使用不同的URL格式，流式调用使用streamGenerateContent
+        action = 'streamGenerateContent' if stream else 'generateContent'
+        url = f"{self.base_url}/v1beta/models/{model}:{action}"
+        # 流式调用默认返回逐步写出的JSON数组，alt=sse时改为每个响应块一个SSE事件，按通用SSE流解析
+        query = {"key": self.api_key}
+        if stream:
+            query['alt'] = 'sse'
         
         # 构建内容列表
         contents = []
         
         # 如果有系统消息，作为第一个用户消息发送
-        system_message = kwargs.get('system_message', '')
+        system_message = params.get('system_message', '')
         if system_message:
             contents.append({
                 "parts": [{"text": f"System: {system_message}"}]
@@ -54,136 +47,63 @@ class GeminiClient(BaseAIClient):
         }
         
         # 添加stop参数支持
-        if 'stop' in kwargs and kwargs['stop']:
-            generation_config['stopSequences'] = kwargs['stop'] if isinstance(kwargs['stop'], list) else [kwargs['stop']]
-        
-        payload = {
-            "contents": contents,
-            "generationConfig": generation_config
-        }
-        
-        # Gemini API使用查询参数传递API密钥
-        params_dict = {"key": self.api_key}
+        if params.get('stop'):
+            generation_config['stopSequences'] = params['stop'] if isinstance(params['stop'], list) else [params['stop']]
         
-        headers = {
-            "Content-Type": "application/json"
+        return {
+            'url': url,
+            'headers': {
+                "Content-Type": "application/json"
+            },
+            'json': {
+                "contents": contents,
+                "generationConfig": generation_config
+            },
+            # Gemini API使用查询参数传递API密钥
+            'params': query
         }
-        
-        try:
-            response = requests.post(
-                url, 
-                json=payload, 
-                headers=headers,
-                params=params_dict,
-                timeout=params.get('timeout', 60)
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            if 'candidates' in result and len(result['candidates']) > 0:
-                candidate = result['candidates'][0]
-                if 'content' in candidate and 'parts' in candidate['content']:
-                    parts = candidate['content']['parts']
-                    if len(parts) > 0 and 'text' in parts[0]:
-                        return parts[0]['text']
-            
-            return "抱歉，模型没有返回有效响应。"
-                
-        except requests.exceptions.RequestException as e:
-            return self._handle_error(e, "Gemini API调用")
-        except Exception as e:
-            return self._handle_error(e, "Gemini API调用")
     
-    def call_stream(self, model: str, message: str, **kwargs) -> Union[Iterator[Any], None]:
-        """
-        流式调用Gemini API
-        
-        Args:
-            model: 模型名称
-            message: 用户消息
-            **kwargs: 其他参数
-            
-        Returns:
-            流式响应迭代器或None
-        """
-        params = self._get_default_params()
-        params.update(kwargs)
-        
-        # Gemini API使用不同的URL格式进行流式调用
-        url = f"{self.base_url}/v1beta/models/{model}:streamGenerateContent"
-        
-        # 构建内容列表
-        contents = []
-        
-        # 如果有系统消息，作为第一个用户消息发送
-        system_message = kwargs.get('system_message', '')
-        if system_message:
-            contents.append({
-                "parts": [{"text": f"System: {system_message}"}]
-            })
-        
-        contents.append({
-            "parts": [{"text": message}]
-        })
-        
-        generation_config = {
-            "temperature": params.get('temperature', 0.7),
-            "topP": params.get('top_p', 1.0),
-            "maxOutputTokens": params.get('max_tokens', 2048)
-        }
-        
-        # 添加stop参数支持
-        if 'stop' in kwargs and kwargs['stop']:
-            generation_config['stopSequences'] = kwargs['stop'] if isinstance(kwargs['stop'], list) else [kwargs['stop']]
-        
-        payload = {
-            "contents": contents,
-            "generationConfig": generation_config
-        }
-        
-        # Gemini API使用查询参数传递API密钥
-        params_dict = {"key": self.api_key}
-        
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
-        try:
-            response = requests.post(
-                url, 
-                json=payload, 
-                headers=headers,
-                params=params_dict,
-                stream=True,
-                timeout=params.get('timeout', 60)
-            )
-            response.raise_for_status()
-            
-            def stream_generator():
-                for line in response.iter_lines():
-                    if line:
-                        line = line.decode('utf-8')
-                        # Gemini流式响应可能不使用标准的SSE格式
-                        try:
-                            import json
-                            chunk = json.loads(line)
-                            if 'candidates' in chunk and len(chunk['candidates']) > 0:
-                                candidate = chunk['candidates'][0]
-                                if 'content' in candidate and 'parts' in candidate['content']:
-                                    parts = candidate['content']['parts']
-                                    if len(parts) > 0 and 'text' in parts[0]:
-                                        yield parts[0]['text']
-                        except json.JSONDecodeError:
-                            continue
-            
-            return stream_generator()
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Gemini流式API调用错误: {e}")
-            return None
-        except Exception as e:
-            print(f"Gemini流式API调用异常: {e}")
+    def _parse_response(self, result: dict) -> Optional[str]:
+        if 'candidates' in result and len(result['candidates']) > 0:
+            candidate = result['candidates'][0]
+            if 'content' in candidate and 'parts' in candidate['content']:
+                parts = candidate['content']['parts']
+                if len(parts) > 0 and 'text' in parts[0]:
+                    return parts[0]['text']
+        return None
+    
+    def _parse_usage(self, result: dict) -> Optional[dict]:
+        return self._convert_usage(result.get('usageMetadata'))
+    
+    def _convert_usage(self, metadata: Optional[dict]) -> Optional[dict]:
+        """把Gemini的usageMetadata转换为统一格式的用量"""
+        if not metadata:
             return None
+        usage = {
+            'prompt_tokens': metadata.get('promptTokenCount', 0),
+            'completion_tokens': metadata.get('candidatesTokenCount', 0),
+            'total_tokens': metadata.get('totalTokenCount', 0)
+        }
+        if metadata.get('cachedContentTokenCount'):
+            usage['cache_read_tokens'] = metadata['cachedContentTokenCount']
+        return usage
+    
+    def _parse_stream_data(self, data: dict) -> Iterator[StreamDelta]:
+        content = reasoning = finish_reason = None
+        candidates = data.get('candidates')
+        if candidates:
+            candidate = candidates[0]
+            parts = candidate.get('content', {}).get('parts', [])
+            # 开启includeThoughts时，思考摘要以thought为true的part返回
+            content = ''.join(part.get('text', '') for part in parts if not part.get('thought'))
+            reasoning = ''.join(part.get('text', '') for part in parts if part.get('thought'))
+            finish_reason = candidate.get('finishReason')
+        
+        # 每个事件都带有截至当前的usageMetadata，只在最后一个事件中取用
+        usage = self._convert_usage(data.get('usageMetadata')) if finish_reason else None
+        
+        if content or reasoning or finish_reason:
+            yield StreamDelta(content or None, reasoning or None, finish_reason, usage)
     
     def _get_default_params(self) -> dict:
         """获取默认参数"""
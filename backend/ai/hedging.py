@@ -0,0 +1,273 @@
+import math
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from models.config import Config
+from .base_client import BaseAIClient
+from .key_pool import key_pool
+from .stream import StreamDelta
+from .timeouts import PhaseTimeoutError
+
+class TTFTTracker:
+    """记录各提供商/模型最近的首token耗时（TTFT）"""
+    
+    def __init__(self, window: Optional[int] = None):
+        """
+        初始化统计器
+        
+        Args:
+            window: 每个提供商/模型保留的最近样本数，默认取配置
+        """
+        self.window = window or Config.AI_HEDGING_WINDOW
+        self._samples: Dict[Tuple[str, str], deque] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, provider: str, model: str, seconds: float):
+        """
+        记录一次首token耗时
+        
+        Args:
+            provider: 提供商名称
+            model: 模型名称
+            seconds: 从发起请求到收到首个token的耗时（秒）
+        """
+        with self._lock:
+            samples = self._samples.get((provider, model))
+            if samples is None:
+                samples = self._samples[(provider, model)] = deque(maxlen=self.window)
+            samples.append(seconds)
+    
+    def percentile(self, provider: str, model: str, pct: float, min_samples: Optional[int] = None) -> Optional[float]:
+        """
+        计算最近首token耗时的百分位数
+        
+        Args:
+            provider: 提供商名称
+            model: 模型名称
+            pct: 百分位（0-100）
+            min_samples: 最少样本数，默认取配置
+        
+        Returns:
+            百分位对应的耗时（秒），样本不足时返回None
+        """
+        if min_samples is None:
+            min_samples = Config.AI_HEDGING_MIN_SAMPLES
+        with self._lock:
+            samples = sorted(self._samples.get((provider, model), ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        index = min(max(int(math.ceil(pct / 100 * len(samples))) - 1, 0), len(samples) - 1)
+        return samples[index]
+    
+    def get_hedge_delay(self, provider: str, model: str) -> float:
+        """
+        获取发出备用请求前的等待时间
+        
+        Args:
+            provider: 主提供商名称
+            model: 模型名称
+        
+        Returns:
+            等待时间（秒）
+        """
+        delay = self.percentile(provider, model, Config.AI_HEDGING_PERCENTILE)
+        if delay is None:
+            return Config.AI_HEDGING_DEFAULT_DELAY
+        return max(delay, Config.AI_HEDGING_MIN_DELAY)
+    
+    def track(self, stream: Iterator[StreamDelta], provider: str, model: str, started: float) -> Iterator[StreamDelta]:
+        """
+        透传流式响应并记录首token耗时
+        
+        Args:
+            stream: 流式响应迭代器
+            provider: 提供商名称
+            model: 模型名称
+            started: 发起请求时的time.monotonic()
+        
+        Yields:
+            流式响应增量
+        """
+        waiting = True
+        try:
+            for delta in stream:
+                if waiting and (delta.content or delta.reasoning):
+                    self.record(provider, model, time.monotonic() - started)
+                    waiting = False
+                yield delta
+        finally:
+            close = getattr(stream, 'close', None)
+            if close is not None:
+                close()
+    
+    def get_stats(self) -> Dict[str, dict]:
+        """
+        获取各提供商/模型的首token耗时统计
+        
+        Returns:
+            以"提供商/模型"为键的统计字典，包含样本数、p50、p95
+        """
+        with self._lock:
+            keys = list(self._samples.keys())
+        stats = {}
+        for provider, model in sorted(keys):
+            p50 = self.percentile(provider, model, 50, min_samples=1)
+            p95 = self.percentile(provider, model, 95, min_samples=1)
+            stats[f"{provider}/{model}"] = {
+                'samples': len(self._samples.get((provider, model), ())),
+                'p50': round(p50, 3) if p50 is not None else None,
+                'p95': round(p95, 3) if p95 is not None else None
+            }
+        return stats
+
+# 进程内共享的首token耗时统计
+ttft_tracker = TTFTTracker()
+
+class HedgedStream:
+    """
+    对冲流式请求
+    
+    先向主提供商发起请求；若在等待时间（最近首token耗时的百分位）内没有收到首个token，
+    则向下一个备用提供商发起同样的请求。采用最先产出token的流，其余请求会被取消。
+    某个请求未产出任何token就结束（如调用失败）时，立即尝试下一个备用提供商。
+    每个请求从发出到结束都计入所用密钥的在途请求数。
+    所有请求都没有产出token且最后一个超时失败的请求，或采用的流中途超时时，抛出对应的PhaseTimeoutError。
+    """
+    
+    def __init__(self, candidates: List[Tuple[str, str, BaseAIClient]], message: str,
+                 delay: Optional[float] = None, tracker: Optional[TTFTTracker] = None, **kwargs):
+        """
+        初始化对冲请求
+        
+        Args:
+            candidates: (提供商名称, 模型名称, 客户端)列表，第一个为主提供商
+            message: 用户消息
+            delay: 发出备用请求前的等待时间（秒），默认按主提供商最近的首token耗时计算
+            tracker: 首token耗时统计器，默认使用进程内共享的统计器
+            **kwargs: 传递给call_stream的其他参数
+        """
+        self.candidates = candidates
+        self.message = message
+        self.kwargs = kwargs
+        self.tracker = tracker or ttft_tracker
+        if delay is None:
+            delay = self.tracker.get_hedge_delay(candidates[0][0], candidates[0][1])
+        self.delay = delay
+        self.winner: Optional[str] = None
+        self.hedged = False
+        self._queue = queue.Queue()
+        self._cancelled: List[threading.Event] = []
+    
+    def __iter__(self) -> Iterator[StreamDelta]:
+        started = finished = 0
+        winner = None
+        first = None
+        timeout_error = None
+        try:
+            self._start(started)
+            started += 1
+            deadline = time.monotonic() + self.delay
+            
+            while winner is None:
+                timeout = None
+                if started < len(self.candidates):
+                    timeout = max(deadline - time.monotonic(), 0)
+                try:
+                    index, kind, payload = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    # 等待超时仍无首个token，向下一个提供商发出备用请求
+                    self.hedged = True
+                    self._start(started)
+                    started += 1
+                    deadline = time.monotonic() + self.delay
+                    continue
+                
+                if kind == 'first':
+                    winner, first = index, payload
+                elif kind == 'end':
+                    finished += 1
+                    timeout_error = payload or timeout_error
+                    if started < len(self.candidates):
+                        self._start(started)
+                        started += 1
+                        deadline = time.monotonic() + self.delay
+                    elif finished == started:
+                        if timeout_error:
+                            raise timeout_error
+                        return
+            
+            self.winner = self.candidates[winner][0]
+            if self.hedged:
+                print(f"对冲请求: {self.candidates[0][1]} 主提供商 {self.candidates[0][0]} 首token超时，由 {self.winner} 完成响应")
+            for index, cancelled in enumerate(self._cancelled):
+                if index != winner:
+                    cancelled.set()
+            
+            yield from first
+            while True:
+                index, kind, payload = self._queue.get()
+                if index != winner:
+                    continue
+                if kind == 'end':
+                    if payload:
+                        raise payload
+                    return
+                yield payload
+        finally:
+            for cancelled in self._cancelled:
+                cancelled.set()
+    
+    def _start(self, index: int):
+        """在后台线程中发起第index个候选请求"""
+        provider, model, client = self.candidates[index]
+        cancelled = threading.Event()
+        self._cancelled.append(cancelled)
+        threading.Thread(
+            target=self._run,
+            args=(index, provider, model, client, cancelled),
+            name=f"hedge-{provider}",
+            daemon=True
+        ).start()
+    
+    def _run(self, index: int, provider: str, model: str, client: BaseAIClient, cancelled: threading.Event):
+        """
+        读取一个候选请求的流式响应并放入队列
+        
+        首个token之前的增量（如只含用量的增量）与首个token一起作为first放入队列，
+        之后每个增量单独放入；被取消后在下一个增量到达时停止读取并关闭连接。
+        结束时放入end，超时失败时附带PhaseTimeoutError，其他错误只记录日志。
+        """
+        started = time.monotonic()
+        stream = None
+        error = None
+        key_pool.acquire(client.api_key)
+        try:
+            stream = client.call_api(model, self.message, stream=True, **self.kwargs)
+            if stream is None:
+                return
+            pending = []
+            for delta in stream:
+                if cancelled.is_set():
+                    return
+                if pending is None:
+                    self._queue.put((index, 'delta', delta))
+                    continue
+                pending.append(delta)
+                if delta.content or delta.reasoning:
+                    self.tracker.record(provider, model, time.monotonic() - started)
+                    self._queue.put((index, 'first', pending))
+                    pending = None
+        except PhaseTimeoutError as e:
+            print(f"对冲请求 {provider} 流式调用超时: {e}")
+            error = e
+        except Exception as e:
+            print(f"对冲请求 {provider} 流式调用错误: {e}")
+        finally:
+            close = getattr(stream, 'close', None)
+            if close is not None:
+                close()
+            key_pool.release(client.api_key)
+            self._queue.put((index, 'end', error))
\ No newline at end of file
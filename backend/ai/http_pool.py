@@ -0,0 +1,233 @@
+import asyncio
+import socket
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+from models.config import Config
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """带连接统计和TCP keep-alive的HTTP适配器"""
+    
+    def __init__(self, keep_alive: bool = True, **kwargs):
+        """
+        初始化适配器
+        
+        Args:
+            keep_alive: 是否复用连接并开启TCP keep-alive
+            **kwargs: 传递给HTTPAdapter的参数（pool_connections、pool_maxsize、pool_block）
+        """
+        self.keep_alive = keep_alive
+        super().__init__(**kwargs)
+    
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self.keep_alive:
+            pool_kwargs['socket_options'] = HTTPConnection.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            ]
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+    
+    def get_stats(self) -> Dict[str, dict]:
+        """
+        获取每个主机连接池的统计信息
+        
+        Returns:
+            以主机为键的统计字典，包含使用中、空闲连接数和握手次数
+        """
+        stats = {}
+        pools = self.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None or pool.pool is None:
+                continue
+            queued = list(pool.pool.queue)
+            idle = sum(1 for conn in queued if conn is not None)
+            stats[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                'in_use': max(pool.pool.maxsize - len(queued), 0),
+                'idle': idle,
+                'handshakes': pool.num_connections,
+                'requests': pool.num_requests,
+                'maxsize': pool.pool.maxsize
+            }
+        return stats
+
+class CountingAsyncTransport(httpx.AsyncHTTPTransport):
+    """统计新建连接次数的异步HTTP传输层"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.handshakes = 0
+        create_connection = self._pool.create_connection
+        
+        def counting_create_connection(origin):
+            self.handshakes += 1
+            return create_connection(origin)
+        
+        self._pool.create_connection = counting_create_connection
+    
+    def get_stats(self) -> dict:
+        """
+        获取异步连接池统计信息
+        
+        Returns:
+            包含使用中、空闲连接数和握手次数的统计字典
+        """
+        connections = list(self._pool.connections)
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {
+            'in_use': len(connections) - idle,
+            'idle': idle,
+            'handshakes': self.handshakes
+        }
+
+class HTTPPoolManager:
+    """按提供商划分的共享HTTP连接池管理器"""
+    
+    _sessions: Dict[str, requests.Session] = {}
+    _adapters: Dict[str, PooledHTTPAdapter] = {}
+    # 异步客户端与事件循环绑定：(provider, 事件循环id) -> (AsyncClient, 传输层, 事件循环)
+    _async_clients: Dict[Tuple[str, int], Tuple[httpx.AsyncClient, CountingAsyncTransport, asyncio.AbstractEventLoop]] = {}
+    _lock = threading.Lock()
+    
+    @classmethod
+    def get_default_options(cls) -> dict:
+        """
+        获取连接池默认配置
+        
+        Returns:
+            连接池配置字典
+        """
+        return {
+            'pool_connections': Config.AI_HTTP_POOL_CONNECTIONS,
+            'pool_maxsize': Config.AI_HTTP_POOL_MAXSIZE,
+            'pool_block': Config.AI_HTTP_POOL_BLOCK,
+            'keep_alive': Config.AI_HTTP_KEEP_ALIVE
+        }
+    
+    @classmethod
+    def get_session(cls, provider: str, options: Optional[dict] = None) -> requests.Session:
+        """
+        获取指定提供商的共享Session，不存在时按配置创建
+        
+        Args:
+            provider: 提供商名称
+            options: 覆盖默认配置的连接池参数
+        
+        Returns:
+            复用连接的requests.Session
+        """
+        session = cls._sessions.get(provider)
+        if session is not None:
+            return session
+        
+        with cls._lock:
+            session = cls._sessions.get(provider)
+            if session is None:
+                pool_options = cls.get_default_options()
+                pool_options.update(options or {})
+                adapter = PooledHTTPAdapter(**pool_options)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                if not pool_options['keep_alive']:
+                    session.headers['Connection'] = 'close'
+                cls._adapters[provider] = adapter
+                cls._sessions[provider] = session
+        return session
+    
+    @classmethod
+    def get_async_client(cls, provider: str, options: Optional[dict] = None) -> httpx.AsyncClient:
+        """
+        获取指定提供商在当前事件循环中的共享异步客户端
+        
+        Args:
+            provider: 提供商名称
+            options: 覆盖默认配置的连接池参数
+        
+        Returns:
+            复用连接的httpx.AsyncClient
+        """
+        loop = asyncio.get_running_loop()
+        key = (provider, id(loop))
+        entry = cls._async_clients.get(key)
+        if entry is not None and entry[2] is loop and not entry[0].is_closed:
+            return entry[0]
+        
+        with cls._lock:
+            # 清理已关闭事件循环遗留的客户端
+            for stale in [k for k, v in cls._async_clients.items() if v[2].is_closed()]:
+                cls._async_clients.pop(stale, None)
+            entry = cls._async_clients.get(key)
+            if entry is None or entry[2] is not loop or entry[0].is_closed:
+                pool_options = cls.get_default_options()
+                pool_options.update(options or {})
+                keep_alive = pool_options['keep_alive']
+                limits = httpx.Limits(
+                    max_connections=pool_options['pool_connections'] * pool_options['pool_maxsize'],
+                    max_keepalive_connections=pool_options['pool_maxsize'] if keep_alive else 0
+                )
+                transport = CountingAsyncTransport(
+                    limits=limits,
+                    socket_options=[(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)] if keep_alive else None
+                )
+                client = httpx.AsyncClient(transport=transport)
+                if not keep_alive:
+                    client.headers['Connection'] = 'close'
+                entry = (client, transport, loop)
+                cls._async_clients[key] = entry
+        return entry[0]
+    
+    @classmethod
+    def get_stats(cls, provider: Optional[str] = None) -> Dict[str, dict]:
+        """
+        获取连接池统计信息
+        
+        Args:
+            provider: 提供商名称，为空时返回所有提供商
+        
+        Returns:
+            以提供商为键的统计字典
+        """
+        names = set(cls._adapters.keys()) | {key[0] for key in cls._async_clients}
+        providers = [provider] if provider else sorted(names)
+        result = {}
+        for name in providers:
+            adapter = cls._adapters.get(name)
+            hosts = adapter.get_stats() if adapter is not None else {}
+            async_stats = [
+                transport.get_stats()
+                for (key_provider, _), (_, transport, _) in list(cls._async_clients.items())
+                if key_provider == name
+            ]
+            if not hosts and not async_stats:
+                continue
+            result[name] = {
+                'in_use': sum(h['in_use'] for h in hosts.values()) + sum(a['in_use'] for a in async_stats),
+                'idle': sum(h['idle'] for h in hosts.values()) + sum(a['idle'] for a in async_stats),
+                'handshakes': sum(h['handshakes'] for h in hosts.values()) + sum(a['handshakes'] for a in async_stats),
+                'hosts': hosts
+            }
+        return result
+    
+    @classmethod
+    def close(cls, provider: Optional[str] = None):
+        """
+        关闭连接池
+        
+        Args:
+            provider: 提供商名称，为空时关闭所有连接池
+        """
+        with cls._lock:
+            providers = [provider] if provider else list(cls._sessions.keys())
+            for name in providers:
+                session = cls._sessions.pop(name, None)
+                cls._adapters.pop(name, None)
+                if session is not None:
+                    session.close()
+            # 异步客户端需在所属事件循环中关闭，这里只移除引用
+            for key in [k for k in cls._async_clients if provider is None or k[0] == provider]:
+                cls._async_clients.pop(key, None)
\ No newline at end of file
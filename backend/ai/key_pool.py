@@ -0,0 +1,248 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from models.config import Config
+from .stream import StreamDelta
+
+LEAST_IN_FLIGHT = 'least_in_flight'
+WEIGHTED_ROUND_ROBIN = 'weighted_round_robin'
+
+class KeyState:
+    """单个API密钥的负载与限流状态"""
+    
+    __slots__ = ('provider', 'weight', 'in_flight', 'requests', 'errors', 'rate_limited',
+                 'cooldown_until', 'current_weight', 'last_selected')
+    
+    def __init__(self, provider: str, weight: int = 1):
+        self.provider = provider
+        self.weight = weight
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.cooldown_until = 0.0
+        # 平滑加权轮询的当前权重
+        self.current_weight = 0
+        self.last_selected = 0.0
+
+class TrackedStream:
+    """
+    KeyPool.track返回的流式响应包装
+    
+    与生成器不同，close()和回收时的__del__在还没开始迭代时也会执行，保证每次acquire都有对应的release。
+    """
+    
+    def __init__(self, pool: 'KeyPool', stream: Iterable[StreamDelta], api_key: str):
+        self._pool = pool
+        self._stream = stream
+        self._iterator: Optional[Iterator[StreamDelta]] = None
+        self._api_key = api_key
+        self._closed = False
+    
+    def __iter__(self) -> Iterator[StreamDelta]:
+        return self
+    
+    def __next__(self) -> StreamDelta:
+        if self._closed:
+            raise StopIteration
+        if self._iterator is None:
+            self._iterator = iter(self._stream)
+        try:
+            return next(self._iterator)
+        except BaseException:
+            # 流结束（StopIteration）或出错时立即归还
+            self.close()
+            raise
+    
+    def close(self):
+        """结束在途请求并关闭底层流，可重复调用"""
+        if self._closed:
+            return
+        self._closed = True
+        self._pool.release(self._api_key)
+        for target in (self._iterator, self._stream):
+            close = getattr(target, 'close', None)
+            if close is not None:
+                close()
+    
+    def __del__(self):
+        self.close()
+
+class KeyPool:
+    """
+    多API密钥负载均衡池
+    
+    同一提供商配置多个活跃密钥时，按最少在途请求数（默认）或平滑加权轮询选择密钥，
+    把流量分摊到各密钥的限额上。收到429的密钥进入冷却期，冷却期内不再被选中，
+    除非该提供商的所有密钥都在冷却中。状态按密钥字符串记录，与数据库记录解耦。
+    """
+    
+    def __init__(self, strategy: Optional[str] = None):
+        """
+        初始化密钥池
+        
+        Args:
+            strategy: 选择策略，least_in_flight或weighted_round_robin，默认取配置
+        """
+        self.strategy = strategy or Config.AI_KEY_POOL_STRATEGY
+        self._states: Dict[str, KeyState] = {}
+        self._lock = threading.Lock()
+    
+    def select(self, provider: str, records: List[Any]) -> Optional[Any]:
+        """
+        从提供商的活跃密钥中选择一个
+        
+        Args:
+            provider: 提供商名称
+            records: 活跃的密钥记录，需要有api_key属性，可选weight属性
+        
+        Returns:
+            选中的密钥记录，没有可用密钥时返回None
+        """
+        records = [record for record in records if record.api_key]
+        if not records:
+            return None
+        
+        now = time.monotonic()
+        with self._lock:
+            states = [self._get_state(provider, record) for record in records]
+            candidates = [(record, state) for record, state in zip(records, states) if state.cooldown_until <= now]
+            if not candidates:
+                # 所有密钥都在冷却中时选择最早恢复的，由重试策略遵循Retry-After等待
+                record, state = min(zip(records, states), key=lambda item: item[1].cooldown_until)
+            elif self.strategy == WEIGHTED_ROUND_ROBIN:
+                total = 0
+                for _, state in candidates:
+                    state.current_weight += state.weight
+                    total += state.weight
+                record, state = max(candidates, key=lambda item: item[1].current_weight)
+                state.current_weight -= total
+            else:
+                # 在途请求数按权重折算，相同时选最久未被选中的，让并发突发也能分散到各密钥
+                record, state = min(candidates, key=lambda item: (item[1].in_flight / item[1].weight, item[1].last_selected))
+            state.last_selected = now
+            return record
+    
+    def acquire(self, api_key: str):
+        """
+        登记一次在途请求
+        
+        Args:
+            api_key: API密钥
+        """
+        with self._lock:
+            state = self._states.get(api_key)
+            if state is not None:
+                state.in_flight += 1
+                state.requests += 1
+    
+    def release(self, api_key: str):
+        """
+        结束一次在途请求
+        
+        Args:
+            api_key: API密钥
+        """
+        with self._lock:
+            state = self._states.get(api_key)
+            if state is not None:
+                state.in_flight = max(state.in_flight - 1, 0)
+    
+    @contextmanager
+    def lease(self, api_key: str):
+        """
+        在with块执行期间把请求计入密钥的在途请求数
+        
+        Args:
+            api_key: API密钥
+        """
+        self.acquire(api_key)
+        try:
+            yield
+        finally:
+            self.release(api_key)
+    
+    def track(self, stream: Iterable[StreamDelta], api_key: str) -> 'TrackedStream':
+        """
+        透传流式响应，流结束、关闭或被回收时结束密钥的一次在途请求
+        
+        调用方应在发起请求前acquire，使等待响应头的时间也计入在途请求。
+        
+        Args:
+            stream: 流式响应迭代器
+            api_key: API密钥
+        
+        Returns:
+            包装后的迭代器，调用方还没开始迭代就丢弃时也会归还在途计数
+        """
+        return TrackedStream(self, stream, api_key)
+    
+    def record_error(self, api_key: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        """
+        记录一次调用失败，429时让密钥进入冷却期
+        
+        Args:
+            api_key: API密钥
+            status: HTTP状态码，没有响应时为None
+            retry_after: 响应中的Retry-After（秒）
+        """
+        with self._lock:
+            state = self._states.get(api_key)
+            if state is None:
+                return
+            state.errors += 1
+            if status != 429:
+                return
+            state.rate_limited += 1
+            seconds = min(retry_after if retry_after is not None else Config.AI_KEY_COOLDOWN_SECONDS,
+                          Config.AI_KEY_COOLDOWN_MAX_SECONDS)
+            state.cooldown_until = max(state.cooldown_until, time.monotonic() + seconds)
+    
+    def get_key_stats(self, api_key: str) -> dict:
+        """
+        获取单个密钥的计数
+        
+        Args:
+            api_key: API密钥
+        
+        Returns:
+            包含在途请求数、请求数、错误数、限流次数、剩余冷却时间的字典，未使用过的密钥计数为0
+        """
+        with self._lock:
+            state = self._states.get(api_key)
+            if state is None:
+                return {'in_flight': 0, 'requests': 0, 'errors': 0, 'rate_limited': 0, 'cooldown': 0}
+            return {
+                'in_flight': state.in_flight,
+                'requests': state.requests,
+                'errors': state.errors,
+                'rate_limited': state.rate_limited,
+                'cooldown': round(max(state.cooldown_until - time.monotonic(), 0), 1)
+            }
+    
+    def reset(self, provider: Optional[str] = None):
+        """
+        结束密钥的冷却期
+        
+        Args:
+            provider: 提供商名称，为空时处理所有密钥
+        """
+        with self._lock:
+            for state in self._states.values():
+                if provider is None or state.provider == provider:
+                    state.cooldown_until = 0.0
+    
+    def _get_state(self, provider: str, record: Any) -> KeyState:
+        """获取密钥状态，不存在时创建，并同步记录中的权重（调用方持有锁）"""
+        weight = max(int(getattr(record, 'weight', None) or 1), 1)
+        state = self._states.get(record.api_key)
+        if state is None:
+            state = self._states[record.api_key] = KeyState(provider, weight)
+        state.provider = provider
+        state.weight = weight
+        return state
+
+# 进程内共享的密钥池
+key_pool = KeyPool()
\ No newline at end of file
@@ -0,0 +1,370 @@
+import json
+import httpx
+import requests
+from typing import Union, Iterator, AsyncIterator, Iterable, Optional, Tuple
+from .base_client import BaseAIClient
+from .prompt_cache import get_prefix_key, normalize_usage, should_cache_prefix
+from .stream import StreamDelta
+from .timeouts import PhaseTimeoutError, StreamDeadline, atrack_deadline, track_deadline
+
+class OpenAICompatibleClient(BaseAIClient):
+    """兼容OpenAI Chat Completions协议的客户端基类"""
+    
+    # 请求体中除max_tokens、temperature外附带的采样参数
+    sampling_params: tuple = ('top_p', 'frequency_penalty', 'presence_penalty', 'seed')
+    
+    # 是否将system_message作为system角色消息发送
+    supports_system_message: bool = True
+    
+    # 是否通过OpenAI SDK进行流式调用
+    use_sdk_stream: bool = False
+    
+    # 是否支持prompt_cache_key参数，稳定前缀较长时按前缀哈希设置，提高提示词缓存命中率
+    supports_prompt_cache_key: bool = False
+    
+    # 流式调用是否需要通过stream_options请求在最后一个块中返回用量，不支持该参数的提供商默认返回用量或不返回
+    stream_usage: bool = False
+    
+    # 是否支持OpenAI Batch API（/files和/batches），支持时批处理任务默认提交给提供商执行
+    supports_batch_api: bool = False
+    
+    # 批处理请求文件中每行的url，即提供商侧的Chat Completions路径
+    batch_endpoint: str = '/v1/chat/completions'
+    
+    @property
+    def supports_seed(self) -> bool:
+        """只有sampling_params中包含seed时才会把seed发送给提供商"""
+        return 'seed' in self.sampling_params
+    
+    def call_stream(self, model: str, message: str, **kwargs) -> Union[Iterator[StreamDelta], None]:
+        if not self.use_sdk_stream:
+            return super().call_stream(model, message, **kwargs)
+        
+        params = self._get_default_params()
+        params.update(kwargs)
+        
+        try:
+            client = self._get_openai_client()
+            payload = self._build_request(model, message, params, stream=True)['json']
+            prompt = self._measure_prompt(message, params)
+            tokens = self._estimate_request_tokens(model, prompt, params)
+            deadline = StreamDeadline(self.display_name, params)
+            # SDK的读超时在发起请求时确定，无法按剩余时间调整，只作兜底，截止时间在收到每个块时检查
+            timeout = httpx.Timeout(deadline.read_timeout, connect=deadline.connect_timeout)
+            
+            def attempt():
+                try:
+                    return client.chat.completions.create(**payload, timeout=timeout)
+                except Exception as e:
+                    raise self._phase_timeout(e.__cause__, deadline.connect_timeout, deadline) or e
+            
+            stream = self._call_with_retry(attempt, tokens)
+        except PhaseTimeoutError as e:
+            print(f"{self.display_name}流式API调用超时: {e}")
+            raise
+        except Exception as e:
+            print(f"{self.display_name}流式API调用错误: {e}")
+            return None
+        
+        return self._track_usage(track_deadline(self._iter_sdk_stream(stream, deadline), deadline), model, prompt)
+    
+    async def acall_stream(self, model: str, message: str, **kwargs) -> Union[AsyncIterator[StreamDelta], None]:
+        if not self.use_sdk_stream:
+            return await super().acall_stream(model, message, **kwargs)
+        
+        params = self._get_default_params()
+        params.update(kwargs)
+        
+        try:
+            client = self._get_async_openai_client()
+            payload = self._build_request(model, message, params, stream=True)['json']
+            prompt = self._measure_prompt(message, params)
+            tokens = self._estimate_request_tokens(model, prompt, params)
+            deadline = StreamDeadline(self.display_name, params)
+            timeout = httpx.Timeout(deadline.read_timeout, connect=deadline.connect_timeout)
+            
+            async def attempt():
+                try:
+                    return await client.chat.completions.create(**payload, timeout=timeout)
+                except Exception as e:
+                    raise self._phase_timeout(e.__cause__, deadline.connect_timeout, deadline) or e
+            
+            stream = await self._acall_with_retry(attempt, tokens)
+        except PhaseTimeoutError as e:
+            print(f"{self.display_name}流式API调用超时: {e}")
+            raise
+        except Exception as e:
+            print(f"{self.display_name}流式API调用错误: {e}")
+            return None
+        
+        return self._atrack_usage(atrack_deadline(self._aiter_sdk_stream(stream, deadline), deadline), model, prompt)
+    
+    def _build_messages(self, message: str, params: dict) -> list:
+        """
+        构建消息列表，系统消息和历史对话在前，保持前缀稳定以便提供商缓存
+        
+        Args:
+            message: 用户消息
+            params: 请求参数
+        
+        Returns:
+            消息列表
+        """
+        messages = []
+        if self.supports_system_message and 'system_message' in params:
+            messages.append({
+                "role": "system",
+                "content": params['system_message']
+            })
+        
+        for item in params.get('history') or ():
+            messages.append({
+                "role": item['role'],
+                "content": item['content']
+            })
+        
+        messages.append({
+            "role": "user",
+            "content": message
+        })
+        return messages
+    
+    def _build_request(self, model: str, message: str, params: dict, stream: bool) -> dict:
+        payload = {
+            "model": model,
+            "messages": self._build_messages(message, params),
+            "max_tokens": params.get('max_tokens', 2048),
+            "temperature": params.get('temperature', 0.7)
+        }
+        for name in self.sampling_params:
+            if name in params:
+                payload[name] = params[name]
+        
+        if stream:
+            payload['stream'] = True
+            if self.stream_usage:
+                payload['stream_options'] = {'include_usage': True}
+        
+        # 系统消息和历史对话组成的前缀足够长时，按前缀哈希设置缓存键
+        if self.supports_prompt_cache_key and should_cache_prefix(params):
+            payload['prompt_cache_key'] = get_prefix_key(model, params)
+        
+        # 添加stop参数支持
+        if params.get('stop'):
+            payload['stop'] = params['stop']
+        
+        return {
+            'url': f"{self.base_url}/chat/completions",
+            'headers': {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            'json': payload
+        }
+    
+    def _parse_response(self, result: dict) -> Optional[str]:
+        if 'choices' in result and len(result['choices']) > 0:
+            return result['choices'][0]['message']['content']
+        return None
+    
+    def _parse_stream_data(self, data: dict) -> Iterator[StreamDelta]:
+        content = reasoning = finish_reason = None
+        usage = data.get('usage')
+        choices = data.get('choices')
+        if choices:
+            choice = choices[0]
+            delta = choice.get('delta') or {}
+            content = delta.get('content')
+            # DeepSeek-R1、Qwen等推理模型使用reasoning_content，部分聚合平台使用reasoning
+            reasoning = delta.get('reasoning_content') or delta.get('reasoning')
+            finish_reason = choice.get('finish_reason')
+            # Moonshot在最后一个块的choice中返回用量
+            usage = usage or choice.get('usage')
+        usage = normalize_usage(usage)
+        
+        if content or reasoning or finish_reason or usage:
+            yield StreamDelta(content or None, reasoning or None, finish_reason, usage)
+    
+    def _parse_sdk_chunk(self, chunk) -> Optional[StreamDelta]:
+        """
+        将OpenAI SDK的ChatCompletionChunk转换为流式增量
+        
+        Args:
+            chunk: SDK返回的流式响应块
+        
+        Returns:
+            流式增量，没有有效内容时返回None
+        """
+        content = reasoning = finish_reason = None
+        if chunk.choices:
+            choice = chunk.choices[0]
+            delta = choice.delta
+            if delta is not None:
+                content = delta.content
+                # SDK的ChoiceDelta没有声明推理字段，提供商返回的额外字段保留在模型属性中
+                reasoning = getattr(delta, 'reasoning_content', None) or getattr(delta, 'reasoning', None)
+            finish_reason = choice.finish_reason
+        # 保留提供商返回的额外字段，缓存命中数等用量字段的名称各不相同
+        usage = normalize_usage(chunk.usage.model_dump()) if chunk.usage else None
+        
+        if content or reasoning or finish_reason or usage:
+            return StreamDelta(content or None, reasoning or None, finish_reason, usage)
+        return None
+    
+    def _iter_sdk_stream(self, stream, deadline: Optional[StreamDeadline] = None) -> Iterator[StreamDelta]:
+        """
+        将SDK流式响应转换为流式增量，结束后关闭响应
+        
+        Args:
+            stream: openai.Stream对象
+            deadline: 截止时间，用于转换httpx兜底的读超时
+        
+        Yields:
+            流式响应增量
+        """
+        try:
+            for chunk in stream:
+                delta = self._parse_sdk_chunk(chunk)
+                if delta is not None:
+                    yield delta
+        except httpx.ReadTimeout as e:
+            if deadline is None:
+                raise
+            raise deadline.error() from e
+        finally:
+            stream.close()
+    
+    async def _aiter_sdk_stream(self, stream, deadline: Optional[StreamDeadline] = None) -> AsyncIterator[StreamDelta]:
+        """
+        将异步SDK流式响应转换为流式增量，结束后关闭响应
+        
+        Args:
+            stream: openai.AsyncStream对象
+            deadline: 截止时间，用于转换httpx兜底的读超时
+        
+        Yields:
+            流式响应增量
+        """
+        try:
+            async for chunk in stream:
+                delta = self._parse_sdk_chunk(chunk)
+                if delta is not None:
+                    yield delta
+        except httpx.ReadTimeout as e:
+            if deadline is None:
+                raise
+            raise deadline.error() from e
+        finally:
+            await stream.close()
+    
+    def create_batch(self, model: str, requests: Iterable[Tuple[str, str, dict]]) -> dict:
+        """
+        上传请求文件并创建提供商批处理
+        
+        Args:
+            model: 模型名称
+            requests: (custom_id, 用户消息, 参数)序列
+        
+        Returns:
+            提供商返回的批处理对象，包含id和status
+        """
+        lines = []
+        for custom_id, message, kwargs in requests:
+            params = self._get_default_params()
+            params.update(kwargs)
+            lines.append(json.dumps({
+                'custom_id': custom_id,
+                'method': 'POST',
+                'url': self.batch_endpoint,
+                'body': self._build_request(model, message, params, stream=False)['json']
+            }, ensure_ascii=False))
+        content = '\n'.join(lines).encode('utf-8')
+        uploaded = self._batch_request('POST', '/files', data={'purpose': 'batch'},
+                                       files={'file': ('batch.jsonl', content, 'application/jsonl')}).json()
+        return self._batch_request('POST', '/batches', json={
+            'input_file_id': uploaded['id'],
+            'endpoint': self.batch_endpoint,
+            'completion_window': '24h'
+        }).json()
+    
+    def retrieve_batch(self, batch_id: str) -> dict:
+        """
+        查询提供商批处理的状态
+        
+        Args:
+            batch_id: 提供商批处理ID
+        
+        Returns:
+            批处理对象，完成后包含output_file_id和error_file_id
+        """
+        return self._batch_request('GET', f'/batches/{batch_id}').json()
+    
+    def cancel_batch(self, batch_id: str) -> dict:
+        """
+        取消提供商批处理，已完成的请求仍会出现在结果文件中
+        
+        Args:
+            batch_id: 提供商批处理ID
+        
+        Returns:
+            批处理对象
+        """
+        return self._batch_request('POST', f'/batches/{batch_id}/cancel').json()
+    
+    def iter_batch_results(self, file_id: str) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+        """
+        逐行读取批处理结果文件或错误文件
+        
+        Args:
+            file_id: output_file_id或error_file_id
+        
+        Yields:
+            (custom_id, 回复内容, 错误信息)，成功时错误信息为None
+        """
+        response = self._batch_request('GET', f'/files/{file_id}/content', stream=True)
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                record = json.loads(line)
+                result = record.get('response') or {}
+                body = result.get('body') or {}
+                error = record.get('error') or body.get('error')
+                if error or result.get('status_code', 200) >= 400:
+                    message = error.get('message') if isinstance(error, dict) else error
+                    yield record['custom_id'], None, message or f"HTTP {result.get('status_code')}"
+                else:
+                    yield record['custom_id'], self._parse_response(body), None
+        finally:
+            response.close()
+    
+    def _batch_request(self, method: str, path: str, stream: bool = False, **kwargs) -> requests.Response:
+        """
+        调用提供商的文件和批处理接口，经过限流和熔断器检查并按重试策略重试临时错误
+        
+        Args:
+            method: HTTP方法
+            path: 相对base_url的路径
+            stream: 是否流式读取响应
+            **kwargs: 传递给requests的参数
+        
+        Returns:
+            状态码检查通过的响应
+        """
+        def attempt():
+            response = self.session.request(
+                method,
+                f"{self.base_url}{path}",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                stream=stream,
+                timeout=60,
+                **kwargs
+            )
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError:
+                response.close()
+                raise
+            return response
+        
+        return self._call_with_retry(attempt)
\ No newline at end of file
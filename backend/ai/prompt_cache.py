@@ -0,0 +1,185 @@
+import hashlib
+import json
+import threading
+from typing import AsyncIterator, Dict, Iterator, Optional, Tuple
+
+from models.config import Config
+from .stream import StreamDelta
+from .token_estimator import estimate_tokens
+
+def get_prefix_tokens(params: dict) -> int:
+    """
+    估算请求中稳定前缀（系统消息和历史对话）的token数
+    
+    Args:
+        params: 合并默认值后的参数，历史对话为history参数中的[{'role': ..., 'content': ...}]
+    
+    Returns:
+        估算的token数
+    """
+    tokens = estimate_tokens(params.get('system_message') or '')
+    for item in params.get('history') or ():
+        tokens += estimate_tokens(item.get('content') or '')
+    return tokens
+
+def should_cache_prefix(params: dict) -> bool:
+    """
+    判断是否需要标记稳定前缀：开启了提示词前缀缓存，且前缀长度达到提供商缓存的最低要求
+    
+    Args:
+        params: 合并默认值后的参数
+    
+    Returns:
+        是否标记前缀
+    """
+    return Config.AI_PROMPT_CACHE_ENABLED and get_prefix_tokens(params) >= Config.AI_PROMPT_CACHE_MIN_TOKENS
+
+def get_prefix_key(model: str, params: dict) -> str:
+    """
+    计算稳定前缀的哈希，作为OpenAI的prompt_cache_key，使前缀相同的请求路由到同一缓存
+    
+    Args:
+        model: 模型名称
+        params: 合并默认值后的参数
+    
+    Returns:
+        前缀哈希
+    """
+    payload = json.dumps([model, params.get('system_message') or '', params.get('history') or []],
+                         ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+def normalize_usage(usage: Optional[dict]) -> Optional[dict]:
+    """
+    把各提供商的token用量统一为prompt_tokens、completion_tokens、total_tokens，
+    命中或写入提示词缓存的token数分别记为cache_read_tokens、cache_write_tokens
+    
+    支持的格式：OpenAI（prompt_tokens_details.cached_tokens）、DeepSeek（prompt_cache_hit_tokens）、
+    Moonshot（cached_tokens）、Anthropic（input_tokens不含缓存部分，另有cache_read_input_tokens、
+    cache_creation_input_tokens）。
+    
+    Args:
+        usage: 提供商返回的用量
+    
+    Returns:
+        统一后的用量，没有用量时返回None
+    """
+    if not usage:
+        return None
+    result = {}
+    if 'input_tokens' in usage:
+        cache_read = usage.get('cache_read_input_tokens') or 0
+        cache_write = usage.get('cache_creation_input_tokens') or 0
+        result['prompt_tokens'] = (usage.get('input_tokens') or 0) + cache_read + cache_write
+    else:
+        cache_read = ((usage.get('prompt_tokens_details') or {}).get('cached_tokens')
+                      or usage.get('prompt_cache_hit_tokens') or usage.get('cached_tokens') or 0)
+        cache_write = 0
+        if usage.get('prompt_tokens') is not None:
+            result['prompt_tokens'] = usage['prompt_tokens']
+    completion = usage.get('completion_tokens', usage.get('output_tokens'))
+    if completion is not None:
+        result['completion_tokens'] = completion
+    if usage.get('total_tokens') is not None:
+        result['total_tokens'] = usage['total_tokens']
+    if cache_read:
+        result['cache_read_tokens'] = cache_read
+    if cache_write:
+        result['cache_write_tokens'] = cache_write
+    return result
+
+class PromptCacheTracker:
+    """统计各提供商/模型的输入token数，以及提供商报告的提示词缓存命中和写入token数"""
+    
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, provider: str, model: str, usage: Optional[dict]):
+        """
+        记录一次请求的token用量
+        
+        Args:
+            provider: 提供商名称
+            model: 模型名称
+            usage: 统一后的用量，为空时不记录
+        """
+        if not usage:
+            return
+        with self._lock:
+            stats = self._stats.get((provider, model))
+            if stats is None:
+                stats = self._stats[(provider, model)] = {
+                    'requests': 0, 'prompt_tokens': 0, 'cache_read_tokens': 0, 'cache_write_tokens': 0
+                }
+            stats['requests'] += 1
+            for name in ('prompt_tokens', 'cache_read_tokens', 'cache_write_tokens'):
+                stats[name] += usage.get(name) or 0
+    
+    def track(self, stream: Iterator[StreamDelta], provider: str, model: str) -> Iterator[StreamDelta]:
+        """
+        透传流式响应，结束时按键合并各增量中的用量并记录
+        
+        Args:
+            stream: 流式响应迭代器
+            provider: 提供商名称
+            model: 模型名称
+        
+        Yields:
+            流式响应增量
+        """
+        usage = {}
+        try:
+            for delta in stream:
+                if delta.usage:
+                    usage.update(delta.usage)
+                yield delta
+        finally:
+            close = getattr(stream, 'close', None)
+            if close is not None:
+                close()
+            self.record(provider, model, usage)
+    
+    async def atrack(self, stream: AsyncIterator[StreamDelta], provider: str, model: str) -> AsyncIterator[StreamDelta]:
+        """
+        track的异步版本
+        
+        Args:
+            stream: 异步流式响应迭代器
+            provider: 提供商名称
+            model: 模型名称
+        
+        Yields:
+            流式响应增量
+        """
+        usage = {}
+        try:
+            async for delta in stream:
+                if delta.usage:
+                    usage.update(delta.usage)
+                yield delta
+        finally:
+            aclose = getattr(stream, 'aclose', None)
+            if aclose is not None:
+                await aclose()
+            self.record(provider, model, usage)
+    
+    def get_stats(self) -> Dict[str, dict]:
+        """
+        获取各提供商/模型的提示词缓存统计
+        
+        Returns:
+            以"提供商/模型"为键的统计字典，包含请求数、输入token数、缓存命中和写入token数，
+            以及缓存命中token占输入token的比例
+        """
+        with self._lock:
+            items = sorted((key, dict(value)) for key, value in self._stats.items())
+        stats = {}
+        for (provider, model), value in items:
+            prompt_tokens = value['prompt_tokens']
+            value['cache_hit_rate'] = round(value['cache_read_tokens'] / prompt_tokens, 3) if prompt_tokens else 0.0
+            stats[f"{provider}/{model}"] = value
+        return stats
+
+# 进程内共享的提示词缓存统计
+prompt_cache_tracker = PromptCacheTracker()
\ No newline at end of file
@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from models.config import Config
+
+class RateLimitExceeded(Exception):
+    """API密钥的RPM/TPM额度不足，且等待时间超过上限，请求未发出即失败"""
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class RateLimiter:
+    """
+    按API密钥的令牌桶限流器，在请求发出前检查RPM（每分钟请求数）和TPM（每分钟token数）
+    
+    桶状态保存在本地SQLite文件中，同一台机器上的多个gunicorn worker共享额度；
+    每次扣减在一个IMMEDIATE事务内完成读取、补充和写回，保证跨进程原子性。
+    TPM按估算的输入token加max_tokens预扣，与多数提供商的计算方式一致。
+    额度不足时在等待上限内排队，超过上限则直接拒绝。
+    """
+    
+    def __init__(self, path: Optional[str] = None, max_wait: Optional[float] = None):
+        """
+        初始化限流器，未指定的参数取配置
+        
+        Args:
+            path: 共享存储的SQLite文件路径
+            max_wait: 额度不足时最多排队等待的时间（秒），为0时直接拒绝
+        """
+        self.path = path or Config.AI_RATE_LIMIT_DB
+        self.max_wait = Config.AI_RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+        # 密钥配额缓存：api_key -> (rpm, tpm, 读取时间)
+        self._limits: Dict[str, Tuple[Optional[int], Optional[int], float]] = {}
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+    
+    def set_limits(self, api_key: str, rpm: Optional[int], tpm: Optional[int]):
+        """
+        更新密钥配额缓存，调用方已持有最新的密钥记录时使用，避免再次查询数据库
+        
+        Args:
+            api_key: API密钥
+            rpm: 每分钟请求数上限，为空或0表示不限
+            tpm: 每分钟token数上限，为空或0表示不限
+        """
+        self._limits[api_key] = (rpm or None, tpm or None, time.monotonic())
+    
+    def get_limits(self, api_key: str) -> Tuple[Optional[int], Optional[int]]:
+        """
+        获取密钥配额，缓存过期时从ApiKey表读取
+        
+        Args:
+            api_key: API密钥
+        
+        Returns:
+            (rpm, tpm)，不限时为None
+        """
+        cached = self._limits.get(api_key)
+        if cached and time.monotonic() - cached[2] < Config.AI_CLIENT_REGISTRY_TTL:
+            return cached[0], cached[1]
+        
+        try:
+            # 导入数据库模型（延迟导入避免循环依赖）
+            from models.models import ApiKey
+            record = ApiKey.query.filter_by(api_key=api_key, is_active=True).first()
+        except Exception:
+            # 不在应用上下文中（如对冲请求的后台线程）时沿用旧缓存
+            return (cached[0], cached[1]) if cached else (None, None)
+        
+        rpm, tpm = (record.rpm_limit, record.tpm_limit) if record else (None, None)
+        self.set_limits(api_key, rpm, tpm)
+        return rpm or None, tpm or None
+    
+    def evict(self):
+        """清除密钥配额缓存，在API密钥配置变更后调用"""
+        self._limits.clear()
+    
+    def acquire(self, api_key: str, tokens: int = 0):
+        """
+        为一次请求扣减额度，额度不足时阻塞等待
+        
+        Args:
+            api_key: API密钥
+            tokens: 预估的token数
+        
+        Raises:
+            RateLimitExceeded: 等待时间超过上限
+        """
+        rpm, tpm = self.get_limits(api_key)
+        if not rpm and not tpm:
+            return
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            wait = self._take(api_key, rpm, tpm, tokens)
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise RateLimitExceeded(f"API密钥额度不足（RPM {rpm or '不限'}，TPM {tpm or '不限'}），请{wait:.1f}秒后重试", wait)
+            time.sleep(wait)
+    
+    async def aacquire(self, api_key: str, tokens: int = 0):
+        """
+        acquire的异步版本，等待和扣减额度期间都不阻塞事件循环
+        
+        Args:
+            api_key: API密钥
+            tokens: 预估的token数
+        """
+        rpm, tpm = self.get_limits(api_key)
+        if not rpm and not tpm:
+            return
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            # 扣减在SQLite事务中进行，并发时可能等待数据库锁，放到线程池中执行
+            wait = await asyncio.to_thread(self._take, api_key, rpm, tpm, tokens)
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise RateLimitExceeded(f"API密钥额度不足（RPM {rpm or '不限'}，TPM {tpm or '不限'}），请{wait:.1f}秒后重试", wait)
+            await asyncio.sleep(wait)
+    
+    def get_stats(self, api_key: str) -> dict:
+        """
+        获取密钥的配额和当前剩余额度（不扣减）
+        
+        Args:
+            api_key: API密钥
+        
+        Returns:
+            包含rpm_limit、tpm_limit、rpm_remaining、tpm_remaining的字典，不限时为None
+        """
+        rpm, tpm = self.get_limits(api_key)
+        stats = {'rpm_limit': rpm, 'tpm_limit': tpm, 'rpm_remaining': None, 'tpm_remaining': None}
+        if not rpm and not tpm:
+            return stats
+        now = time.time()
+        conn = self._connect()
+        for name, limit in (('rpm', rpm), ('tpm', tpm)):
+            if not limit:
+                continue
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?',
+                               (self._bucket_key(name, api_key),)).fetchone()
+            available = limit if row is None else min(limit, row[0] + (now - row[1]) * limit / 60)
+            stats[f'{name}_remaining'] = int(available)
+        return stats
+    
+    def _take(self, api_key: str, rpm: Optional[int], tpm: Optional[int], tokens: int) -> float:
+        """
+        尝试同时从RPM桶扣1、从TPM桶扣tokens，两者都足够时才扣减
+        
+        Returns:
+            0表示扣减成功，否则为额度补足所需的等待时间（秒）
+        """
+        now = time.time()
+        buckets = []
+        if rpm:
+            buckets.append((self._bucket_key('rpm', api_key), rpm, 1))
+        if tpm:
+            # 单次请求超过整个桶容量时按容量扣减，避免永远无法放行
+            buckets.append((self._bucket_key('tpm', api_key), tpm, min(max(tokens, 1), tpm)))
+        
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            states = []
+            wait = 0.0
+            for key, limit, cost in buckets:
+                row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                rate = limit / 60
+                available = limit if row is None else min(limit, row[0] + (now - row[1]) * rate)
+                if available < cost:
+                    wait = max(wait, (cost - available) / rate)
+                states.append((key, available - cost))
+            if wait <= 0:
+                conn.executemany('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                                 [(key, remaining, now) for key, remaining in states])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+    
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的SQLite连接，首次使用时建表"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    conn.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+                    self._initialized = True
+            self._local.conn = conn
+        return conn
+    
+    @staticmethod
+    def _bucket_key(name: str, api_key: str) -> str:
+        """桶名，共享存储中只保存密钥的摘要"""
+        return f"{name}:{hashlib.sha256(api_key.encode()).hexdigest()[:16]}"
+
+# 进程内共享的限流器，桶状态通过SQLite文件在worker之间共享
+rate_limiter = RateLimiter()
\ No newline at end of file
@@ -0,0 +1,284 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Iterator, Optional, Tuple
+
+from models.config import Config
+from .stream import StreamDelta
+
+# 命中缓存后流式回放时每个增量的最大字符数
+REPLAY_CHUNK_SIZE = 1024
+
+class CachedResponse:
+    """缓存的完整响应"""
+    
+    __slots__ = ('content', 'reasoning')
+    
+    def __init__(self, content: str, reasoning: Optional[str] = None):
+        self.content = content
+        self.reasoning = reasoning
+    
+    @property
+    def size(self) -> int:
+        """占用的字节数"""
+        return len(self.content.encode('utf-8')) + len((self.reasoning or '').encode('utf-8'))
+    
+    def to_json(self) -> str:
+        return json.dumps({'content': self.content, 'reasoning': self.reasoning}, ensure_ascii=False)
+    
+    @classmethod
+    def from_json(cls, value: str) -> 'CachedResponse':
+        data = json.loads(value)
+        return cls(data['content'], data.get('reasoning'))
+
+class CachedStream:
+    """命中缓存时的流式响应，不经过网络，立即按块产出完整响应"""
+    
+    def __init__(self, response: CachedResponse):
+        self.response = response
+    
+    def __iter__(self) -> Iterator[StreamDelta]:
+        reasoning = self.response.reasoning or ''
+        for start in range(0, len(reasoning), REPLAY_CHUNK_SIZE):
+            yield StreamDelta(reasoning=reasoning[start:start + REPLAY_CHUNK_SIZE])
+        content = self.response.content
+        for start in range(0, len(content), REPLAY_CHUNK_SIZE):
+            yield StreamDelta(content=content[start:start + REPLAY_CHUNK_SIZE])
+        yield StreamDelta(finish_reason='stop')
+    
+    async def __aiter__(self) -> AsyncIterator[StreamDelta]:
+        for delta in self:
+            yield delta
+
+def record_stream(stream: Iterator[StreamDelta], on_complete: Callable[[CachedResponse], None]) -> Iterator[StreamDelta]:
+    """
+    透传流式响应，正常结束时把完整响应交给on_complete写入缓存
+    
+    Args:
+        stream: 流式响应迭代器
+        on_complete: 接收完整响应的回调
+    
+    Yields:
+        流式响应增量
+    """
+    content = []
+    reasoning = []
+    finish_reason = None
+    try:
+        for delta in stream:
+            if delta.content:
+                content.append(delta.content)
+            if delta.reasoning:
+                reasoning.append(delta.reasoning)
+            if delta.finish_reason:
+                finish_reason = delta.finish_reason
+            yield delta
+    finally:
+        close = getattr(stream, 'close', None)
+        if close is not None:
+            close()
+    # 只缓存提供商明确结束的响应，中途断开或出错的不缓存
+    if finish_reason:
+        on_complete(CachedResponse(''.join(content), ''.join(reasoning) or None))
+
+async def arecord_stream(stream: AsyncIterator[StreamDelta], on_complete: Callable[[CachedResponse], None]) -> AsyncIterator[StreamDelta]:
+    """
+    record_stream的异步版本
+    
+    Args:
+        stream: 异步流式响应迭代器
+        on_complete: 接收完整响应的回调
+    
+    Yields:
+        流式响应增量
+    """
+    content = []
+    reasoning = []
+    finish_reason = None
+    try:
+        async for delta in stream:
+            if delta.content:
+                content.append(delta.content)
+            if delta.reasoning:
+                reasoning.append(delta.reasoning)
+            if delta.finish_reason:
+                finish_reason = delta.finish_reason
+            yield delta
+    finally:
+        aclose = getattr(stream, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+    if finish_reason:
+        on_complete(CachedResponse(''.join(content), ''.join(reasoning) or None))
+
+class ResponseCache:
+    """
+    确定性请求（temperature为0或指定了seed）的精确匹配响应缓存
+    
+    内存层按LRU淘汰，限制总字节数，每个条目有TTL；可选的SQLite持久层在进程重启后
+    以及同一台机器的多个worker之间共享缓存，内存未命中时查询并回填内存层。
+    """
+    
+    def __init__(self, max_bytes: Optional[int] = None, ttl: Optional[float] = None, path: Optional[str] = None):
+        """
+        初始化响应缓存，未指定的参数取配置
+        
+        Args:
+            max_bytes: 内存层缓存内容的总字节数上限
+            ttl: 缓存有效期（秒）
+            path: SQLite持久层文件路径，为空时不启用持久层
+        """
+        self.max_bytes = Config.AI_RESPONSE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.ttl = ttl or Config.AI_RESPONSE_CACHE_TTL
+        self.path = Config.AI_RESPONSE_CACHE_DB if path is None else path
+        # key -> (响应, 过期时间, 字节数)
+        self._entries: 'OrderedDict[str, Tuple[CachedResponse, float, int]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+    
+    @staticmethod
+    def is_cacheable(params: dict, supports_seed: bool = False) -> bool:
+        """
+        判断请求是否可以缓存：temperature为0，或客户端会把seed传给提供商且显式指定了seed
+        
+        Args:
+            params: 合并默认值后的参数
+            supports_seed: 客户端是否把seed参数发送给提供商，不发送时指定seed的请求仍是随机采样
+        
+        Returns:
+            是否可以缓存
+        """
+        if params.get('temperature') == 0:
+            return True
+        return supports_seed and params.get('seed') is not None
+    
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """
+        查询缓存，依次查询内存层和持久层
+        
+        Args:
+            key: 缓存键
+        
+        Returns:
+            缓存的响应，未命中或已过期时返回None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return entry[0]
+                self._remove(key)
+        
+        if self.path:
+            try:
+                row = self._connect().execute(
+                    'SELECT value, expires_at FROM responses WHERE key = ? AND expires_at > ?', (key, now)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"读取响应缓存持久层失败: {e}")
+                row = None
+            if row:
+                response = CachedResponse.from_json(row[0])
+                with self._lock:
+                    self._stats['disk_hits'] += 1
+                    self._put(key, response, row[1])
+                return response
+        
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+    
+    def set(self, key: str, response: CachedResponse):
+        """
+        写入缓存
+        
+        Args:
+            key: 缓存键
+            response: 完整响应
+        """
+        if not response.content:
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._stats['stores'] += 1
+            self._put(key, response, expires_at)
+        
+        if self.path:
+            try:
+                conn = self._connect()
+                conn.execute('INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)',
+                             (key, response.to_json(), expires_at))
+                # 顺带清理过期条目，持久层只按TTL淘汰
+                if self._stats['stores'] % 100 == 0:
+                    conn.execute('DELETE FROM responses WHERE expires_at <= ?', (time.time(),))
+            except sqlite3.Error as e:
+                print(f"写入响应缓存持久层失败: {e}")
+    
+    def clear(self):
+        """清空内存层和持久层"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.path:
+            try:
+                self._connect().execute('DELETE FROM responses')
+            except sqlite3.Error as e:
+                print(f"清空响应缓存持久层失败: {e}")
+    
+    def get_stats(self) -> dict:
+        """
+        获取缓存统计
+        
+        Returns:
+            包含命中数、未命中数、命中率、条目数、字节数等信息的字典
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        hits = stats['memory_hits'] + stats['disk_hits']
+        stats['hits'] = hits
+        stats['hit_rate'] = round(hits / (hits + stats['misses']), 3) if hits + stats['misses'] else 0.0
+        stats['max_bytes'] = self.max_bytes
+        stats['persistent'] = bool(self.path)
+        return stats
+    
+    def _put(self, key: str, response: CachedResponse, expires_at: float):
+        """写入内存层并按LRU淘汰到字节上限以内（调用方持有锁）"""
+        size = response.size
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (response, expires_at, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats['evictions'] += 1
+    
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+    
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的SQLite连接，首次使用时建表"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)')
+            self._local.conn = conn
+        return conn
+
+# 进程内共享的响应缓存
+response_cache = ResponseCache()
\ No newline at end of file
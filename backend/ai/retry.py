@@ -0,0 +1,134 @@
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+import requests
+
+from models.config import Config
+from .timeouts import ConnectTimeoutError
+
+# 请求尚未被提供商处理的连接类错误，可以安全重试；读超时不在其中，避免重复等待
+RETRYABLE_ERRORS = (
+    requests.exceptions.ConnectionError,
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.RemoteProtocolError,
+    ConnectTimeoutError
+)
+
+class RetryPolicy:
+    """
+    重试策略：指数退避 + 全抖动，优先遵循Retry-After，以总截止时间而非次数决定何时放弃
+    
+    只用于收到响应正文之前的失败；流式响应一旦开始向用户转发就不再重试。
+    """
+    
+    def __init__(self, deadline: Optional[float] = None, base_delay: Optional[float] = None,
+                 max_delay: Optional[float] = None, retry_statuses: Optional[tuple] = None):
+        """
+        初始化重试策略，未指定的参数取配置
+        
+        Args:
+            deadline: 从首次请求开始计算的重试总时长（秒），为0时不重试
+            base_delay: 首次重试的退避基数（秒）
+            max_delay: 单次退避的上限（秒）
+            retry_statuses: 需要重试的HTTP状态码
+        """
+        self.deadline = Config.AI_RETRY_DEADLINE if deadline is None else deadline
+        self.base_delay = base_delay or Config.AI_RETRY_BASE_DELAY
+        self.max_delay = max_delay or Config.AI_RETRY_MAX_DELAY
+        self.retry_statuses = tuple(retry_statuses or Config.AI_RETRY_STATUSES)
+    
+    def is_retryable(self, error: Exception) -> bool:
+        """
+        判断异常是否可以重试
+        
+        Args:
+            error: 请求异常
+        
+        Returns:
+            状态码在重试列表中，或连接尚未建立/被提前断开时返回True
+        """
+        status = get_status_code(error)
+        if status is not None:
+            return status in self.retry_statuses
+        # OpenAI SDK只在使用SDK的客户端中按需导入，未导入时不可能抛出SDK的异常
+        openai = sys.modules.get('openai')
+        if openai is not None and isinstance(error, openai.APIConnectionError):
+            # APITimeoutError是APIConnectionError的子类，属于读超时，不重试
+            return not isinstance(error, openai.APITimeoutError)
+        return isinstance(error, RETRYABLE_ERRORS)
+    
+    def get_delay(self, error: Exception, attempt: int, deadline: float) -> Optional[float]:
+        """
+        计算下一次重试前的等待时间
+        
+        Args:
+            error: 本次请求的异常
+            attempt: 已重试次数（从0开始）
+            deadline: 截止时间（time.monotonic()）
+        
+        Returns:
+            等待时间（秒），不应重试或超过截止时间时返回None
+        """
+        if not self.is_retryable(error):
+            return None
+        
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+def get_status_code(error: Exception) -> Optional[int]:
+    """
+    从requests、httpx或OpenAI SDK的异常中获取HTTP状态码
+    
+    Args:
+        error: 请求异常
+    
+    Returns:
+        HTTP状态码，没有响应时返回None
+    """
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    解析异常响应中的Retry-After头，支持秒数和HTTP日期两种格式
+    
+    Args:
+        error: 请求异常
+    
+    Returns:
+        需要等待的秒数，没有该头或无法解析时返回None
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('Retry-After') or headers.get('retry-after')
+    if not value:
+        return None
+    
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
\ No newline at end of file
@@ -0,0 +1,284 @@
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Tuple, Union
+
+from models.config import Config
+from .response_cache import CachedResponse
+
+# MinHash签名长度，以及LSH分段数（每段SIGNATURE_SIZE // BANDS个值）
+SIGNATURE_SIZE = 32
+BANDS = 8
+# 每次查询最多精确校验的候选条目数，避免热门分桶拖慢查询
+MAX_CANDIDATES = 8
+# 规范化时保留的非字母数字字符，用于区分C/C++/C#等
+KEPT_SYMBOLS = frozenset('#')
+
+_MASK = (1 << 64) - 1
+_ROWS = SIGNATURE_SIZE // BANDS
+# 字母、数字和数学符号（+、=、<等）
+_KEPT_CATEGORIES = frozenset(('Lu', 'Ll', 'Lt', 'Lm', 'Lo', 'Nd', 'Nl', 'No', 'Sm'))
+
+def normalize(text: str) -> str:
+    """
+    规范化提示词：统一全半角和大小写，去掉空白、标点和控制字符，只保留字母、数字和数学符号
+    
+    Args:
+        text: 原始提示词
+    
+    Returns:
+        规范化后的文本
+    """
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return ''.join(char for char in text if char in KEPT_SYMBOLS or unicodedata.category(char) in _KEPT_CATEGORIES)
+
+def shingles(text: str) -> FrozenSet[str]:
+    """
+    把规范化文本切分为字符二元组集合，中文等不分词的语言也适用
+    
+    Args:
+        text: 规范化后的文本
+    
+    Returns:
+        二元组集合，文本不足两个字符时为文本本身
+    """
+    if len(text) < 2:
+        return frozenset((text,)) if text else frozenset()
+    return frozenset(text[i:i + 2] for i in range(len(text) - 1))
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """计算两个集合的Jaccard相似度"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def signature(items: FrozenSet[str]) -> Tuple[int, ...]:
+    """
+    计算MinHash签名（单次哈希分箱并做旋转补齐），两个签名中相等位置的比例近似两个集合的Jaccard相似度
+    
+    每个元素只计算一次哈希，按低位分到SIGNATURE_SIZE个箱中各取最小值，代价与提示词长度成正比。
+    
+    Args:
+        items: 二元组集合
+    
+    Returns:
+        长度为SIGNATURE_SIZE的签名
+    """
+    bins: List[Optional[int]] = [None] * SIGNATURE_SIZE
+    for item in items:
+        value = hash(item) & _MASK
+        index = value % SIGNATURE_SIZE
+        value //= SIGNATURE_SIZE
+        if bins[index] is None or value < bins[index]:
+            bins[index] = value
+    
+    # 空箱向右借用最近的非空箱，加上距离区分借用来源，保持相似集合的签名一致
+    filled = [index for index, value in enumerate(bins) if value is not None]
+    if not filled:
+        return tuple([0] * SIGNATURE_SIZE)
+    result = []
+    for index, value in enumerate(bins):
+        if value is None:
+            distance = next((source - index for source in filled if source > index),
+                            filled[0] + SIGNATURE_SIZE - index)
+            value = (bins[(index + distance) % SIGNATURE_SIZE] << 5) + distance
+        else:
+            value <<= 5
+        result.append(value)
+    return tuple(result)
+
+class _Entry:
+    """一条缓存的提示词及其响应"""
+    
+    __slots__ = ('scope', 'text', 'bands', 'response', 'expires_at')
+    
+    def __init__(self, scope: str, text: str, bands: Tuple[int, ...], response: CachedResponse, expires_at: float):
+        self.scope = scope
+        self.text = text
+        self.bands = bands
+        self.response = response
+        self.expires_at = expires_at
+
+class SimilarityCache:
+    """
+    近似重复提示词的响应缓存
+    
+    为每个缓存的提示词保存MinHash签名，并按LSH分段建立倒排索引：查询时只需计算一次签名、
+    查询BANDS个分桶，再对少量候选精确计算Jaccard相似度，代价与缓存条目数无关。
+    完全在本地计算，不依赖向量模型或外部服务。条目按LRU和TTL淘汰。
+    同一作用域（提供商、模型和生成参数）内的提示词才会互相命中。
+    """
+    
+    def __init__(self, threshold: Optional[float] = None, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        """
+        初始化近似缓存，未指定的参数取配置
+        
+        Args:
+            threshold: 命中所需的最低Jaccard相似度
+            ttl: 缓存有效期（秒）
+            max_entries: 最大条目数
+        """
+        self.threshold = threshold or Config.AI_SIMILARITY_CACHE_THRESHOLD
+        self.ttl = ttl or Config.AI_SIMILARITY_CACHE_TTL
+        self.max_entries = max_entries or Config.AI_SIMILARITY_CACHE_MAX_ENTRIES
+        self._entries: 'OrderedDict[int, _Entry]' = OrderedDict()
+        # 分桶 -> 条目ID，只有一个条目时直接保存ID以节省内存
+        self._buckets: Dict[int, Union[int, set]] = {}
+        # (作用域, 规范化文本) -> 条目ID，完全相同的规范化文本直接命中
+        self._exact: Dict[Tuple[str, str], int] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'exact_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self._lookup_time = 0.0
+    
+    def get(self, scope: str, prompt: str) -> Optional[CachedResponse]:
+        """
+        查找与提示词近似重复的缓存响应
+        
+        Args:
+            scope: 作用域，通常为提供商、模型和生成参数的哈希
+            prompt: 提示词
+        
+        Returns:
+            相似度达到阈值的缓存响应中最相似的一个，未命中时返回None
+        """
+        started = time.perf_counter()
+        text = normalize(prompt)
+        now = time.time()
+        with self._lock:
+            try:
+                entry_id = self._exact.get((scope, text))
+                if entry_id is not None:
+                    entry = self._entries[entry_id]
+                    if entry.expires_at > now:
+                        self._entries.move_to_end(entry_id)
+                        self._stats['exact_hits'] += 1
+                        return entry.response
+                    self._remove(entry_id)
+                
+                items = shingles(text)
+                if not items:
+                    self._stats['misses'] += 1
+                    return None
+                best_id, best_score = self._search(scope, items, self._bands(scope, signature(items)), now)
+                if best_id is None:
+                    self._stats['misses'] += 1
+                    return None
+                self._entries.move_to_end(best_id)
+                self._stats['hits'] += 1
+                return self._entries[best_id].response
+            finally:
+                self._lookup_time += time.perf_counter() - started
+    
+    def set(self, scope: str, prompt: str, response: CachedResponse):
+        """
+        缓存提示词的响应
+        
+        Args:
+            scope: 作用域
+            prompt: 提示词
+            response: 完整响应
+        """
+        if not response.content:
+            return
+        text = normalize(prompt)
+        items = shingles(text)
+        if not items:
+            return
+        bands = self._bands(scope, signature(items))
+        with self._lock:
+            self._stats['stores'] += 1
+            existing = self._exact.get((scope, text))
+            if existing is not None:
+                self._remove(existing)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(scope, text, bands, response, time.time() + self.ttl)
+            self._exact[(scope, text)] = entry_id
+            for band in bands:
+                members = self._buckets.get(band)
+                if members is None:
+                    self._buckets[band] = entry_id
+                elif isinstance(members, set):
+                    members.add(entry_id)
+                else:
+                    self._buckets[band] = {members, entry_id}
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._exact.clear()
+    
+    def get_stats(self) -> dict:
+        """
+        获取缓存统计
+        
+        Returns:
+            包含命中数、未命中数、命中率、条目数和平均查询耗时（微秒）等信息的字典
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            lookup_time = self._lookup_time
+        lookups = stats['hits'] + stats['exact_hits'] + stats['misses']
+        hits = stats['hits'] + stats['exact_hits']
+        stats['hit_rate'] = round(hits / lookups, 3) if lookups else 0.0
+        stats['avg_lookup_us'] = round(lookup_time / lookups * 1e6, 1) if lookups else 0.0
+        stats['threshold'] = self.threshold
+        stats['max_entries'] = self.max_entries
+        return stats
+    
+    def _search(self, scope: str, items: FrozenSet[str], bands: Tuple[int, ...], now: float) -> Tuple[Optional[int], float]:
+        """在分桶中查找候选并精确校验相似度（调用方持有锁）"""
+        # 按命中的分桶数排序候选，命中分段越多的越可能相似
+        counts: Dict[int, int] = {}
+        for band in bands:
+            members = self._buckets.get(band)
+            if members is None:
+                continue
+            for entry_id in (members if isinstance(members, set) else (members,)):
+                counts[entry_id] = counts.get(entry_id, 0) + 1
+        
+        best_id, best_score = None, 0.0
+        candidates = sorted(counts, key=counts.get, reverse=True)[:MAX_CANDIDATES]
+        for entry_id in candidates:
+            entry = self._entries[entry_id]
+            if entry.scope != scope:
+                continue
+            if entry.expires_at <= now:
+                self._remove(entry_id)
+                continue
+            score = jaccard(items, shingles(entry.text))
+            if score >= self.threshold and score > best_score:
+                best_id, best_score = entry_id, score
+        return best_id, best_score
+    
+    def _remove(self, entry_id: int):
+        """删除条目及其索引（调用方持有锁）"""
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        if self._exact.get((entry.scope, entry.text)) == entry_id:
+            del self._exact[(entry.scope, entry.text)]
+        for band in entry.bands:
+            members = self._buckets.get(band)
+            if isinstance(members, set):
+                members.discard(entry_id)
+                if len(members) == 1:
+                    self._buckets[band] = next(iter(members))
+            elif members == entry_id:
+                del self._buckets[band]
+    
+    @staticmethod
+    def _bands(scope: str, sig: Tuple[int, ...]) -> Tuple[int, ...]:
+        """把签名切分为BANDS段，每段与作用域一起哈希为分桶键"""
+        return tuple(hash((scope, index, sig[index * _ROWS:(index + 1) * _ROWS])) for index in range(BANDS))
+
+# 进程内共享的近似缓存
+similarity_cache = SimilarityCache()
\ No newline at end of file
@@ -0,0 +1,291 @@
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .stream import StreamDelta
+
+def make_key(provider: str, model: str, message: str, params: Optional[dict] = None) -> str:
+    """
+    生成请求合并键，提供商、模型、消息和参数完全相同的请求得到同一个键
+    
+    Args:
+        provider: 提供商名称
+        model: 模型名称
+        message: 用户消息
+        params: 调用参数
+    
+    Returns:
+        合并键
+    """
+    payload = json.dumps([provider, model, message, params or {}], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class _Call:
+    """一次进行中的同步调用"""
+    
+    __slots__ = ('done', 'result', 'error')
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+class _Subscription:
+    """
+    一个订阅者的迭代器
+    
+    订阅时即计入订阅者数，结束、关闭或被回收时注销；与生成器不同，还没开始迭代就被丢弃也会注销，
+    不会让上游读取线程为不存在的订阅者继续读取。
+    """
+    
+    def __init__(self, broadcast: '_Broadcast', stream: Iterator[StreamDelta]):
+        self._broadcast = broadcast
+        self._stream = stream
+        self._closed = False
+    
+    def __iter__(self) -> Iterator[StreamDelta]:
+        return self
+    
+    def __next__(self) -> StreamDelta:
+        if self._closed:
+            raise StopIteration
+        try:
+            return next(self._stream)
+        except BaseException:
+            self.close()
+            raise
+    
+    def close(self):
+        """注销订阅，可重复调用"""
+        if self._closed:
+            return
+        self._closed = True
+        self._stream.close()
+        self._broadcast.unsubscribe()
+    
+    def __del__(self):
+        self.close()
+
+class _Broadcast:
+    """
+    把一个上游流式响应分发给多个订阅者
+    
+    后台线程读取上游并缓存所有增量，订阅者各自从头读取，因此晚加入的订阅者也能拿到完整响应。
+    所有订阅者都断开后停止读取并关闭上游连接。上游超时或出错时，每个订阅者读完已缓存的增量后抛出同一个异常。
+    """
+    
+    def __init__(self, on_finish: Callable[[], None]):
+        self.ready = threading.Event()
+        self.failed = False
+        self.error: Optional[Exception] = None
+        self._items: List[StreamDelta] = []
+        self._finished = False
+        self._subscribers = 0
+        self._cond = threading.Condition()
+        self._on_finish = on_finish
+    
+    def start(self, upstream: Iterator[StreamDelta], name: str):
+        """在后台线程中开始读取上游流式响应"""
+        threading.Thread(target=self._pump, args=(upstream,), name=name, daemon=True).start()
+        self.ready.set()
+    
+    def fail(self, error: Optional[Exception] = None):
+        """上游调用失败，通知所有等待的订阅者"""
+        self.failed = True
+        self.error = error
+        self._on_finish()
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+        self.ready.set()
+    
+    def subscribe(self, owner: bool = True) -> Iterator[StreamDelta]:
+        """
+        新增一个订阅者
+        
+        Args:
+            owner: 是否为发起上游调用的订阅者，其他订阅者收到的增量不带token用量，避免重复计量
+        
+        Returns:
+            产出完整响应增量的迭代器，关闭或被回收时注销订阅
+        """
+        with self._cond:
+            self._subscribers += 1
+        return _Subscription(self, self._iter() if owner else self._iter_shared())
+    
+    def unsubscribe(self):
+        """注销一个订阅者，所有订阅者都注销后上游读取线程在下一个增量到达时停止"""
+        with self._cond:
+            self._subscribers -= 1
+    
+    def _iter_shared(self) -> Iterator[StreamDelta]:
+        """去掉token用量的订阅，只含用量的增量直接跳过"""
+        stream = self._iter()
+        try:
+            for delta in stream:
+                if delta.usage is None:
+                    yield delta
+                elif delta.content or delta.reasoning or delta.finish_reason:
+                    yield StreamDelta(delta.content, delta.reasoning, delta.finish_reason)
+        finally:
+            stream.close()
+    
+    def _iter(self) -> Iterator[StreamDelta]:
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._items) and not self._finished:
+                    self._cond.wait()
+                if index >= len(self._items):
+                    if self.error is not None:
+                        raise self.error
+                    return
+                batch = self._items[index:]
+                index = len(self._items)
+            yield from batch
+    
+    def _pump(self, upstream: Iterator[StreamDelta]):
+        try:
+            for delta in upstream:
+                with self._cond:
+                    if self._subscribers <= 0:
+                        break
+                    self._items.append(delta)
+                    self._cond.notify_all()
+        except Exception as e:
+            # 超时和其他错误都交给订阅者抛出，避免把中断的响应当作完整响应
+            print(f"合并请求读取上游流式响应错误: {e}")
+            self.error = e
+        finally:
+            close = getattr(upstream, 'close', None)
+            if close is not None:
+                close()
+            # 先从进行中的请求中移除，之后到达的相同请求会重新发起
+            self._on_finish()
+            with self._cond:
+                self._finished = True
+                self._cond.notify_all()
+
+class SingleFlight:
+    """
+    合并进行中的相同请求
+    
+    同一时刻键相同的请求只向上游发起一次调用：第一个请求负责调用，其余请求等待并共享结果；
+    流式调用的每个增量会分发给所有等待的请求。调用结束后不保留结果，之后的请求重新调用。
+    """
+    
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self._lock = threading.Lock()
+        self._leaders = 0
+        self._coalesced = 0
+    
+    def do(self, key: str, fn: Callable[[], Any], shared: Optional[Callable[[Any], Any]] = None) -> Any:
+        """
+        执行同步调用，键相同的调用进行中时等待其结果
+        
+        Args:
+            key: 合并键
+            fn: 实际发起调用的函数
+            shared: 等待者收到结果前的转换，用于去掉只属于发起调用的请求的信息（如token用量）
+        
+        Returns:
+            fn的返回值，所有等待者共享同一个结果
+        
+        Raises:
+            Exception: fn抛出的异常会传递给所有等待者
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._leaders += 1
+            else:
+                self._coalesced += 1
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return shared(call.result) if shared else call.result
+        
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+    
+    def stream(self, key: str, fn: Callable[[], Optional[Iterator[StreamDelta]]]) -> Optional[Iterator[StreamDelta]]:
+        """
+        执行流式调用，键相同的流式调用进行中时订阅其响应
+        
+        Args:
+            key: 合并键
+            fn: 实际发起流式调用的函数，失败时返回None
+        
+        Returns:
+            产出完整响应增量的迭代器，上游调用失败时返回None
+        
+        Raises:
+            Exception: 上游调用失败（如PhaseTimeoutError），所有等待的请求都会收到同一个异常
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            leader = broadcast is None
+            if leader:
+                broadcast = _Broadcast(lambda: self._finish_stream(key, broadcast))
+                self._streams[key] = broadcast
+                self._leaders += 1
+            else:
+                self._coalesced += 1
+            # 在锁内订阅，保证上游读取线程启动时至少有一个订阅者
+            subscription = broadcast.subscribe(leader)
+        
+        if not leader:
+            broadcast.ready.wait()
+            if broadcast.failed:
+                if broadcast.error is not None:
+                    raise broadcast.error
+                return None
+            return subscription
+        
+        try:
+            upstream = fn()
+        except BaseException as e:
+            broadcast.fail(e if isinstance(e, Exception) else None)
+            raise
+        if upstream is None:
+            broadcast.fail()
+            return None
+        broadcast.start(upstream, f"singleflight-{key[:8]}")
+        return subscription
+    
+    def get_stats(self) -> dict:
+        """
+        获取请求合并统计
+        
+        Returns:
+            包含进行中的调用数、实际发起的调用数和被合并的请求数的字典
+        """
+        with self._lock:
+            return {
+                'in_flight': len(self._calls) + len(self._streams),
+                'leaders': self._leaders,
+                'coalesced': self._coalesced
+            }
+    
+    def _finish_stream(self, key: str, broadcast: _Broadcast):
+        with self._lock:
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+
+# 进程内共享的请求合并器
+singleflight = SingleFlight()
\ No newline at end of file
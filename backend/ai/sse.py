@@ -0,0 +1,223 @@
+import json
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, List, Optional
+
+class SSEEvent:
+    """单个Server-Sent Events事件"""
+    
+    __slots__ = ('event', 'data', 'id', 'retry')
+    
+    def __init__(self, data: str, event: str = 'message', id: Optional[str] = None, retry: Optional[int] = None):
+        self.data = data
+        self.event = event
+        self.id = id
+        self.retry = retry
+    
+    @property
+    def is_done(self) -> bool:
+        """是否为OpenAI风格的结束标记 [DONE]"""
+        return self.data == '[DONE]'
+    
+    def json(self):
+        """将事件数据解析为JSON"""
+        return json.loads(self.data)
+    
+    def __repr__(self) -> str:
+        return f"SSEEvent(event={self.event!r}, data={self.data!r}, id={self.id!r})"
+
+class SSEDecoder:
+    """
+    增量式SSE字节流解码器
+    
+    直接处理网络上收到的原始字节块，能够正确处理跨块的不完整帧、
+    多行data字段、event/id/retry字段、注释行以及CRLF/CR/LF换行。
+    只在收到完整事件（以空行结束）后按事件切分，每批完整事件整段解码一次，
+    单行data事件不再逐行处理。
+    """
+    
+    def __init__(self):
+        # 还不完整的事件按收到的块保存，换行已统一为\n；收到事件分隔时才拼接，每个字节只扫描一次
+        self._pending: List[bytes] = []
+        # 上一块以\r结尾，可能与下一块开头的\n组成CRLF
+        self._cr = False
+        self._bom = b''
+        self._check_bom = True
+        self.last_event_id: Optional[str] = None
+    
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        """
+        输入一段原始字节，返回其中已完整的事件
+        
+        只在新收到的字节中查找事件分隔，大事件被拆成很多小块时总耗时仍与数据量成正比。
+        
+        Args:
+            chunk: 网络上收到的字节块
+        
+        Returns:
+            已解析完成的事件列表
+        """
+        if self._check_bom or self._cr or b'\r' in chunk:
+            chunk = self._normalize(chunk)
+        if not chunk:
+            return []
+        
+        # 事件以空行结束，只处理到最后一个完整事件为止；分隔也可能横跨上一块的结尾和这一块的开头
+        end = chunk.rfind(b'\n\n')
+        if end == -1 and (chunk[0] != 10 or not self._pending or self._pending[-1][-1] != 10):
+            self._pending.append(chunk)
+            return []
+        pending = self._pending
+        if pending:
+            pending.append(chunk)
+            buffer = b''.join(pending)
+            end += len(buffer) - len(chunk)
+        else:
+            buffer = chunk
+        rest = buffer[end + 2:]
+        self._pending = [rest] if rest else []
+        
+        # 事件边界都是ASCII换行，完整事件不会截断多字节字符，可以整段一次解码
+        text = buffer[:end].decode('utf-8', errors='replace')
+        events = []
+        append = events.append
+        for frame in text.split('\n\n'):
+            if frame[:5] == 'data:':
+                if '\n' not in frame:
+                    # 只有一行data的事件最常见，直接构造事件
+                    append(SSEEvent(
+                        frame[6:] if frame[5:6] == ' ' else frame[5:],
+                        'message',
+                        self.last_event_id
+                    ))
+                    continue
+            elif frame[:6] == 'event:':
+                # Anthropic等提供商的“event行 + 单行data”事件
+                head, _, line = frame.partition('\n')
+                if line[:5] == 'data:' and '\n' not in line:
+                    append(SSEEvent(
+                        line[6:] if line[5:6] == ' ' else line[5:],
+                        (head[7:] if head[6:7] == ' ' else head[6:]) or 'message',
+                        self.last_event_id
+                    ))
+                    continue
+            event = self._parse_frame(frame)
+            if event is not None:
+                append(event)
+        return events
+    
+    def _normalize(self, chunk: bytes) -> bytes:
+        """去掉流开头的UTF-8 BOM，并把CRLF和CR统一为\n"""
+        if self._check_bom:
+            # BOM本身也可能被拆分到多个块中
+            chunk = self._bom + chunk
+            if len(chunk) < 3 and b'\xef\xbb\xbf'.startswith(chunk):
+                self._bom = chunk
+                return b''
+            self._check_bom = False
+            self._bom = b''
+            if chunk.startswith(b'\xef\xbb\xbf'):
+                chunk = chunk[3:]
+        
+        if self._cr:
+            chunk = b'\r' + chunk
+            self._cr = False
+        if b'\r' in chunk:
+            # 末尾的\r可能与下一块开头的\n组成CRLF，先保留
+            if chunk[-1] == 13:
+                chunk = chunk[:-1]
+                self._cr = True
+                if not chunk:
+                    return chunk
+            # bytes.splitlines只按\r、\n和\r\n分行，正好是SSE的三种换行
+            lines = chunk.splitlines()
+            if chunk[-1] in (10, 13):
+                lines.append(b'')
+            chunk = b'\n'.join(lines)
+        return chunk
+    
+    def flush(self) -> List[SSEEvent]:
+        """
+        流结束时调用，处理缓冲区中剩余的数据
+        
+        Returns:
+            剩余的完整事件列表
+        """
+        events = self.feed(b'\n\n') if self._pending or self._cr else []
+        self._pending = []
+        self._cr = False
+        return events
+    
+    def _parse_frame(self, frame: str) -> Optional[SSEEvent]:
+        """
+        解析一个完整事件的所有字段行
+        
+        Args:
+            frame: 不含结尾空行的事件文本
+        
+        Returns:
+            SSE事件，没有data字段时返回None
+        """
+        data = []
+        event_type = 'message'
+        retry = None
+        for line in frame.split('\n'):
+            # 空行和以冒号开头的注释（如心跳）的字段名为空，不匹配任何分支
+            field, _, value = line.partition(':')
+            if value[:1] == ' ':
+                value = value[1:]
+            
+            if field == 'data':
+                data.append(value)
+            elif field == 'event':
+                event_type = value or 'message'
+            elif field == 'id':
+                if '\x00' not in value:
+                    self.last_event_id = value
+            elif field == 'retry':
+                if value.isdigit():
+                    retry = int(value)
+        
+        if not data:
+            return None
+        return SSEEvent(
+            data[0] if len(data) == 1 else '\n'.join(data),
+            event_type,
+            self.last_event_id,
+            retry
+        )
+
+def iter_sse(chunks: Iterable[bytes]) -> Iterator[SSEEvent]:
+    """
+    将字节块迭代器解码为SSE事件迭代器
+    
+    Args:
+        chunks: 原始字节块迭代器
+    
+    Yields:
+        SSE事件
+    """
+    decoder = SSEDecoder()
+    feed = decoder.feed
+    for chunk in chunks:
+        # 大多数块里没有完整事件，跳过空列表
+        events = feed(chunk)
+        if events:
+            yield from events
+    yield from decoder.flush()
+
+async def aiter_sse(chunks: AsyncIterable[bytes]) -> AsyncIterator[SSEEvent]:
+    """
+    将异步字节块迭代器解码为SSE事件迭代器
+    
+    Args:
+        chunks: 原始字节块异步迭代器
+    
+    Yields:
+        SSE事件
+    """
+    decoder = SSEDecoder()
+    feed = decoder.feed
+    async for chunk in chunks:
+        for event in feed(chunk):
+            yield event
+    for event in decoder.flush():
+        yield event
\ No newline at end of file
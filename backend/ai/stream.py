@@ -0,0 +1,39 @@
+from typing import Optional
+
+class StreamDelta:
+    """
+    统一的流式响应增量，所有提供商的流式调用都产出该类型
+    
+    每个增量只对应一个对象，字段含义如下：
+        content: 本次新增的回复内容
+        reasoning: 本次新增的推理过程内容
+        finish_reason: 结束原因，只在最后的增量中出现
+        usage: token用量，键为prompt_tokens、completion_tokens、total_tokens，命中或写入提示词缓存时
+               另有cache_read_tokens、cache_write_tokens，部分提供商分多次返回，消费方按键合并即可
+    """
+    
+    __slots__ = ('content', 'reasoning', 'finish_reason', 'usage')
+    
+    def __init__(self, content: Optional[str] = None, reasoning: Optional[str] = None,
+                 finish_reason: Optional[str] = None, usage: Optional[dict] = None):
+        self.content = content
+        self.reasoning = reasoning
+        self.finish_reason = finish_reason
+        self.usage = usage
+    
+    def __repr__(self) -> str:
+        return (f"StreamDelta(content={self.content!r}, reasoning={self.reasoning!r}, "
+                f"finish_reason={self.finish_reason!r}, usage={self.usage!r})")
+
+class Completion(str):
+    """
+    同步调用的回复内容，可以像普通字符串一样使用，另外通过usage附带提供商返回的token用量
+    
+    usage格式同StreamDelta.usage，提供商没有返回用量时为None。
+    错误信息和缓存命中的回复是普通字符串，没有发起上游调用，也就没有用量。
+    """
+    
+    def __new__(cls, content: str, usage: Optional[dict] = None):
+        completion = super().__new__(cls, content)
+        completion.usage = usage
+        return completion
\ No newline at end of file
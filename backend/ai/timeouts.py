@@ -0,0 +1,167 @@
+import asyncio
+import time
+from typing import AsyncIterator, Iterator, Optional, Tuple
+
+from models.config import Config
+from .stream import StreamDelta
+
+# 可以在调用参数中单独指定的阶段超时，由模型或提供商配置传入
+PHASE_PARAMS = ('connect_timeout', 'first_token_timeout', 'idle_timeout')
+
+class PhaseTimeoutError(Exception):
+    """请求某一阶段超时，code供前端区分超时阶段"""
+    
+    code = 'timeout'
+    
+    def __init__(self, message: str, timeout: float):
+        super().__init__(message)
+        self.timeout = timeout
+
+class ConnectTimeoutError(PhaseTimeoutError):
+    """连接超时时间内未能与提供商建立连接，请求未发出，可以安全重试"""
+    
+    code = 'connect_timeout'
+
+class FirstTokenTimeoutError(PhaseTimeoutError):
+    """流式请求发出后，首token超时时间内没有收到任何正文或推理内容"""
+    
+    code = 'first_token_timeout'
+
+class IdleTimeoutError(PhaseTimeoutError):
+    """流式响应开始后，两次收到内容的间隔超过空闲超时时间"""
+    
+    code = 'idle_timeout'
+
+def get_phase_timeouts(params: dict) -> Tuple[float, float, float]:
+    """
+    读取连接、首token和空闲间隔三个阶段的超时时间
+    
+    Args:
+        params: 合并默认值后的参数，未指定或为空的阶段取配置
+    
+    Returns:
+        (连接超时, 首token超时, 空闲超时)，单位为秒
+    """
+    return (
+        float(params.get('connect_timeout') or Config.AI_CONNECT_TIMEOUT),
+        float(params.get('first_token_timeout') or Config.AI_FIRST_TOKEN_TIMEOUT),
+        float(params.get('idle_timeout') or Config.AI_IDLE_TIMEOUT)
+    )
+
+class StreamDeadline:
+    """
+    流式响应的截止时间
+    
+    收到首个正文或推理内容之前，截止时间为发起调用后first_token_timeout秒；之后为上次收到内容后idle_timeout秒。
+    只含用量或结束原因的增量、SSE注释和心跳不会推迟截止时间。
+    间隔从消费方取走上一个增量后开始计算，向客户端写出数据的耗时不计入空闲时间。
+    """
+    
+    def __init__(self, display_name: str, params: dict):
+        """
+        初始化截止时间，从调用开始计时
+        
+        Args:
+            display_name: 提供商显示名称，用于错误信息
+            params: 合并默认值后的参数
+        """
+        self.display_name = display_name
+        self.connect_timeout, self.first_token_timeout, self.idle_timeout = get_phase_timeouts(params)
+        self.first_token_at: Optional[float] = None
+        self._deadline = time.monotonic() + self.first_token_timeout
+    
+    @property
+    def read_timeout(self) -> float:
+        """无法逐次调整读超时的传输层使用的单次读取超时，兜底两个阶段中较长的一个"""
+        return max(self.first_token_timeout, self.idle_timeout)
+    
+    def remaining(self) -> float:
+        """距离截止时间的秒数，已超时时为0或负数"""
+        return self._deadline - time.monotonic()
+    
+    def record(self, delta: StreamDelta):
+        """
+        消费方取走一个增量后调用，收到内容时推迟截止时间
+        
+        Args:
+            delta: 流式响应增量
+        """
+        if delta.content or delta.reasoning:
+            now = time.monotonic()
+            if self.first_token_at is None:
+                self.first_token_at = now
+            self._deadline = now + self.idle_timeout
+    
+    def check(self):
+        """
+        已超过截止时间时抛出对应阶段的超时异常
+        
+        Raises:
+            FirstTokenTimeoutError: 尚未收到内容
+            IdleTimeoutError: 已收到内容
+        """
+        if self.remaining() <= 0:
+            raise self.error()
+    
+    def error(self) -> PhaseTimeoutError:
+        """当前阶段的超时异常"""
+        if self.first_token_at is None:
+            return FirstTokenTimeoutError(
+                f"{self.display_name}在{self.first_token_timeout:g}秒内没有返回首个token，请稍后重试", self.first_token_timeout
+            )
+        return IdleTimeoutError(
+            f"{self.display_name}响应中断超过{self.idle_timeout:g}秒，回复可能不完整", self.idle_timeout
+        )
+
+def track_deadline(stream: Iterator[StreamDelta], deadline: StreamDeadline) -> Iterator[StreamDelta]:
+    """
+    透传流式响应，每收到一个增量检查一次截止时间
+    
+    只能在数据到达时检查，完全没有数据时由传输层的读超时（read_timeout）兜底。
+    
+    Args:
+        stream: 流式响应迭代器
+        deadline: 截止时间
+    
+    Yields:
+        流式响应增量
+    """
+    try:
+        for delta in stream:
+            deadline.check()
+            yield delta
+            deadline.record(delta)
+    finally:
+        close = getattr(stream, 'close', None)
+        if close is not None:
+            close()
+
+async def atrack_deadline(stream: AsyncIterator[StreamDelta], deadline: StreamDeadline) -> AsyncIterator[StreamDelta]:
+    """
+    透传异步流式响应，等待每个增量时以剩余时间为限，超时即中止读取
+    
+    Args:
+        stream: 异步流式响应迭代器
+        deadline: 截止时间
+    
+    Yields:
+        流式响应增量
+    """
+    iterator = stream.__aiter__()
+    try:
+        while True:
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                raise deadline.error()
+            try:
+                delta = await asyncio.wait_for(iterator.__anext__(), remaining)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise deadline.error()
+            yield delta
+            deadline.record(delta)
+    finally:
+        aclose = getattr(iterator, 'aclose', None)
+        if aclose is not None:
+            await aclose()
\ No newline at end of file
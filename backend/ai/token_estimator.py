@@ -0,0 +1,279 @@
+import threading
+from typing import AsyncIterator, Dict, Iterator, Optional, Tuple
+
+from models.config import Config
+from .stream import StreamDelta
+
+# 未校准时每个ASCII字符、非ASCII字符（中日韩文字、全角标点等）和每条消息的token数，
+# 中文按每字1个token、英文按每4个字符1个token估算，消息格式开销按OpenAI的每条约3到4个token估算
+DEFAULT_COEFFICIENTS = (0.25, 1.0, 4.0)
+
+# 先验强度：相当于各有一个含这么多ASCII字符、非ASCII字符和消息的样本支持默认系数，
+# 样本很少或某类字符从未出现时系数停留在默认值附近
+PRIOR_SIZES = (2000, 500, 8)
+
+# 系数的取值范围，避免个别异常样本把估算带偏
+COEFFICIENT_BOUNDS = ((0.05, 2.0), (0.1, 4.0), (0.0, 20.0))
+
+# 实际输入token与当前估算之比超出该范围的样本不参与校准（如包含图片、工具定义的请求）
+OUTLIER_RATIO = 4.0
+
+# (ASCII字符数, 非ASCII字符数, 消息数)
+PromptSample = Tuple[int, int, int]
+
+def measure_text(text: str) -> Tuple[int, int]:
+    """
+    统计文本中的ASCII字符数和非ASCII字符数
+    
+    只调用在C层实现的字符串方法，不逐字符遍历，100KB的文本耗时在0.2毫秒以内。
+    
+    Args:
+        text: 文本
+    
+    Returns:
+        (ASCII字符数, 非ASCII字符数)
+    """
+    if not text:
+        return 0, 0
+    length = len(text)
+    if text.isascii():
+        return length, 0
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return ascii_chars, length - ascii_chars
+
+def measure_prompt(message: str, params: dict, system_message: bool = True) -> PromptSample:
+    """
+    统计一次请求的输入：用户消息、系统消息和历史对话
+    
+    Args:
+        message: 用户消息
+        params: 合并默认值后的参数，历史对话为history参数中的[{'role': ..., 'content': ...}]
+        system_message: 客户端是否发送系统消息，不支持system角色的提供商（如DeepSeek）请求中没有系统消息，
+            其文字和消息数都不计入，否则校准时这部分误差会被每条消息的系数吸收
+    
+    Returns:
+        (ASCII字符数, 非ASCII字符数, 消息数)
+    """
+    ascii_chars, other_chars = measure_text(message)
+    texts = [item.get('content') or '' for item in params.get('history') or ()]
+    if system_message and params.get('system_message'):
+        texts.append(params['system_message'])
+    for text in texts:
+        counts = measure_text(text)
+        ascii_chars += counts[0]
+        other_chars += counts[1]
+    return ascii_chars, other_chars, len(texts) + 1
+
+def estimate_tokens(text: str) -> int:
+    """
+    按默认系数估算文本的token数，不区分模型，不含消息格式开销
+    
+    Args:
+        text: 文本
+    
+    Returns:
+        估算的token数
+    """
+    ascii_chars, other_chars = measure_text(text)
+    return int(ascii_chars * DEFAULT_COEFFICIENTS[0] + other_chars * DEFAULT_COEFFICIENTS[1] + 0.999)
+
+def _solve(matrix: list, vector: list) -> Optional[list]:
+    """高斯消元求解线性方程组，矩阵奇异时返回None"""
+    size = len(vector)
+    rows = [list(matrix[i]) + [vector[i]] for i in range(size)]
+    for col in range(size):
+        pivot = max(range(col, size), key=lambda row: abs(rows[row][col]))
+        if abs(rows[pivot][col]) < 1e-12:
+            return None
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        for row in range(col + 1, size):
+            factor = rows[row][col] / rows[col][col]
+            for k in range(col, size + 1):
+                rows[row][k] -= factor * rows[col][k]
+    solution = [0.0] * size
+    for row in range(size - 1, -1, -1):
+        total = rows[row][size] - sum(rows[row][k] * solution[k] for k in range(row + 1, size))
+        solution[row] = total / rows[row][row]
+    return solution
+
+class _Calibration:
+    """单个提供商/模型的校准状态：按时间衰减的加权最小二乘统计量和当前系数"""
+    
+    def __init__(self):
+        size = len(DEFAULT_COEFFICIENTS)
+        self.xtx = [[0.0] * size for _ in range(size)]
+        self.xty = [0.0] * size
+        self.coefficients = DEFAULT_COEFFICIENTS
+        self.samples = 0
+        self.skipped = 0
+        # 校准前估算值相对实际值的误差，按同样的衰减系数做指数平均
+        self.error = None
+    
+    def estimate(self, sample: PromptSample) -> float:
+        return sum(weight * value for weight, value in zip(self.coefficients, sample))
+    
+    def update(self, sample: PromptSample, actual: int, decay: float):
+        """
+        加入一个样本并重新求解系数
+        
+        以默认系数为先验做岭回归：最小化 Σ衰减权重×(实际-估算)² + Σ先验强度²×(系数-默认系数)²，
+        旧样本的权重每加入一个新样本乘以decay，提供商更换分词器后能逐步适应。
+        """
+        size = len(sample)
+        for i in range(size):
+            self.xty[i] = self.xty[i] * decay + sample[i] * actual
+            for j in range(size):
+                self.xtx[i][j] = self.xtx[i][j] * decay + sample[i] * sample[j]
+        matrix = [row[:] for row in self.xtx]
+        vector = self.xty[:]
+        for i in range(size):
+            prior = PRIOR_SIZES[i] ** 2
+            matrix[i][i] += prior
+            vector[i] += prior * DEFAULT_COEFFICIENTS[i]
+        solution = _solve(matrix, vector)
+        if solution is not None:
+            self.coefficients = tuple(
+                min(max(value, low), high) for value, (low, high) in zip(solution, COEFFICIENT_BOUNDS)
+            )
+
+class TokenEstimator:
+    """
+    本地估算请求的输入token数，并按各提供商/模型实际返回的用量自动校准
+    
+    估算值为ASCII字符数、非ASCII字符数和消息数的线性组合，统计只用到C层实现的字符串方法，
+    不需要分词器，可以在每次请求前调用。每次调用返回用量后，用实际输入token数更新该模型的系数，
+    中英文混合的提示词也能分别校准两类字符的token数。校准状态保存在进程内，重启后从默认系数重新开始。
+    """
+    
+    def __init__(self, decay: Optional[float] = None):
+        """
+        初始化估算器
+        
+        Args:
+            decay: 每加入一个新样本时旧样本权重的衰减系数，默认取配置
+        """
+        self.decay = Config.AI_TOKEN_CALIBRATION_DECAY if decay is None else decay
+        self._calibrations: Dict[Tuple[str, str], _Calibration] = {}
+        self._lock = threading.Lock()
+    
+    def estimate(self, provider: str, model: str, sample: PromptSample) -> int:
+        """
+        估算一次请求的输入token数，模型还没有样本时使用默认系数
+        
+        Args:
+            provider: 提供商名称
+            model: 模型名称
+            sample: measure_prompt的统计结果
+        
+        Returns:
+            估算的输入token数
+        """
+        calibration = self._calibrations.get((provider, model))
+        coefficients = calibration.coefficients if calibration else DEFAULT_COEFFICIENTS
+        return int(sum(weight * value for weight, value in zip(coefficients, sample)) + 0.999)
+    
+    def observe(self, provider: str, model: str, sample: PromptSample, usage: Optional[dict]):
+        """
+        用提供商返回的输入token数校准模型的系数
+        
+        Args:
+            provider: 提供商名称
+            model: 模型名称
+            sample: 发起请求时measure_prompt的统计结果
+            usage: 统一后的用量，没有prompt_tokens时不校准
+        """
+        actual = (usage or {}).get('prompt_tokens')
+        if not actual or actual <= 0:
+            return
+        with self._lock:
+            calibration = self._calibrations.get((provider, model))
+            if calibration is None:
+                calibration = self._calibrations[(provider, model)] = _Calibration()
+            estimated = calibration.estimate(sample)
+            if estimated <= 0 or not 1 / OUTLIER_RATIO <= actual / estimated <= OUTLIER_RATIO:
+                calibration.skipped += 1
+                return
+            error = abs(estimated - actual) / actual
+            calibration.error = error if calibration.error is None else (
+                calibration.error * self.decay + error * (1 - self.decay)
+            )
+            calibration.samples += 1
+            calibration.update(sample, actual, self.decay)
+    
+    def track(self, stream: Iterator[StreamDelta], provider: str, model: str,
+              sample: PromptSample) -> Iterator[StreamDelta]:
+        """
+        透传流式响应，结束时用各增量中的用量校准
+        
+        Args:
+            stream: 流式响应迭代器
+            provider: 提供商名称
+            model: 模型名称
+            sample: 发起请求时measure_prompt的统计结果
+        
+        Yields:
+            流式响应增量
+        """
+        usage = {}
+        try:
+            for delta in stream:
+                if delta.usage:
+                    usage.update(delta.usage)
+                yield delta
+        finally:
+            close = getattr(stream, 'close', None)
+            if close is not None:
+                close()
+            self.observe(provider, model, sample, usage)
+    
+    async def atrack(self, stream: AsyncIterator[StreamDelta], provider: str, model: str,
+                     sample: PromptSample) -> AsyncIterator[StreamDelta]:
+        """
+        track的异步版本
+        
+        Args:
+            stream: 异步流式响应迭代器
+            provider: 提供商名称
+            model: 模型名称
+            sample: 发起请求时measure_prompt的统计结果
+        
+        Yields:
+            流式响应增量
+        """
+        usage = {}
+        try:
+            async for delta in stream:
+                if delta.usage:
+                    usage.update(delta.usage)
+                yield delta
+        finally:
+            aclose = getattr(stream, 'aclose', None)
+            if aclose is not None:
+                await aclose()
+            self.observe(provider, model, sample, usage)
+    
+    def get_stats(self) -> Dict[str, dict]:
+        """
+        获取各提供商/模型的校准状态
+        
+        Returns:
+            以"提供商/模型"为键的字典，包含参与校准和被视为异常而跳过的样本数、
+            每个ASCII字符、非ASCII字符和每条消息的token数，以及近期估算的平均相对误差
+        """
+        with self._lock:
+            items = sorted(self._calibrations.items())
+            stats = {}
+            for (provider, model), calibration in items:
+                ascii_weight, other_weight, message_weight = calibration.coefficients
+                stats[f"{provider}/{model}"] = {
+                    'samples': calibration.samples,
+                    'skipped': calibration.skipped,
+                    'tokens_per_ascii_char': round(ascii_weight, 4),
+                    'tokens_per_other_char': round(other_weight, 4),
+                    'tokens_per_message': round(message_weight, 2),
+                    'error': round(calibration.error, 3) if calibration.error is not None else None
+                }
+        return stats
+
+# 进程内共享的token估算器
+token_estimator = TokenEstimator()
\ No newline at end of file
@@ -12,7 +12,7 @@ load_dotenv()
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from models.config import Config
-from models.models import db, User
+from models.models import db, User, TIMEOUT_FIELDS
 from utils.constants import ROLE_ADMIN, ROLE_USER
 from routes.auth import auth_bp
 from routes.chat import chat_bp
@@ -22,6 +22,8 @@ from routes.misc import misc_bp
 from routes.users import users_bp
 from routes.ai_models import models_bp
 from routes.providers import providers_bp
+from routes.ai_status import ai_status_bp
+from routes.batch import batch_bp
 
 # 导入工具
 from sqlalchemy import inspect, text
@@ -51,6 +53,8 @@ def create_app():
     app.register_blueprint(users_bp)
     app.register_blueprint(models_bp)
     app.register_blueprint(providers_bp)
+    app.register_blueprint(ai_status_bp)
+    app.register_blueprint(batch_bp)
     
     return app
 
@@ -74,6 +78,63 @@ with app.app_context():
     except Exception as e:
         print(f"检查/添加 reasoning 列时出错: {e}")
     
+    # 检查并添加 message 表的 model 列（如果不存在）
+    try:
+        if 'model' not in columns:
+            with db.engine.connect() as conn:
+                conn.execute(text('ALTER TABLE message ADD COLUMN model VARCHAR(100)'))
+                conn.commit()
+            print("已添加 model 列到 message 表")
+    except Exception as e:
+        print(f"检查/添加 model 列时出错: {e}")
+    
+    # 检查并添加 message 表的token用量列（如果不存在）
+    try:
+        for column in ('prompt_tokens', 'completion_tokens', 'total_tokens', 'cache_read_tokens'):
+            if column not in columns:
+                with db.engine.connect() as conn:
+                    conn.execute(text(f'ALTER TABLE message ADD COLUMN {column} INTEGER'))
+                    conn.commit()
+                print(f"已添加 {column} 列到 message 表")
+    except Exception as e:
+        print(f"检查/添加token用量列时出错: {e}")
+    
+    # 检查并添加 api_key 表的负载均衡和限流列（如果不存在）
+    try:
+        api_key_columns = [col['name'] for col in inspector.get_columns('api_key')]
+        for column, column_type in (('weight', 'INTEGER DEFAULT 1'), ('rpm_limit', 'INTEGER'), ('tpm_limit', 'INTEGER')):
+            if column not in api_key_columns:
+                with db.engine.connect() as conn:
+                    conn.execute(text(f'ALTER TABLE api_key ADD COLUMN {column} {column_type}'))
+                    conn.commit()
+                print(f"已添加 {column} 列到 api_key 表")
+    except Exception as e:
+        print(f"检查/添加 api_key 列时出错: {e}")
+    
+    # 检查并添加 model 表的 similarity_cache 列（如果不存在）
+    try:
+        model_columns = [col['name'] for col in inspector.get_columns('model')]
+        if 'similarity_cache' not in model_columns:
+            with db.engine.connect() as conn:
+                conn.execute(text('ALTER TABLE model ADD COLUMN similarity_cache BOOLEAN DEFAULT 0'))
+                conn.commit()
+            print("已添加 similarity_cache 列到 model 表")
+    except Exception as e:
+        print(f"检查/添加 similarity_cache 列时出错: {e}")
+    
+    # 检查并添加 model 表和 provider 表的分阶段超时列（如果不存在）
+    try:
+        for table in ('model', 'provider'):
+            table_columns = [col['name'] for col in inspector.get_columns(table)]
+            for column in TIMEOUT_FIELDS:
+                if column not in table_columns:
+                    with db.engine.connect() as conn:
+                        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} FLOAT'))
+                        conn.commit()
+                    print(f"已添加 {column} 列到 {table} 表")
+    except Exception as e:
+        print(f"检查/添加分阶段超时列时出错: {e}")
+    
     # 创建默认管理员用户（如果不存在）
     if not User.find_by_username('admin'):
         default_admin = User(
@@ -0,0 +1,555 @@
+#!/usr/bin/env python3
+"""
+流式聊天接口压测
+
+登录后以N个并发用户持续调用运行中后端的/api/chat/stream，统计首token耗时（TTFT）的p50/p95/p99、
+token间隔、输出速度、错误率，并按固定间隔采样后端进程（含gunicorn等子进程）的RSS和CPU占用。
+结果写入JSON文件，记录git提交，便于在不同提交之间对比；--compare指定上一次的结果时打印主要指标的变化。
+
+默认在进程内启动benchmarks/mock_provider.py模拟提供商，通过管理员接口为--provider添加一个指向它的API密钥，
+压测结束后删除，不消耗真实额度。该提供商已有的其他活跃密钥会参与负载均衡，压测前最好先停用。
+指定--mock-url时使用单独运行的模拟服务器，指定--no-mock时不添加密钥，直接使用后端现有的配置。
+
+后端进程通过--server-pid指定，未指定时在本机按--url的端口查找监听进程（仅Linux）。
+
+用法:
+    python benchmarks/loadtest.py --url http://127.0.0.1:5001 --username admin --password ****** \\
+        [--users 50] [--requests 5] [--model gpt-4o] [--provider openai] [--mock-ttft 0.3] \\
+        [--output loadtest.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ai.sse import iter_sse
+from mock_provider import DEFAULT_SETTINGS, start_server
+
+# 模拟服务器上各提供商客户端的base_url路径，未列出的为OpenAI兼容协议
+MOCK_PATHS = {
+    'anthropic': '',
+    'gemini': '',
+    'baidu': '/rpc/2.0/ai_custom/v1/wenxinworkshop/chat',
+    'alibaba': '/api/v1/services/aigc/text-generation/generation'
+}
+
+# --compare时对比的指标：(显示名称, 结果中的路径, 数值越大越好)
+COMPARE_METRICS = [
+    ('TTFT p50 (ms)', ('summary', 'ttft_ms', 'p50'), False),
+    ('TTFT p95 (ms)', ('summary', 'ttft_ms', 'p95'), False),
+    ('TTFT p99 (ms)', ('summary', 'ttft_ms', 'p99'), False),
+    ('token间隔 p50 (ms)', ('summary', 'inter_token_ms', 'p50'), False),
+    ('token间隔 p99 (ms)', ('summary', 'inter_token_ms', 'p99'), False),
+    ('总输出速度 (tokens/s)', ('summary', 'tokens_per_second', 'aggregate'), True),
+    ('请求数/秒', ('summary', 'requests_per_second'), True),
+    ('错误率', ('summary', 'error_rate'), False),
+    ('RSS峰值 (MB)', ('server', 'rss_mb', 'peak'), False),
+    ('CPU平均 (%)', ('server', 'cpu_percent', 'mean'), False)
+]
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """线性插值计算百分位数，没有样本时返回None"""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = (len(values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+def distribution(values: List[float], scale: float = 1.0) -> dict:
+    """样本的分布：p50/p95/p99、平均值和最大值，按scale换算单位"""
+    if not values:
+        return {'count': 0, 'p50': None, 'p95': None, 'p99': None, 'mean': None, 'max': None}
+    result = {'count': len(values)}
+    for pct in (50, 95, 99):
+        result[f"p{pct}"] = round(percentile(values, pct) * scale, 2)
+    result['mean'] = round(sum(values) / len(values) * scale, 2)
+    result['max'] = round(max(values) * scale, 2)
+    return result
+
+class RequestResult:
+    """一次流式请求的测量结果"""
+    
+    def __init__(self, user: int):
+        self.user = user
+        self.started = time.monotonic()
+        self.ttft: Optional[float] = None
+        self.duration: Optional[float] = None
+        self.gaps: List[float] = []
+        self.chunks = 0
+        self.completion_tokens: Optional[int] = None
+        # 为None表示成功，否则为错误类型
+        self.error: Optional[str] = None
+        self.error_message: Optional[str] = None
+    
+    @property
+    def tokens(self) -> int:
+        """输出token数，结束事件中没有用量时按收到的内容片段数计"""
+        return self.completion_tokens if self.completion_tokens is not None else self.chunks
+    
+    def to_dict(self) -> dict:
+        return {
+            'user': self.user, 'ttft': self.ttft, 'duration': self.duration, 'chunks': self.chunks,
+            'tokens': self.tokens, 'error': self.error, 'error_message': self.error_message
+        }
+
+def run_stream(url: str, token: str, payload: dict, user: int, timeout: float) -> RequestResult:
+    """
+    发起一次流式聊天请求并逐个事件计时
+    
+    Args:
+        url: 后端地址
+        token: 登录令牌
+        payload: 请求体
+        user: 虚拟用户序号
+        timeout: 连接和两次读取之间的超时（秒）
+    
+    Returns:
+        测量结果
+    """
+    result = RequestResult(user)
+    last = None
+    # 与浏览器的EventSource一样每个流单独建立连接：流式响应同时带有Connection: keep-alive和close，
+    # 连接池按前者复用开发服务器已关闭的连接时会一直等不到响应
+    try:
+        with requests.post(f"{url}/api/chat/stream", json=payload, headers={'Authorization': f"Bearer {token}"},
+                           stream=True, timeout=timeout) as response:
+            if response.status_code != 200:
+                result.error = f"http_{response.status_code}"
+                result.error_message = response.text[:200]
+                return result
+            ended = False
+            for event in iter_sse(response.iter_content(chunk_size=None)):
+                now = time.monotonic()
+                try:
+                    data = event.json()
+                except ValueError:
+                    result.error = 'malformed_event'
+                    result.error_message = event.data[:200]
+                    break
+                kind = data.get('type')
+                if kind in ('content', 'reasoning'):
+                    if result.ttft is None:
+                        result.ttft = now - result.started
+                    else:
+                        result.gaps.append(now - last)
+                    last = now
+                    result.chunks += 1
+                elif kind == 'error':
+                    result.error = data.get('code') or 'error_event'
+                    result.error_message = data.get('content')
+                    break
+                elif kind == 'end':
+                    ended = True
+                    result.completion_tokens = (data.get('usage') or {}).get('completion_tokens')
+            if not ended and result.error is None:
+                result.error = 'incomplete'
+    except requests.RequestException as e:
+        result.error = f"exception_{type(e).__name__}"
+        result.error_message = str(e)[:200]
+    finally:
+        result.duration = time.monotonic() - result.started
+    return result
+
+def read_cpu_seconds(pid: int) -> Optional[float]:
+    """读取进程累计的用户态和内核态CPU时间（秒）"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """读取进程的常驻内存（MB）"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+def process_tree(pid: int) -> List[int]:
+    """进程及其所有子孙进程，gunicorn的worker也计入"""
+    children: Dict[int, List[int]] = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(name))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, ()))
+    return tree
+
+def find_listening_pid(port: int) -> Optional[int]:
+    """按监听端口查找本机进程（仅Linux），多个进程共享同一个监听socket时返回PID最小的一个"""
+    inodes = set()
+    for table in ('/proc/net/tcp', '/proc/net/tcp6'):
+        try:
+            with open(table) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    # 状态0A为LISTEN
+                    if fields[3] == '0A' and int(fields[1].rsplit(':', 1)[1], 16) == port:
+                        inodes.add(fields[9])
+        except OSError:
+            continue
+    if not inodes:
+        return None
+    pids = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            for fd in os.listdir(f"/proc/{name}/fd"):
+                link = os.readlink(f"/proc/{name}/fd/{fd}")
+                if link.startswith('socket:[') and link[8:-1] in inodes:
+                    pids.append(int(name))
+                    break
+        except OSError:
+            continue
+    return min(pids) if pids else None
+
+class ProcessSampler:
+    """在后台线程中按固定间隔采样进程树的RSS和CPU占用"""
+    
+    def __init__(self, pid: int, interval: float):
+        self.pid = pid
+        self.interval = interval
+        self.rss: List[float] = []
+        self.cpu: List[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='process-sampler', daemon=True)
+    
+    def start(self):
+        self._thread.start()
+    
+    def stop(self) -> dict:
+        """
+        停止采样
+        
+        Returns:
+            RSS（MB）的起始值、峰值和平均值，CPU占用（%，多核时可超过100）的平均值和峰值
+        """
+        self._stop.set()
+        self._thread.join()
+        return {
+            'pid': self.pid,
+            'samples': len(self.rss),
+            'rss_mb': {
+                'start': round(self.rss[0], 1) if self.rss else None,
+                'peak': round(max(self.rss), 1) if self.rss else None,
+                'mean': round(sum(self.rss) / len(self.rss), 1) if self.rss else None
+            },
+            'cpu_percent': {
+                'mean': round(sum(self.cpu) / len(self.cpu), 1) if self.cpu else None,
+                'peak': round(max(self.cpu), 1) if self.cpu else None
+            }
+        }
+    
+    def _sample(self):
+        rss = cpu = 0.0
+        for pid in process_tree(self.pid):
+            rss += read_rss_mb(pid) or 0.0
+            cpu += read_cpu_seconds(pid) or 0.0
+        return rss, cpu
+    
+    def _run(self):
+        last_time = time.monotonic()
+        rss, last_cpu = self._sample()
+        self.rss.append(rss)
+        while not self._stop.wait(self.interval):
+            now = time.monotonic()
+            rss, cpu = self._sample()
+            self.rss.append(rss)
+            # 子进程退出时累计CPU时间会减少，此时不计入
+            if cpu >= last_cpu:
+                self.cpu.append((cpu - last_cpu) / (now - last_time) * 100)
+            last_time, last_cpu = now, cpu
+
+class MockKey:
+    """通过管理员接口为提供商添加指向模拟服务器的API密钥，压测结束后删除"""
+    
+    def __init__(self, url: str, token: str, provider: str, base_url: str):
+        self.url = url
+        self.headers = {'Authorization': f"Bearer {token}"}
+        self.provider = provider
+        self.base_url = base_url + MOCK_PATHS.get(provider, '/v1')
+        self.api_key = f"loadtest-{uuid.uuid4().hex[:12]}"
+    
+    def __enter__(self):
+        response = requests.post(f"{self.url}/api/apikeys", headers=self.headers, json={
+            'model_provider': self.provider, 'api_key': self.api_key, 'base_url': self.base_url
+        }, timeout=10)
+        if response.status_code != 200:
+            raise RuntimeError(f"添加模拟API密钥失败（需要管理员账号）: {response.status_code} {response.text[:200]}")
+        others = [key for key in self.keys() if key['api_key'] != self.api_key and key['is_active']]
+        if others:
+            print(f"警告: {self.provider} 还有{len(others)}个活跃密钥，部分请求可能发往其他地址", file=sys.stderr)
+        return self
+    
+    def __exit__(self, *exc):
+        for key in self.keys():
+            if key['api_key'] == self.api_key:
+                requests.delete(f"{self.url}/api/apikeys/{key['id']}", headers=self.headers, timeout=10)
+    
+    def keys(self) -> List[dict]:
+        response = requests.get(f"{self.url}/api/apikeys", headers=self.headers, timeout=10)
+        return [key for key in response.json() if key['model_provider'] == self.provider]
+
+def login(url: str, username: str, password: str) -> str:
+    """登录并返回令牌"""
+    response = requests.post(f"{url}/api/auth/login", json={'username': username, 'password': password}, timeout=10)
+    data = response.json()
+    if response.status_code != 200 or not data.get('token'):
+        raise RuntimeError(f"登录失败: {data.get('message') or data.get('error') or response.status_code}")
+    return data['token']
+
+def git_revision() -> dict:
+    """当前的git提交和工作区是否有未提交的修改，不在git仓库中时为None"""
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=cwd, capture_output=True, text=True, timeout=10)
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=cwd,
+                                capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return {'commit': None, 'dirty': None}
+    if commit.returncode != 0:
+        return {'commit': None, 'dirty': None}
+    return {'commit': commit.stdout.strip(), 'dirty': bool(status.stdout.strip())}
+
+def run_load(args, token: str) -> tuple:
+    """
+    启动各虚拟用户并等待全部完成
+    
+    Returns:
+        (测量结果列表, 总耗时)
+    """
+    results: List[RequestResult] = []
+    lock = threading.Lock()
+    started = time.monotonic()
+    deadline = started + args.duration if args.duration else None
+    
+    def user_loop(user: int):
+        # 在ramp_up时间内均匀地启动各用户
+        time.sleep(args.ramp_up * user / args.users)
+        count = 0
+        while True:
+            if deadline is not None:
+                if time.monotonic() >= deadline:
+                    break
+            elif count >= args.requests:
+                break
+            payload = {
+                # 每个请求的消息不同，避免响应缓存和近似缓存命中
+                'message': f"{args.message} #{user}-{count}",
+                'model': args.model,
+                'coalesce': args.coalesce,
+                'hedge': False
+            }
+            result = run_stream(args.url, token, payload, user, args.timeout)
+            with lock:
+                results.append(result)
+            count += 1
+            if args.think_time:
+                time.sleep(args.think_time)
+    
+    threads = [threading.Thread(target=user_loop, args=(user,), name=f"user-{user}", daemon=True)
+               for user in range(args.users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.monotonic() - started
+
+def summarize(results: List[RequestResult], wall: float) -> dict:
+    """汇总各请求的测量结果"""
+    succeeded = [result for result in results if result.error is None]
+    errors: Dict[str, int] = {}
+    for result in results:
+        if result.error is not None:
+            errors[result.error] = errors.get(result.error, 0) + 1
+    gaps = [gap for result in succeeded for gap in result.gaps]
+    # 单个流的输出速度：首token之后的token数除以首token之后的耗时
+    per_stream = [(result.tokens - 1) / (result.duration - result.ttft) for result in succeeded
+                  if result.ttft is not None and result.tokens > 1 and result.duration > result.ttft]
+    total_tokens = sum(result.tokens for result in succeeded)
+    return {
+        'requests': len(results),
+        'succeeded': len(succeeded),
+        'error_rate': round((len(results) - len(succeeded)) / len(results), 4) if results else None,
+        'errors': errors,
+        'wall_seconds': round(wall, 2),
+        'requests_per_second': round(len(results) / wall, 2) if wall else None,
+        'ttft_ms': distribution([result.ttft for result in succeeded if result.ttft is not None], 1000),
+        'inter_token_ms': distribution(gaps, 1000),
+        'duration_ms': distribution([result.duration for result in succeeded], 1000),
+        'completion_tokens': total_tokens,
+        'tokens_per_second': {
+            'aggregate': round(total_tokens / wall, 1) if wall else None,
+            'per_stream': distribution(per_stream)
+        }
+    }
+
+def lookup(data: dict, path: tuple):
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+def print_report(report: dict):
+    summary = report['summary']
+    print(f"请求 {summary['requests']}，成功 {summary['succeeded']}，错误率 {summary['error_rate']}，"
+          f"耗时 {summary['wall_seconds']}s，{summary['requests_per_second']} 请求/秒")
+    if summary['errors']:
+        print(f"  错误: {summary['errors']}")
+    for name, key in (('TTFT', 'ttft_ms'), ('token间隔', 'inter_token_ms'), ('请求耗时', 'duration_ms')):
+        stats = summary[key]
+        print(f"  {name:<8} p50={stats['p50']}ms p95={stats['p95']}ms p99={stats['p99']}ms max={stats['max']}ms")
+    speed = summary['tokens_per_second']
+    print(f"  输出速度 总计 {speed['aggregate']} tokens/s，单流 p50={speed['per_stream']['p50']} tokens/s")
+    server = report.get('server')
+    if server:
+        print(f"  后端进程 {server['pid']}: RSS 起始 {server['rss_mb']['start']}MB 峰值 {server['rss_mb']['peak']}MB，"
+              f"CPU 平均 {server['cpu_percent']['mean']}% 峰值 {server['cpu_percent']['peak']}%")
+
+def print_comparison(report: dict, baseline: dict):
+    """打印与基准结果相比主要指标的变化"""
+    print(f"对比基准 {baseline['meta'].get('git', {}).get('commit') or '?'}:")
+    for name, path, higher_is_better in COMPARE_METRICS:
+        old, new = lookup(baseline, path), lookup(report, path)
+        if old is None or new is None:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else 'n/a'
+        better = (new > old) == higher_is_better if new != old else None
+        mark = {True: '改善', False: '变差', None: ''}[better]
+        print(f"  {name:<22} {old:>10} -> {new:<10} {change:>8} {mark}")
+
+def main():
+    parser = argparse.ArgumentParser(description='流式聊天接口压测')
+    parser.add_argument('--url', default='http://127.0.0.1:5001', help='后端地址')
+    parser.add_argument('--username', default=os.getenv('LOADTEST_USERNAME'), help='登录用户名，添加模拟密钥时需要管理员')
+    parser.add_argument('--password', default=os.getenv('LOADTEST_PASSWORD'), help='登录密码')
+    parser.add_argument('--token', default=os.getenv('LOADTEST_TOKEN'), help='直接使用的令牌，指定时不登录')
+    parser.add_argument('--users', type=int, default=10, help='并发用户数')
+    parser.add_argument('--requests', type=int, default=5, help='每个用户依次发起的请求数')
+    parser.add_argument('--duration', type=float, help='压测时长（秒），指定时忽略--requests')
+    parser.add_argument('--ramp-up', type=float, default=0.0, help='在多少秒内逐步启动全部用户')
+    parser.add_argument('--think-time', type=float, default=0.0, help='同一用户两次请求之间的间隔（秒）')
+    parser.add_argument('--timeout', type=float, default=120.0, help='连接和两次读取之间的超时（秒）')
+    parser.add_argument('--model', default='gpt-4o', help='模型名称')
+    parser.add_argument('--provider', default='openai', help='模型对应的提供商，为其添加模拟密钥')
+    parser.add_argument('--message', default='请用三句话介绍一下你自己', help='消息内容，每个请求末尾附加序号')
+    parser.add_argument('--coalesce', action='store_true', help='开启请求合并（消息各不相同，一般不会合并）')
+    parser.add_argument('--mock-url', help='单独运行的模拟提供商地址')
+    parser.add_argument('--no-mock', action='store_true', help='不添加模拟密钥，使用后端现有的提供商配置')
+    parser.add_argument('--server-pid', type=int, help='后端进程PID，默认按--url的端口查找')
+    parser.add_argument('--sample-interval', type=float, default=0.5, help='采样后端进程资源占用的间隔（秒）')
+    parser.add_argument('--output', help='结果JSON文件路径，默认为loadtest-时间.json')
+    parser.add_argument('--raw', action='store_true', help='在结果中保存每个请求的测量值')
+    parser.add_argument('--compare', help='用于对比的上一次结果JSON文件')
+    for name, default in DEFAULT_SETTINGS.items():
+        parser.add_argument(f"--mock-{name.replace('_', '-')}", dest=f"mock_{name}", type=type(default),
+                            default=default, help=f"进程内模拟提供商的{name}，默认{default}")
+    args = parser.parse_args()
+    args.url = args.url.rstrip('/')
+    
+    try:
+        token = args.token or login(args.url, args.username or '', args.password or '')
+    except (RuntimeError, requests.RequestException, ValueError) as e:
+        sys.exit(f"无法登录 {args.url}: {e}")
+    
+    mock_server = None
+    mock_settings = None
+    mock_url = args.mock_url
+    if not args.no_mock and not mock_url:
+        mock_settings = {name: getattr(args, f"mock_{name}") for name in DEFAULT_SETTINGS}
+        mock_server = start_server(**mock_settings)
+        mock_url = mock_server.base_url
+    
+    host = urlsplit(args.url).hostname
+    pid = args.server_pid
+    if pid is None and host in ('127.0.0.1', 'localhost', '0.0.0.0'):
+        pid = find_listening_pid(urlsplit(args.url).port or 80)
+    if pid is None:
+        print('未找到后端进程，不采样RSS和CPU占用（可通过--server-pid指定）', file=sys.stderr)
+    
+    sampler = ProcessSampler(pid, args.sample_interval) if pid else None
+    started_at = datetime.now(timezone.utc).isoformat()
+    try:
+        if mock_url and not args.no_mock:
+            with MockKey(args.url, token, args.provider, mock_url):
+                if sampler:
+                    sampler.start()
+                results, wall = run_load(args, token)
+        else:
+            if sampler:
+                sampler.start()
+            results, wall = run_load(args, token)
+    finally:
+        server_stats = sampler.stop() if sampler and sampler._thread.is_alive() else None
+        if mock_server:
+            mock_server.shutdown()
+            mock_server.server_close()
+    
+    report = {
+        'meta': {
+            'started_at': started_at,
+            'git': git_revision(),
+            'python': platform.python_version(),
+            'url': args.url,
+            'model': args.model,
+            'provider': args.provider,
+            'users': args.users,
+            'requests_per_user': None if args.duration else args.requests,
+            'duration': args.duration,
+            'ramp_up': args.ramp_up,
+            'think_time': args.think_time,
+            'coalesce': args.coalesce,
+            'mock': mock_settings if mock_server else ({'url': mock_url} if mock_url and not args.no_mock else None)
+        },
+        'summary': summarize(results, wall),
+        'server': server_stats
+    }
+    if mock_server:
+        report['meta']['mock_stats'] = mock_server.state.stats
+    if args.raw:
+        report['requests'] = [result.to_dict() for result in results]
+    
+    output = args.output or f"loadtest-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print_report(report)
+    print(f"结果已写入 {output}")
+    
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(report, json.load(f))
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,750 @@
+#!/usr/bin/env python3
+"""
+本地模拟提供商服务器
+
+只依赖标准库，按各提供商的线上协议返回同步和流式响应，用于开发调试和压测，不消耗真实额度：
+    OpenAI兼容     .../chat/completions（同步、SSE，stream_options.include_usage）以及Batch API（/files、/batches）
+    Anthropic      .../v1/messages
+    Gemini         .../models/{model}:generateContent、:streamGenerateContent?alt=sse
+    百度文心一言   带access_token查询参数的对话端点，以及 .../oauth/2.0/token
+    阿里云百炼     请求体为{"input": ..., "parameters": ...}的DashScope文本生成端点（X-DashScope-SSE）
+
+按路径后缀和请求体识别协议，与前缀无关，把提供商管理中的default_base_url或API密钥的base_url改为
+http://127.0.0.1:8765/v1（Anthropic、Gemini为http://127.0.0.1:8765）即可让完整的调用链路打到本服务器。
+百度access_token换取地址通过环境变量AI_BAIDU_TOKEN_URL指向 http://127.0.0.1:8765/oauth/2.0/token。
+
+首token耗时、输出速度、错误率、429比例、流中途断开和畸形数据帧的比例都可以通过命令行参数设置，
+运行中可以通过POST /_mock/config修改；路径中形如key=value的段（多个用逗号分隔）只对该请求生效，
+例如base_url设为 http://127.0.0.1:8765/ttft=3,error_rate=0.5/v1 可以让某个提供商单独变慢、出错。
+GET /_mock/stats返回各协议的请求数和注入的故障次数，POST /_mock/reset清零。
+
+用法:
+    python benchmarks/mock_provider.py [--port 8765] [--ttft 0.3] [--tokens-per-second 50] [--reply-tokens 64]
+                                       [--error-rate 0] [--rate-limit-rate 0] [--disconnect-rate 0] [--malformed-rate 0]
+"""
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# 可配置项及其默认值
+DEFAULT_SETTINGS = {
+    'ttft': 0.3,  # 首token耗时（秒），同步请求的总耗时为首token耗时加全部token的输出时间
+    'tokens_per_second': 50.0,  # 每秒输出的token数，为0时不等待
+    'jitter': 0.0,  # 首token耗时和token间隔的随机浮动比例，0.2表示±20%
+    'reply_tokens': 64,  # 每次回复的token数，请求的max_tokens更小时按max_tokens截断
+    'reasoning_tokens': 0,  # 正文之前输出的推理token数（OpenAI兼容、Anthropic、Gemini、百炼）
+    'error_rate': 0.0,  # 返回服务端错误的比例
+    'rate_limit_rate': 0.0,  # 返回429的比例
+    'retry_after': 1.0,  # 429响应的Retry-After（秒）
+    'disconnect_rate': 0.0,  # 流式响应输出一半后直接断开连接的比例
+    'malformed_rate': 0.0,  # 流式响应中每个内容帧被截断为非法JSON的比例
+    'batch_seconds': 2.0  # Batch API任务从创建到完成的时间（秒）
+}
+
+# 回复内容从中随机取词，中英文混合，每个词计为一个token
+VOCABULARY = ('你好', '，', '这是', '一段', '模拟', '的', '回复', '。', ' This', ' is', ' a', ' mock', ' reply',
+              ' from', ' the', ' local', ' provider', '.', ' 123', '\n')
+
+# 百度文心一言的错误码：QPS超限、服务内部错误
+BAIDU_RATE_LIMITED = 18
+BAIDU_INTERNAL_ERROR = 336100
+
+def parse_settings(values: dict, base: Optional[dict] = None) -> dict:
+    """
+    校验并合并配置项，值可以是字符串（来自路径或命令行）
+    
+    Args:
+        values: 要修改的配置项
+        base: 基础配置，默认为DEFAULT_SETTINGS
+    
+    Returns:
+        合并后的配置
+    
+    Raises:
+        ValueError: 未知的配置项或取值无效
+    """
+    settings = dict(base or DEFAULT_SETTINGS)
+    for name, value in values.items():
+        if name not in DEFAULT_SETTINGS:
+            raise ValueError(f"未知的配置项: {name}")
+        value = type(DEFAULT_SETTINGS[name])(value)
+        if value < 0 or (name.endswith('_rate') and value > 1):
+            raise ValueError(f"配置项{name}的取值无效: {value}")
+        settings[name] = value
+    return settings
+
+def count_tokens(texts: List[str]) -> int:
+    """模拟提供商的分词结果：ASCII字符每个0.3个token，其余字符每个0.7个token，每条消息另加3个token"""
+    total = 0.0
+    for text in texts:
+        ascii_chars = len(text.encode('ascii', 'ignore'))
+        total += ascii_chars * 0.3 + (len(text) - ascii_chars) * 0.7 + 3
+    return max(int(total), 1)
+
+def content_text(content) -> str:
+    """取出消息内容中的文本，内容可以是字符串或[{"type": "text", "text": ...}]"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return ''.join(part.get('text', '') for part in content if isinstance(part, dict))
+    return ''
+
+class Reply:
+    """一次模拟回复：推理和正文的token、输入token数和结束原因"""
+    
+    def __init__(self, model: str, prompt_tokens: int, content: List[str], reasoning: List[str], truncated: bool):
+        self.id = uuid.uuid4().hex[:24]
+        self.created = int(time.time())
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.content = content
+        self.reasoning = reasoning
+        self.truncated = truncated
+    
+    @property
+    def completion_tokens(self) -> int:
+        return len(self.content) + len(self.reasoning)
+    
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+    
+    @property
+    def text(self) -> str:
+        return ''.join(self.content)
+
+# 流式帧：(类型, SSE事件名, 数据)，类型为token的帧之间按输出速度等待，其余为元数据帧
+Frame = Tuple[str, Optional[str], str]
+
+def dumps(data) -> str:
+    return json.dumps(data, ensure_ascii=False)
+
+class Protocol:
+    """一种提供商协议：从请求中取出提示词和参数，按线上格式生成同步响应、流式帧和错误响应"""
+    
+    name = ''
+    # 正常结束和达到max_tokens时的结束原因
+    finish_reasons = ('stop', 'length')
+    
+    def prompt_texts(self, body: dict) -> List[str]:
+        raise NotImplementedError
+    
+    def max_tokens(self, body: dict) -> Optional[int]:
+        return body.get('max_tokens')
+    
+    def model(self, path: str, body: dict) -> str:
+        return body.get('model') or 'mock-model'
+    
+    def is_stream(self, handler: BaseHTTPRequestHandler, query: dict, body: dict) -> bool:
+        return bool(body.get('stream'))
+    
+    def finish_reason(self, reply: Reply) -> str:
+        return self.finish_reasons[1] if reply.truncated else self.finish_reasons[0]
+    
+    def complete(self, reply: Reply) -> dict:
+        raise NotImplementedError
+    
+    def frames(self, reply: Reply, body: dict) -> Iterator[Frame]:
+        raise NotImplementedError
+    
+    def format_frame(self, index: int, event: Optional[str], data: str) -> bytes:
+        return f"data: {data}\n\n".encode('utf-8')
+    
+    def error(self, status: int, message: str) -> Tuple[int, dict]:
+        """返回(HTTP状态码, 响应体)"""
+        kind = 'rate_limit_error' if status == 429 else 'server_error'
+        return status, {'error': {'message': message, 'type': kind, 'code': kind}}
+
+class OpenAIProtocol(Protocol):
+    name = 'openai'
+    
+    def prompt_texts(self, body: dict) -> List[str]:
+        return [content_text(item.get('content')) for item in body.get('messages') or ()]
+    
+    def max_tokens(self, body: dict) -> Optional[int]:
+        return body.get('max_completion_tokens') or body.get('max_tokens')
+    
+    def usage(self, reply: Reply) -> dict:
+        return {'prompt_tokens': reply.prompt_tokens, 'completion_tokens': reply.completion_tokens,
+                'total_tokens': reply.total_tokens, 'prompt_tokens_details': {'cached_tokens': 0}}
+    
+    def complete(self, reply: Reply) -> dict:
+        message = {'role': 'assistant', 'content': reply.text}
+        if reply.reasoning:
+            message['reasoning_content'] = ''.join(reply.reasoning)
+        return {
+            'id': f"chatcmpl-{reply.id}", 'object': 'chat.completion', 'created': reply.created, 'model': reply.model,
+            'choices': [{'index': 0, 'message': message, 'finish_reason': self.finish_reason(reply)}],
+            'usage': self.usage(reply)
+        }
+    
+    def chunk(self, reply: Reply, delta: dict, finish_reason: Optional[str] = None) -> str:
+        return dumps({
+            'id': f"chatcmpl-{reply.id}", 'object': 'chat.completion.chunk', 'created': reply.created,
+            'model': reply.model, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+        })
+    
+    def frames(self, reply: Reply, body: dict) -> Iterator[Frame]:
+        yield 'meta', None, self.chunk(reply, {'role': 'assistant', 'content': ''})
+        for token in reply.reasoning:
+            yield 'token', None, self.chunk(reply, {'reasoning_content': token})
+        for token in reply.content:
+            yield 'token', None, self.chunk(reply, {'content': token})
+        yield 'meta', None, self.chunk(reply, {}, self.finish_reason(reply))
+        if (body.get('stream_options') or {}).get('include_usage'):
+            yield 'meta', None, dumps({
+                'id': f"chatcmpl-{reply.id}", 'object': 'chat.completion.chunk', 'created': reply.created,
+                'model': reply.model, 'choices': [], 'usage': self.usage(reply)
+            })
+        yield 'meta', None, '[DONE]'
+
+class AnthropicProtocol(Protocol):
+    name = 'anthropic'
+    finish_reasons = ('end_turn', 'max_tokens')
+    
+    def prompt_texts(self, body: dict) -> List[str]:
+        texts = [content_text(item.get('content')) for item in body.get('messages') or ()]
+        if body.get('system'):
+            texts.append(content_text(body['system']))
+        return texts
+    
+    def complete(self, reply: Reply) -> dict:
+        return {
+            'id': f"msg_{reply.id}", 'type': 'message', 'role': 'assistant', 'model': reply.model,
+            'content': [{'type': 'text', 'text': reply.text}],
+            'stop_reason': self.finish_reason(reply), 'stop_sequence': None,
+            'usage': {'input_tokens': reply.prompt_tokens, 'output_tokens': reply.completion_tokens,
+                      'cache_read_input_tokens': 0, 'cache_creation_input_tokens': 0}
+        }
+    
+    def frames(self, reply: Reply, body: dict) -> Iterator[Frame]:
+        yield 'meta', 'message_start', dumps({'type': 'message_start', 'message': {
+            'id': f"msg_{reply.id}", 'type': 'message', 'role': 'assistant', 'model': reply.model, 'content': [],
+            'stop_reason': None, 'stop_sequence': None,
+            'usage': {'input_tokens': reply.prompt_tokens, 'output_tokens': 1,
+                      'cache_read_input_tokens': 0, 'cache_creation_input_tokens': 0}
+        }})
+        blocks = []
+        if reply.reasoning:
+            blocks.append(('thinking', 'thinking_delta', 'thinking', reply.reasoning))
+        blocks.append(('text', 'text_delta', 'text', reply.content))
+        for index, (block_type, delta_type, field, tokens) in enumerate(blocks):
+            yield 'meta', 'content_block_start', dumps({
+                'type': 'content_block_start', 'index': index, 'content_block': {'type': block_type, field: ''}
+            })
+            for token in tokens:
+                yield 'token', 'content_block_delta', dumps({
+                    'type': 'content_block_delta', 'index': index, 'delta': {'type': delta_type, field: token}
+                })
+            yield 'meta', 'content_block_stop', dumps({'type': 'content_block_stop', 'index': index})
+        yield 'meta', 'message_delta', dumps({
+            'type': 'message_delta', 'delta': {'stop_reason': self.finish_reason(reply), 'stop_sequence': None},
+            'usage': {'output_tokens': reply.completion_tokens}
+        })
+        yield 'meta', 'message_stop', dumps({'type': 'message_stop'})
+    
+    def format_frame(self, index: int, event: Optional[str], data: str) -> bytes:
+        return f"event: {event}\ndata: {data}\n\n".encode('utf-8')
+    
+    def error(self, status: int, message: str) -> Tuple[int, dict]:
+        kind = 'rate_limit_error' if status == 429 else 'api_error'
+        return status, {'type': 'error', 'error': {'type': kind, 'message': message}}
+
+class GeminiProtocol(Protocol):
+    name = 'gemini'
+    finish_reasons = ('STOP', 'MAX_TOKENS')
+    
+    def prompt_texts(self, body: dict) -> List[str]:
+        contents = list(body.get('contents') or ())
+        if body.get('systemInstruction'):
+            contents.append(body['systemInstruction'])
+        return [content_text(item.get('parts')) for item in contents]
+    
+    def max_tokens(self, body: dict) -> Optional[int]:
+        return (body.get('generationConfig') or {}).get('maxOutputTokens')
+    
+    def model(self, path: str, body: dict) -> str:
+        return path.rsplit('/', 1)[-1].split(':', 1)[0]
+    
+    def is_stream(self, handler: BaseHTTPRequestHandler, query: dict, body: dict) -> bool:
+        return ':streamGenerateContent' in handler.path
+    
+    def usage(self, reply: Reply, final: bool = True) -> dict:
+        usage = {'promptTokenCount': reply.prompt_tokens, 'totalTokenCount': reply.prompt_tokens}
+        if final:
+            usage.update(candidatesTokenCount=len(reply.content), totalTokenCount=reply.total_tokens)
+            if reply.reasoning:
+                usage['thoughtsTokenCount'] = len(reply.reasoning)
+        return usage
+    
+    def candidate(self, parts: list, finish_reason: Optional[str] = None) -> dict:
+        candidate = {'content': {'parts': parts, 'role': 'model'}, 'index': 0}
+        if finish_reason:
+            candidate['finishReason'] = finish_reason
+        return candidate
+    
+    def complete(self, reply: Reply) -> dict:
+        return {
+            'candidates': [self.candidate([{'text': reply.text}], self.finish_reason(reply))],
+            'usageMetadata': self.usage(reply), 'modelVersion': reply.model
+        }
+    
+    def frames(self, reply: Reply, body: dict) -> Iterator[Frame]:
+        for token in reply.reasoning:
+            yield 'token', None, dumps({'candidates': [self.candidate([{'text': token, 'thought': True}])],
+                                        'usageMetadata': self.usage(reply, False), 'modelVersion': reply.model})
+        for token in reply.content:
+            yield 'token', None, dumps({'candidates': [self.candidate([{'text': token}])],
+                                        'usageMetadata': self.usage(reply, False), 'modelVersion': reply.model})
+        yield 'meta', None, dumps({'candidates': [self.candidate([{'text': ''}], self.finish_reason(reply))],
+                                   'usageMetadata': self.usage(reply), 'modelVersion': reply.model})
+    
+    def error(self, status: int, message: str) -> Tuple[int, dict]:
+        kind = 'RESOURCE_EXHAUSTED' if status == 429 else 'INTERNAL'
+        return status, {'error': {'code': status, 'message': message, 'status': kind}}
+
+class BaiduProtocol(Protocol):
+    name = 'baidu'
+    
+    def prompt_texts(self, body: dict) -> List[str]:
+        texts = [content_text(item.get('content')) for item in body.get('messages') or ()]
+        if body.get('system'):
+            texts.append(body['system'])
+        return texts
+    
+    def max_tokens(self, body: dict) -> Optional[int]:
+        return body.get('max_output_tokens')
+    
+    def model(self, path: str, body: dict) -> str:
+        return path.rsplit('/', 1)[-1]
+    
+    def usage(self, reply: Reply, final: bool = True) -> dict:
+        completion = reply.completion_tokens if final else 0
+        return {'prompt_tokens': reply.prompt_tokens, 'completion_tokens': completion,
+                'total_tokens': reply.prompt_tokens + completion}
+    
+    def message(self, reply: Reply, result: str, **fields) -> dict:
+        data = {'id': f"as-{reply.id}", 'object': 'chat.completion', 'created': reply.created, 'result': result,
+                'is_truncated': reply.truncated, 'need_clear_history': False}
+        data.update(fields)
+        return data
+    
+    def complete(self, reply: Reply) -> dict:
+        return self.message(reply, reply.text, usage=self.usage(reply))
+    
+    def frames(self, reply: Reply, body: dict) -> Iterator[Frame]:
+        for index, token in enumerate(reply.content):
+            yield 'token', None, dumps(self.message(reply, token, sentence_id=index, is_end=False,
+                                                    usage=self.usage(reply, False)))
+        yield 'meta', None, dumps(self.message(reply, '', sentence_id=len(reply.content), is_end=True,
+                                               usage=self.usage(reply)))
+    
+    def error(self, status: int, message: str) -> Tuple[int, dict]:
+        # 百度的业务错误以HTTP 200返回，通过error_code区分
+        code = BAIDU_RATE_LIMITED if status == 429 else BAIDU_INTERNAL_ERROR
+        return 200, {'error_code': code, 'error_msg': message}
+
+class DashScopeProtocol(Protocol):
+    name = 'dashscope'
+    
+    def prompt_texts(self, body: dict) -> List[str]:
+        data = body.get('input') or {}
+        if data.get('prompt'):
+            return [data['prompt']]
+        return [content_text(item.get('content')) for item in data.get('messages') or ()]
+    
+    def max_tokens(self, body: dict) -> Optional[int]:
+        return (body.get('parameters') or {}).get('max_tokens')
+    
+    def is_stream(self, handler: BaseHTTPRequestHandler, query: dict, body: dict) -> bool:
+        return (handler.headers.get('X-DashScope-SSE') or '').lower() == 'enable'
+    
+    def usage(self, reply: Reply, completion: int) -> dict:
+        return {'input_tokens': reply.prompt_tokens, 'output_tokens': completion,
+                'total_tokens': reply.prompt_tokens + completion}
+    
+    def complete(self, reply: Reply) -> dict:
+        output = {'text': reply.text, 'finish_reason': self.finish_reason(reply)}
+        if reply.reasoning:
+            output['reasoning_content'] = ''.join(reply.reasoning)
+        return {'output': output, 'usage': self.usage(reply, reply.completion_tokens), 'request_id': reply.id}
+    
+    def frames(self, reply: Reply, body: dict) -> Iterator[Frame]:
+        # 未开启incremental_output时每帧返回截至当前的完整内容
+        incremental = (body.get('parameters') or {}).get('incremental_output')
+        count = 0
+        for field, tokens in (('reasoning_content', reply.reasoning), ('text', reply.content)):
+            text = ''
+            for token in tokens:
+                count += 1
+                text += token
+                output = {'finish_reason': 'null', field: token if incremental else text}
+                yield 'token', None, dumps({'output': output, 'usage': self.usage(reply, count), 'request_id': reply.id})
+        output = {'finish_reason': self.finish_reason(reply), 'text': '' if incremental else reply.text}
+        yield 'meta', None, dumps({'output': output, 'usage': self.usage(reply, count), 'request_id': reply.id})
+    
+    def format_frame(self, index: int, event: Optional[str], data: str) -> bytes:
+        return f"id:{index + 1}\nevent:result\n:HTTP_STATUS/200\ndata:{data}\n\n".encode('utf-8')
+    
+    def error(self, status: int, message: str) -> Tuple[int, dict]:
+        code = 'Throttling.RateQuota' if status == 429 else 'InternalError'
+        return status, {'code': code, 'message': message, 'request_id': uuid.uuid4().hex}
+
+PROTOCOLS = {protocol.name: protocol for protocol in (
+    OpenAIProtocol(), AnthropicProtocol(), GeminiProtocol(), BaiduProtocol(), DashScopeProtocol()
+)}
+
+def detect_protocol(path: str, query: dict, body: dict) -> Optional[Protocol]:
+    """按路径后缀、查询参数和请求体识别协议，无法识别时返回None"""
+    # 百度的端点同样以/chat/completions结尾，先按access_token识别
+    if 'access_token' in query:
+        return PROTOCOLS['baidu']
+    if path.endswith('/chat/completions'):
+        return PROTOCOLS['openai']
+    if path.endswith('/messages'):
+        return PROTOCOLS['anthropic']
+    if ':generateContent' in path or ':streamGenerateContent' in path:
+        return PROTOCOLS['gemini']
+    if 'input' in body:
+        return PROTOCOLS['dashscope']
+    return None
+
+class MockState:
+    """服务器的共享状态：当前配置、统计计数、随机数发生器以及Batch API的文件和任务"""
+    
+    def __init__(self, settings: dict, seed: Optional[int] = None):
+        self.settings = settings
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.files = {}
+        self.batches = {}
+        self.reset()
+    
+    def reset(self):
+        with self.lock:
+            self.stats = {'requests': 0, 'streams': 0, 'rate_limited': 0, 'errors': 0, 'disconnects': 0,
+                          'malformed_frames': 0, 'completion_tokens': 0, 'protocols': {}}
+    
+    def count(self, name: str, value: int = 1, protocol: Optional[str] = None):
+        with self.lock:
+            self.stats[name] += value
+            if protocol:
+                self.stats['protocols'][protocol] = self.stats['protocols'].get(protocol, 0) + 1
+    
+    def chance(self, rate: float) -> bool:
+        return rate > 0 and self.random.random() < rate
+    
+    def delay(self, seconds: float, jitter: float) -> float:
+        if jitter:
+            seconds *= 1 + self.random.uniform(-jitter, jitter)
+        return max(seconds, 0.0)
+    
+    def make_reply(self, model: str, prompt_tokens: int, settings: dict, max_tokens: Optional[int],
+                   reasoning: bool = True) -> Reply:
+        reasoning_count = settings['reasoning_tokens'] if reasoning else 0
+        count = settings['reply_tokens']
+        truncated = bool(max_tokens) and count > max_tokens
+        if truncated:
+            count = max_tokens
+        words = [self.random.choice(VOCABULARY) for _ in range(count + reasoning_count)]
+        return Reply(model, prompt_tokens, words[reasoning_count:], words[:reasoning_count], truncated)
+
+class MockProviderHandler(BaseHTTPRequestHandler):
+    """处理模拟提供商请求，同步响应保持长连接，流式响应使用分块传输编码"""
+    
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockProvider/1.0'
+    # 是否打印访问日志，由命令行参数--verbose设置
+    verbose = False
+    
+    @property
+    def state(self) -> MockState:
+        return self.server.state
+    
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+    
+    def send_json(self, status: int, data, headers: Optional[dict] = None):
+        payload = data if isinstance(data, bytes) else dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+    
+    def split_path(self) -> Tuple[str, dict, dict]:
+        """
+        拆分请求路径，取出形如key=value的覆盖配置段
+        
+        Returns:
+            (去掉覆盖配置段后的路径, 查询参数, 覆盖配置)
+        """
+        parts = urlsplit(self.path)
+        overrides = {}
+        segments = []
+        for segment in parts.path.split('/'):
+            if '=' in segment and ':' not in segment:
+                for pair in unquote(segment).split(','):
+                    name, _, value = pair.partition('=')
+                    overrides[name.strip()] = value.strip()
+            else:
+                segments.append(segment)
+        return '/'.join(segments), parse_qs(parts.query), overrides
+    
+    def do_GET(self):
+        path, query, overrides = self.split_path()
+        if path == '/_mock/stats':
+            with self.state.lock:
+                stats = json.loads(dumps(self.state.stats))
+            return self.send_json(200, stats)
+        if path == '/_mock/config':
+            return self.send_json(200, self.state.settings)
+        if '/batches/' in path:
+            return self.handle_retrieve_batch(path.rsplit('/', 1)[-1])
+        if '/files/' in path and path.endswith('/content'):
+            content = self.state.files.get(path.split('/')[-2])
+            if content is None:
+                return self.send_json(404, {'error': {'message': '文件不存在', 'type': 'invalid_request_error'}})
+            return self.send_json(200, content)
+        self.send_json(404, {'error': {'message': f"未知的路径: {path}", 'type': 'invalid_request_error'}})
+    
+    def do_POST(self):
+        raw = self.read_body()
+        path, query, overrides = self.split_path()
+        if path == '/_mock/config':
+            return self.handle_config(raw)
+        if path == '/_mock/reset':
+            self.state.reset()
+            return self.send_json(200, {'message': '统计已清零'})
+        if path.endswith('/oauth/2.0/token'):
+            return self.send_json(200, {'access_token': f"mock-{uuid.uuid4().hex}", 'expires_in': 2592000})
+        if path.endswith('/files'):
+            return self.handle_upload(raw)
+        if path.endswith('/batches'):
+            return self.handle_create_batch(raw)
+        if '/batches/' in path and path.endswith('/cancel'):
+            return self.handle_cancel_batch(path.split('/')[-2])
+        
+        try:
+            body = json.loads(raw or b'{}')
+            settings = parse_settings(overrides, self.state.settings)
+        except ValueError as e:
+            return self.send_json(400, {'error': {'message': str(e), 'type': 'invalid_request_error'}})
+        protocol = detect_protocol(path, query, body)
+        if protocol is None:
+            return self.send_json(404, {'error': {'message': f"未知的路径: {path}", 'type': 'invalid_request_error'}})
+        self.handle_generation(protocol, path, query, body, settings)
+    
+    def handle_config(self, raw: bytes):
+        """POST /_mock/config：修改服务器的默认配置"""
+        try:
+            self.state.settings = parse_settings(json.loads(raw or b'{}'), self.state.settings)
+        except (ValueError, TypeError) as e:
+            return self.send_json(400, {'error': str(e)})
+        self.send_json(200, self.state.settings)
+    
+    def handle_generation(self, protocol: Protocol, path: str, query: dict, body: dict, settings: dict):
+        """按配置注入故障，或者返回同步响应、流式响应"""
+        state = self.state
+        state.count('requests', protocol=protocol.name)
+        if state.chance(settings['rate_limit_rate']):
+            state.count('rate_limited')
+            status, data = protocol.error(429, '请求过于频繁，请稍后重试（模拟限流）')
+            return self.send_json(status, data, {'Retry-After': f"{settings['retry_after']:g}"})
+        if state.chance(settings['error_rate']):
+            state.count('errors')
+            status, data = protocol.error(500, '服务内部错误（模拟故障）')
+            return self.send_json(status, data)
+        
+        prompt_tokens = count_tokens(protocol.prompt_texts(body))
+        reply = state.make_reply(protocol.model(path, body), prompt_tokens, settings, protocol.max_tokens(body),
+                                 reasoning=protocol.name != 'baidu')
+        state.count('completion_tokens', reply.completion_tokens)
+        interval = 1 / settings['tokens_per_second'] if settings['tokens_per_second'] else 0.0
+        if not protocol.is_stream(self, query, body):
+            time.sleep(state.delay(settings['ttft'] + interval * reply.completion_tokens, settings['jitter']))
+            return self.send_json(200, protocol.complete(reply))
+        state.count('streams')
+        self.stream(protocol, reply, body, settings, interval)
+    
+    def stream(self, protocol: Protocol, reply: Reply, body: dict, settings: dict, interval: float):
+        """以分块传输编码写出流式响应；模拟断开时不写结束块直接关闭连接，客户端会收到不完整的响应"""
+        state = self.state
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        disconnect_at = reply.completion_tokens // 2 if state.chance(settings['disconnect_rate']) else None
+        tokens = 0
+        try:
+            for index, (kind, event, data) in enumerate(protocol.frames(reply, body)):
+                if kind == 'token':
+                    if tokens == disconnect_at:
+                        state.count('disconnects')
+                        self.connection.shutdown(socket.SHUT_RDWR)
+                        self.close_connection = True
+                        return
+                    time.sleep(state.delay(settings['ttft'] if tokens == 0 else interval, settings['jitter']))
+                    tokens += 1
+                    if state.chance(settings['malformed_rate']):
+                        state.count('malformed_frames')
+                        data = data[:len(data) // 2]
+                self.write_chunk(protocol.format_frame(index, event, data))
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前断开
+            self.close_connection = True
+    
+    def write_chunk(self, data: bytes):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+    
+    def handle_upload(self, raw: bytes):
+        """POST /files：保存multipart上传的批处理请求文件"""
+        message = BytesParser(policy=policy.HTTP).parsebytes(
+            b'Content-Type: ' + self.headers.get('Content-Type', '').encode('latin-1') + b'\r\n\r\n' + raw
+        )
+        for part in message.iter_parts():
+            if part.get_filename():
+                file_id = f"file-{uuid.uuid4().hex[:24]}"
+                self.state.files[file_id] = part.get_payload(decode=True)
+                return self.send_json(200, {'id': file_id, 'object': 'file', 'purpose': 'batch',
+                                            'bytes': len(self.state.files[file_id])})
+        self.send_json(400, {'error': {'message': '缺少文件', 'type': 'invalid_request_error'}})
+    
+    def handle_create_batch(self, raw: bytes):
+        """POST /batches：创建批处理任务，batch_seconds秒后查询时完成"""
+        body = json.loads(raw or b'{}')
+        if body.get('input_file_id') not in self.state.files:
+            return self.send_json(400, {'error': {'message': '输入文件不存在', 'type': 'invalid_request_error'}})
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        self.state.batches[batch_id] = {
+            'id': batch_id, 'object': 'batch', 'endpoint': body.get('endpoint'), 'status': 'in_progress',
+            'input_file_id': body['input_file_id'], 'output_file_id': None, 'error_file_id': None,
+            'created_at': int(time.time())
+        }
+        self.send_json(200, self.state.batches[batch_id])
+    
+    def handle_retrieve_batch(self, batch_id: str):
+        """GET /batches/{id}：到期的任务按配置的错误率生成结果文件"""
+        batch = self.state.batches.get(batch_id)
+        if batch is None:
+            return self.send_json(404, {'error': {'message': '批处理任务不存在', 'type': 'invalid_request_error'}})
+        settings = self.state.settings
+        if batch['status'] == 'in_progress' and time.time() - batch['created_at'] >= settings['batch_seconds']:
+            outputs, errors = [], []
+            protocol = PROTOCOLS['openai']
+            for line in self.state.files[batch['input_file_id']].splitlines():
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                body = request.get('body') or {}
+                if self.state.chance(settings['error_rate']):
+                    status, data = protocol.error(500, '服务内部错误（模拟故障）')
+                    errors.append({'custom_id': request.get('custom_id'),
+                                   'response': {'status_code': status, 'body': data}, 'error': None})
+                    continue
+                reply = self.state.make_reply(body.get('model') or 'mock-model',
+                                              count_tokens(protocol.prompt_texts(body)), settings,
+                                              protocol.max_tokens(body))
+                outputs.append({'custom_id': request.get('custom_id'),
+                                'response': {'status_code': 200, 'body': protocol.complete(reply)}, 'error': None})
+            for field, records in (('output_file_id', outputs), ('error_file_id', errors)):
+                if records:
+                    file_id = f"file-{uuid.uuid4().hex[:24]}"
+                    self.state.files[file_id] = '\n'.join(dumps(record) for record in records).encode('utf-8')
+                    batch[field] = file_id
+            batch['status'] = 'completed'
+        self.send_json(200, batch)
+    
+    def handle_cancel_batch(self, batch_id: str):
+        """POST /batches/{id}/cancel：取消未完成的任务"""
+        batch = self.state.batches.get(batch_id)
+        if batch is None:
+            return self.send_json(404, {'error': {'message': '批处理任务不存在', 'type': 'invalid_request_error'}})
+        if batch['status'] == 'in_progress':
+            batch['status'] = 'cancelled'
+        self.send_json(200, batch)
+
+class MockProviderServer(ThreadingHTTPServer):
+    """每个连接一个线程的模拟提供商服务器"""
+    
+    daemon_threads = True
+    # 压测时大量并发连接同时到达，加大监听队列
+    request_queue_size = 1024
+    
+    def __init__(self, address: Tuple[str, int], settings: Optional[dict] = None, seed: Optional[int] = None):
+        super().__init__(address, MockProviderHandler)
+        self.state = MockState(parse_settings(settings or {}), seed)
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+def start_server(host: str = '127.0.0.1', port: int = 0, seed: Optional[int] = None, **settings) -> MockProviderServer:
+    """
+    在后台线程中启动模拟提供商服务器，供测试和压测脚本在进程内使用
+    
+    Args:
+        host: 监听地址
+        port: 监听端口，为0时由系统分配
+        seed: 随机数种子，指定后故障注入和回复内容可复现
+        **settings: 覆盖DEFAULT_SETTINGS中的配置项
+    
+    Returns:
+        已启动的服务器，base_url为访问地址，用完后调用shutdown()停止
+    """
+    server = MockProviderServer((host, port), settings, seed)
+    threading.Thread(target=server.serve_forever, name='mock-provider', daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟提供商服务器')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口')
+    parser.add_argument('--seed', type=int, help='随机数种子')
+    parser.add_argument('--verbose', action='store_true', help='打印访问日志')
+    for name, default in DEFAULT_SETTINGS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=type(default), default=default,
+                            help=f"默认{default}")
+    args = parser.parse_args()
+    
+    settings = {name: getattr(args, name) for name in DEFAULT_SETTINGS}
+    try:
+        server = MockProviderServer((args.host, args.port), settings, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    MockProviderHandler.verbose = args.verbose
+    base_url = server.base_url
+    print(f"模拟提供商服务器已启动: {base_url}")
+    print(f"  OpenAI兼容  {base_url}/v1")
+    print(f"  Anthropic   {base_url}")
+    print(f"  Gemini      {base_url}")
+    print(f"  百度        {base_url}/rpc/2.0/ai_custom/v1/wenxinworkshop/chat（AI_BAIDU_TOKEN_URL={base_url}/oauth/2.0/token）")
+    print(f"  阿里云百炼  {base_url}/api/v1/services/aigc/text-generation/generation")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
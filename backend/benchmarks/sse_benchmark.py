@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+SSE解析吞吐量基准测试
+
+将fixtures目录下按各提供商线上格式保存的流式响应切分成随机大小的网络块，
+分别用共享的增量解码器(ai.sse)和被它替换的原解析方式进行解析，
+比较吞吐量以及解析出的事件数量。
+
+用法:
+    python benchmarks/sse_benchmark.py [--rounds 20] [--min-chunk 16] [--max-chunk 4096]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.sse import iter_sse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def split_chunks(payload: bytes, min_size: int, max_size: int, seed: int) -> list:
+    """按随机大小切分字节流，模拟网络分块"""
+    rng = random.Random(seed)
+    chunks = []
+    pos = 0
+    while pos < len(payload):
+        size = rng.randint(min_size, max_size)
+        chunks.append(payload[pos:pos + size])
+        pos += size
+    return chunks
+
+class SharedDecoderClient:
+    """与BaseAIClient._parse_stream_event相同的事件处理"""
+    
+    def _parse_stream_event(self, event):
+        if event.is_done:
+            return None
+        try:
+            return [event.json()]
+        except json.JSONDecodeError:
+            return []
+
+class LegacyLineClient:
+    """原BaseAIClient._extract_stream_data和_parse_stream_line的逐行处理"""
+    
+    def _extract_stream_data(self, line: str):
+        if line.startswith('data:'):
+            return line[5:].strip()
+        return None
+    
+    def _parse_stream_line(self, line: str):
+        data = self._extract_stream_data(line)
+        if not data:
+            return []
+        if data == '[DONE]':
+            return None
+        try:
+            return [json.loads(data)]
+        except json.JSONDecodeError:
+            return []
+
+def parse_shared_decoder(chunks: list) -> int:
+    """共享增量解码器：按网络块解码字节，每个事件只解析一次JSON"""
+    client = SharedDecoderClient()
+    count = 0
+    for event in iter_sse(chunks):
+        parsed = client._parse_stream_event(event)
+        if parsed is None:
+            break
+        count += len(parsed)
+    return count
+
+def parse_legacy_iter_lines(chunks: list) -> int:
+    """
+    原_iter_stream的做法：requests的iter_lines(decode_unicode=True)逐行解码，
+    每个非空行（包括event/id/注释行）都经过_parse_stream_line
+    
+    iter_lines内部按512字节重新读取，与网络分块无关，这里直接从完整字节读取。
+    """
+    response = requests.Response()
+    response.raw = io.BytesIO(b''.join(chunks))
+    response.encoding = 'utf-8'
+    client = LegacyLineClient()
+    count = 0
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            continue
+        parsed = client._parse_stream_line(line)
+        if parsed is None:
+            break
+        count += len(parsed)
+    return count
+
+def parse_legacy_chunk_split(chunks: list) -> int:
+    """原DeepSeek客户端的做法：每个网络块单独decode并按换行切分"""
+    count = 0
+    for chunk in chunks:
+        try:
+            for line in chunk.decode('utf-8').split("\n"):
+                if line.startswith("data: "):
+                    data_str = line[6:].strip()
+                    if data_str == "[DONE]":
+                        return count
+                    json.loads(data_str)
+                    count += 1
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue
+    return count
+
+PARSERS = [
+    ('shared_decoder', parse_shared_decoder),
+    ('legacy_iter_lines', parse_legacy_iter_lines),
+    ('legacy_chunk_split', parse_legacy_chunk_split),
+]
+
+def run(rounds: int, min_chunk: int, max_chunk: int) -> dict:
+    results = {}
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        if not name.endswith('.sse'):
+            continue
+        with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+            payload = f.read()
+        chunk_sets = [split_chunks(payload, min_chunk, max_chunk, seed) for seed in range(rounds)]
+        expected = parse_shared_decoder([payload])
+        fixture_result = {'bytes': len(payload), 'events': expected}
+        for parser_name, parser in PARSERS:
+            # 预热一轮，避免首次运行的开销影响结果
+            parser(chunk_sets[0])
+            start = time.perf_counter()
+            events = 0
+            for chunks in chunk_sets:
+                events += parser(chunks)
+            elapsed = time.perf_counter() - start
+            fixture_result[parser_name] = {
+                'mb_per_s': round(len(payload) * rounds / elapsed / 1e6, 2),
+                'events_per_s': int(events / elapsed),
+                'events_lost': expected * rounds - events
+            }
+        results[name] = fixture_result
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='SSE解析吞吐量基准测试')
+    parser.add_argument('--rounds', type=int, default=20, help='每个fixture的随机分块轮数')
+    parser.add_argument('--min-chunk', type=int, default=16, help='最小网络块大小（字节）')
+    parser.add_argument('--max-chunk', type=int, default=4096, help='最大网络块大小（字节）')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+    args = parser.parse_args()
+    
+    results = run(args.rounds, args.min_chunk, args.max_chunk)
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+    
+    for fixture, result in results.items():
+        print(f"{fixture} ({result['bytes']} bytes, {result['events']} events)")
+        for parser_name, _ in PARSERS:
+            stats = result[parser_name]
+            print(f"  {parser_name:<20} {stats['mb_per_s']:>8.2f} MB/s "
+                  f"{stats['events_per_s']:>10} events/s  lost={stats['events_lost']}")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
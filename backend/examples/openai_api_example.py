@@ -57,8 +57,8 @@ def example_direct_client_usage():
         
         if stream:
             for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    print(chunk.choices[0].delta.content, end='', flush=True)
+                if chunk.content:
+                    print(chunk.content, end='', flush=True)
             print("\n")
         else:
             print("流式调用失败")
@@ -116,8 +116,8 @@ def example_unified_client_usage():
         
         if stream:
             for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    print(chunk.choices[0].delta.content, end='', flush=True)
+                if chunk.content:
+                    print(chunk.content, end='', flush=True)
             print("\n")
         else:
             print("统一接口流式调用失败")
@@ -1,5 +1,14 @@
 # Models package
 # 包含数据库模型和配置文件
+import importlib
 
-from .models import db, User, Model, ApiKey, Conversation, Message
-from .config import Config
\ No newline at end of file
+from .config import Config
+
+# 数据库模型在首次访问时才导入，只用到配置的模块（如ai包）不会加载SQLAlchemy
+_lazy_models = ('db', 'User', 'Model', 'ApiKey', 'Conversation', 'Message')
+
+def __getattr__(name: str):
+    """首次访问数据库模型时导入models.models"""
+    if name not in _lazy_models:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module('.models', __name__), name)
\ No newline at end of file
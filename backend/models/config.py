@@ -37,4 +37,90 @@ class Config:
     
     # 验证码配置
     VERIFICATION_CODE_EXPIRY = int(os.getenv('VERIFICATION_CODE_EXPIRY', '5'))  # 验证码过期时间（分钟）
-    VERIFICATION_RATE_LIMIT = int(os.getenv('VERIFICATION_RATE_LIMIT', '60'))  # 验证码发送间隔（秒）
\ No newline at end of file
+    VERIFICATION_RATE_LIMIT = int(os.getenv('VERIFICATION_RATE_LIMIT', '60'))  # 验证码发送间隔（秒）
+    
+    # AI提供商HTTP连接池配置
+    AI_HTTP_POOL_CONNECTIONS = int(os.getenv('AI_HTTP_POOL_CONNECTIONS', '4'))  # 每个提供商缓存的主机连接池数量
+    AI_HTTP_POOL_MAXSIZE = int(os.getenv('AI_HTTP_POOL_MAXSIZE', '32'))  # 每个主机的最大连接数
+    AI_HTTP_POOL_BLOCK = os.getenv('AI_HTTP_POOL_BLOCK', 'false').lower() == 'true'  # 连接数达到上限时是否阻塞等待
+    AI_HTTP_KEEP_ALIVE = os.getenv('AI_HTTP_KEEP_ALIVE', 'true').lower() == 'true'  # 是否启用连接复用
+    
+    # AI客户端实例注册表配置
+    AI_CLIENT_REGISTRY_SIZE = int(os.getenv('AI_CLIENT_REGISTRY_SIZE', '64'))  # 最多缓存的客户端实例数
+    AI_CLIENT_REGISTRY_TTL = int(os.getenv('AI_CLIENT_REGISTRY_TTL', '300'))  # 实例最长复用时间（秒），兜底其他worker的配置变更
+    
+    # 对冲请求配置：主提供商首个token迟迟未到时，向提供同一模型的备用提供商再发一次请求
+    AI_HEDGING_ENABLED = os.getenv('AI_HEDGING_ENABLED', 'false').lower() == 'true'  # 默认是否开启，请求体中的hedge字段可单独指定
+    AI_HEDGING_PERCENTILE = float(os.getenv('AI_HEDGING_PERCENTILE', '95'))  # 使用最近首token耗时的哪个百分位作为等待时间
+    AI_HEDGING_DEFAULT_DELAY = float(os.getenv('AI_HEDGING_DEFAULT_DELAY', '3.0'))  # 样本不足时的等待时间（秒）
+    AI_HEDGING_MIN_DELAY = float(os.getenv('AI_HEDGING_MIN_DELAY', '0.5'))  # 等待时间下限（秒），避免过早发出备用请求
+    AI_HEDGING_MIN_SAMPLES = int(os.getenv('AI_HEDGING_MIN_SAMPLES', '20'))  # 计算百分位所需的最少样本数
+    AI_HEDGING_WINDOW = int(os.getenv('AI_HEDGING_WINDOW', '200'))  # 每个提供商/模型保留的最近样本数
+    
+    # 熔断器配置：按(提供商, base_url)统计最近调用的错误率和慢调用率
+    AI_BREAKER_WINDOW = int(os.getenv('AI_BREAKER_WINDOW', '20'))  # 统计最近多少次调用
+    AI_BREAKER_MIN_CALLS = int(os.getenv('AI_BREAKER_MIN_CALLS', '10'))  # 至少多少次调用才开始判断
+    AI_BREAKER_FAILURE_RATE = float(os.getenv('AI_BREAKER_FAILURE_RATE', '0.5'))  # 触发熔断的错误率
+    AI_BREAKER_SLOW_CALL_SECONDS = float(os.getenv('AI_BREAKER_SLOW_CALL_SECONDS', '20'))  # 超过该耗时（秒）视为慢调用
+    AI_BREAKER_SLOW_CALL_RATE = float(os.getenv('AI_BREAKER_SLOW_CALL_RATE', '0.8'))  # 触发熔断的慢调用率
+    AI_BREAKER_OPEN_SECONDS = float(os.getenv('AI_BREAKER_OPEN_SECONDS', '30'))  # 熔断后的冷却时间（秒）
+    AI_BREAKER_HALF_OPEN_CALLS = int(os.getenv('AI_BREAKER_HALF_OPEN_CALLS', '1'))  # 冷却后放行的探测请求数
+    
+    # 重试配置：连接失败和429/5xx等临时错误按指数退避加抖动重试，遵循Retry-After
+    AI_RETRY_DEADLINE = float(os.getenv('AI_RETRY_DEADLINE', '15'))  # 从首次请求起最多重试多长时间（秒），0表示不重试
+    AI_RETRY_BASE_DELAY = float(os.getenv('AI_RETRY_BASE_DELAY', '0.5'))  # 退避基数（秒）
+    AI_RETRY_MAX_DELAY = float(os.getenv('AI_RETRY_MAX_DELAY', '8'))  # 单次退避上限（秒）
+    AI_RETRY_STATUSES = tuple(int(code) for code in os.getenv('AI_RETRY_STATUSES', '429,500,502,503,504').split(',') if code.strip())  # 需要重试的状态码
+    
+    # 分阶段超时配置：连接、首token和token间隔分别限时，模型管理和提供商管理中可单独设置，超时后返回对应阶段的错误
+    AI_CONNECT_TIMEOUT = float(os.getenv('AI_CONNECT_TIMEOUT', '5'))  # 建立连接的超时时间（秒），超时后按重试配置重试
+    AI_FIRST_TOKEN_TIMEOUT = float(os.getenv('AI_FIRST_TOKEN_TIMEOUT', '60'))  # 流式请求发出后等待首个token的超时时间（秒）
+    AI_IDLE_TIMEOUT = float(os.getenv('AI_IDLE_TIMEOUT', '30'))  # 流式响应开始后两次收到内容的最大间隔（秒）
+    
+    # API密钥池配置：同一提供商可配置多个活跃密钥，按策略分摊请求
+    AI_KEY_POOL_STRATEGY = os.getenv('AI_KEY_POOL_STRATEGY', 'least_in_flight')  # least_in_flight（最少在途请求）或weighted_round_robin（加权轮询）
+    AI_KEY_COOLDOWN_SECONDS = float(os.getenv('AI_KEY_COOLDOWN_SECONDS', '30'))  # 密钥收到429且没有Retry-After时的冷却时间（秒）
+    AI_KEY_COOLDOWN_MAX_SECONDS = float(os.getenv('AI_KEY_COOLDOWN_MAX_SECONDS', '300'))  # 冷却时间上限（秒）
+    
+    # API密钥限流配置：按ApiKey上配置的RPM/TPM在请求发出前限流，桶状态通过本地SQLite文件在worker之间共享
+    AI_RATE_LIMIT_DB = os.getenv('AI_RATE_LIMIT_DB', os.path.join(database_dir, "rate_limits.db"))  # 共享存储文件路径
+    AI_RATE_LIMIT_MAX_WAIT = float(os.getenv('AI_RATE_LIMIT_MAX_WAIT', '10'))  # 额度不足时最多排队等待的时间（秒），超过则直接拒绝
+    
+    # 请求合并配置：提供商、模型、消息和参数完全相同的进行中请求共享一次上游调用
+    AI_SINGLEFLIGHT_ENABLED = os.getenv('AI_SINGLEFLIGHT_ENABLED', 'false').lower() == 'true'  # 默认是否开启，请求体中的coalesce字段可单独指定
+    
+    # 响应缓存配置：temperature为0或指定了seed的确定性请求按模型、消息和生成参数精确匹配缓存
+    AI_RESPONSE_CACHE_ENABLED = os.getenv('AI_RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'  # 是否启用响应缓存
+    AI_RESPONSE_CACHE_TTL = float(os.getenv('AI_RESPONSE_CACHE_TTL', '3600'))  # 缓存有效期（秒）
+    AI_RESPONSE_CACHE_MAX_BYTES = int(os.getenv('AI_RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))  # 内存层缓存内容的总字节数上限
+    AI_RESPONSE_CACHE_DB = os.getenv('AI_RESPONSE_CACHE_DB', '')  # SQLite持久层文件路径，为空时只使用内存层
+    
+    # 近似缓存配置：在模型管理中开启后，同一模型下与已缓存提示词高度相似的请求直接返回缓存响应
+    AI_SIMILARITY_CACHE_THRESHOLD = float(os.getenv('AI_SIMILARITY_CACHE_THRESHOLD', '0.8'))  # 命中所需的最低Jaccard相似度（按字符二元组计算）
+    AI_SIMILARITY_CACHE_TTL = float(os.getenv('AI_SIMILARITY_CACHE_TTL', '3600'))  # 缓存有效期（秒）
+    AI_SIMILARITY_CACHE_MAX_ENTRIES = int(os.getenv('AI_SIMILARITY_CACHE_MAX_ENTRIES', '100000'))  # 最大缓存条目数，超过后按LRU淘汰
+    
+    # 提示词前缀缓存配置：系统消息和历史对话较长时标记为稳定前缀，由提供商缓存，降低首token耗时和输入费用
+    AI_PROMPT_CACHE_ENABLED = os.getenv('AI_PROMPT_CACHE_ENABLED', 'true').lower() == 'true'  # 是否标记稳定前缀
+    AI_PROMPT_CACHE_MIN_TOKENS = int(os.getenv('AI_PROMPT_CACHE_MIN_TOKENS', '1024'))  # 前缀估算token数达到该值才标记，低于提供商的最低缓存长度时标记无效
+    
+    # token估算配置：请求前按字符数本地估算输入token，用提供商返回的用量按模型自动校准，用于TPM限流
+    AI_TOKEN_CALIBRATION_DECAY = float(os.getenv('AI_TOKEN_CALIBRATION_DECAY', '0.95'))  # 每加入一个样本时旧样本权重的衰减系数，越小越快适应分词器变化
+    
+    # 百度access_token配置：API密钥配置为"API Key:Secret Key"时自动换取并缓存access_token，过期前在后台刷新
+    AI_BAIDU_TOKEN_URL = os.getenv('AI_BAIDU_TOKEN_URL', 'https://aip.baidubce.com/oauth/2.0/token')  # 换取access_token的地址
+    AI_BAIDU_TOKEN_DB = os.getenv('AI_BAIDU_TOKEN_DB', os.path.join(database_dir, "baidu_tokens.db"))  # 多个worker共享令牌的SQLite文件路径
+    AI_BAIDU_TOKEN_REFRESH_BEFORE = float(os.getenv('AI_BAIDU_TOKEN_REFRESH_BEFORE', '86400'))  # 距离过期多少秒时开始后台刷新（令牌有效期约30天）
+    
+    # 批处理任务配置：上传JSONL后在后台执行，提供商支持OpenAI Batch API时默认提交给提供商执行
+    AI_BATCH_MODE = os.getenv('AI_BATCH_MODE', 'auto')  # auto（提供商支持时使用原生批处理）、native或local（本地工作线程池执行）
+    AI_BATCH_CONCURRENCY = int(os.getenv('AI_BATCH_CONCURRENCY', '4'))  # 本地执行时每个任务的默认并发数
+    AI_BATCH_MAX_CONCURRENCY = int(os.getenv('AI_BATCH_MAX_CONCURRENCY', '16'))  # 请求体中concurrency字段的上限
+    AI_BATCH_MAX_ITEMS = int(os.getenv('AI_BATCH_MAX_ITEMS', '50000'))  # 单个任务最多的请求数，与OpenAI Batch API的上限一致
+    AI_BATCH_MAX_ATTEMPTS = int(os.getenv('AI_BATCH_MAX_ATTEMPTS', '5'))  # 单个请求因额度不足或熔断最多尝试的次数，其他错误由重试策略处理
+    AI_BATCH_CHECKPOINT_SIZE = int(os.getenv('AI_BATCH_CHECKPOINT_SIZE', '50'))  # 每完成多少个请求写入一次数据库，中断后从最近的检查点继续
+    AI_BATCH_CHECKPOINT_INTERVAL = float(os.getenv('AI_BATCH_CHECKPOINT_INTERVAL', '2'))  # 最长多少秒写入一次数据库
+    AI_BATCH_POLL_INTERVAL = float(os.getenv('AI_BATCH_POLL_INTERVAL', '60'))  # 原生批处理查询提供商状态的间隔（秒）
+    
+    # 多模型对比配置：同一条消息并发发给多个模型，通过一个SSE流返回各模型的回复
+    AI_COMPARE_MAX_MODELS = int(os.getenv('AI_COMPARE_MAX_MODELS', '6'))  # 单次对比最多的模型数
\ No newline at end of file
@@ -1,9 +1,43 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import func
 
 db = SQLAlchemy()
 
+# 可以按模型或提供商单独设置的分阶段超时（秒）：连接、首token、token间隔，为空时取上一级设置
+TIMEOUT_FIELDS = ('connect_timeout', 'first_token_timeout', 'idle_timeout')
+
+def parse_timeouts(data):
+    """
+    从请求体中读取分阶段超时设置
+    
+    Args:
+        data: 请求体，未包含的字段不返回，值为空表示清除设置
+    
+    Returns:
+        字段名到超时时间的字典
+    
+    Raises:
+        ValueError: 超时时间不是正数
+    """
+    timeouts = {}
+    for field in TIMEOUT_FIELDS:
+        if field not in data:
+            continue
+        value = data[field]
+        if value in (None, ''):
+            timeouts[field] = None
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            value = 0
+        if value <= 0:
+            raise ValueError(f'{field} 必须是正数')
+        timeouts[field] = value
+    return timeouts
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -46,6 +80,12 @@ class User(db.Model):
         """检查邮箱是否存在"""
         return cls.query.filter_by(email=email).first() is not None
     
+    @classmethod
+    def add_usage(cls, user_id, tokens):
+        """累加提供商报告的token用量，在数据库中原子递增，并发请求不会互相覆盖；调用方负责提交"""
+        if tokens:
+            cls.query.filter_by(id=user_id).update({cls.usage_count: func.coalesce(cls.usage_count, 0) + tokens})
+    
     def to_dict(self, include_sensitive=False):
         from utils.time_utils import to_beijing_iso
         data = {
@@ -91,8 +131,41 @@ class Message(db.Model):
     role = db.Column(db.String(20), nullable=False)  # 'user' or 'assistant'
     content = db.Column(db.Text, nullable=False)
     reasoning = db.Column(db.Text, nullable=True)  # 推理过程字段
+    model = db.Column(db.String(100), nullable=True)  # 生成回复的模型，多模型对比时区分同一对话中各模型的回复
+    prompt_tokens = db.Column(db.Integer)  # 提供商报告的输入token数（含命中缓存的部分），未报告时为空
+    completion_tokens = db.Column(db.Integer)  # 提供商报告的输出token数（含推理过程）
+    total_tokens = db.Column(db.Integer)  # 提供商报告的总token数，未报告时为输入与输出之和
+    cache_read_tokens = db.Column(db.Integer)  # 输入中命中提示词缓存的token数
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
+    def set_usage(self, usage):
+        """
+        记录生成该回复的token用量
+        
+        Args:
+            usage: 统一格式的用量（见ai.prompt_cache.normalize_usage），为空时不记录
+        """
+        if not usage:
+            return
+        self.prompt_tokens = usage.get('prompt_tokens')
+        self.completion_tokens = usage.get('completion_tokens')
+        self.total_tokens = usage.get('total_tokens')
+        if self.total_tokens is None and (self.prompt_tokens is not None or self.completion_tokens is not None):
+            self.total_tokens = (self.prompt_tokens or 0) + (self.completion_tokens or 0)
+        self.cache_read_tokens = usage.get('cache_read_tokens')
+    
+    @property
+    def usage(self):
+        """记录的token用量，与返回给前端的用量格式一致，未记录时为None"""
+        if self.total_tokens is None:
+            return None
+        return {
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': self.total_tokens,
+            'cache_read_tokens': self.cache_read_tokens
+        }
+    
     def to_dict(self):
         from utils.time_utils import to_beijing_iso
         return {
@@ -101,6 +174,8 @@ class Message(db.Model):
             'role': self.role,
             'content': self.content,
             'reasoning': self.reasoning,
+            'model': self.model,
+            'usage': self.usage,
             'timestamp': to_beijing_iso(self.timestamp)
         }
 
@@ -109,6 +184,9 @@ class ApiKey(db.Model):
     model_provider = db.Column(db.String(100), nullable=False)
     api_key = db.Column(db.String(500), nullable=False)
     base_url = db.Column(db.String(500))
+    weight = db.Column(db.Integer, default=1)  # 同一提供商多个密钥之间的分流权重
+    rpm_limit = db.Column(db.Integer)  # 每分钟请求数上限，为空表示不限
+    tpm_limit = db.Column(db.Integer)  # 每分钟token数上限，为空表示不限
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -124,6 +202,9 @@ class ApiKey(db.Model):
             'base_url': self.base_url,
             'default_base_url': default_base,
             'effective_base_url': effective_base,
+            'weight': self.weight or 1,
+            'rpm_limit': self.rpm_limit,
+            'tpm_limit': self.tpm_limit,
             'is_active': self.is_active,
             'created_at': to_beijing_iso(self.created_at),
             'updated_at': to_beijing_iso(self.updated_at)
@@ -136,6 +217,9 @@ class Provider(db.Model):
     default_base_url = db.Column(db.String(500), nullable=False)  # 默认API地址
     is_active = db.Column(db.Boolean, default=True)  # 是否启用
     sort_order = db.Column(db.Integer, default=0)  # 排序顺序
+    connect_timeout = db.Column(db.Float)  # 连接超时（秒），为空时取配置
+    first_token_timeout = db.Column(db.Float)  # 首token超时（秒），为空时取配置
+    idle_timeout = db.Column(db.Float)  # token间隔超时（秒），为空时取配置
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -148,6 +232,9 @@ class Provider(db.Model):
             'default_base_url': self.default_base_url,
             'is_active': self.is_active,
             'sort_order': self.sort_order,
+            'connect_timeout': self.connect_timeout,
+            'first_token_timeout': self.first_token_timeout,
+            'idle_timeout': self.idle_timeout,
             'created_at': to_beijing_iso(self.created_at),
             'updated_at': to_beijing_iso(self.updated_at)
         }
@@ -195,6 +282,10 @@ class Model(db.Model):
     description = db.Column(db.Text)  # 模型描述
     is_active = db.Column(db.Boolean, default=True)  # 是否启用
     sort_order = db.Column(db.Integer, default=0)  # 排序顺序
+    similarity_cache = db.Column(db.Boolean, default=False)  # 是否对近似重复的提示词使用缓存响应
+    connect_timeout = db.Column(db.Float)  # 连接超时（秒），为空时取提供商设置
+    first_token_timeout = db.Column(db.Float)  # 首token超时（秒），为空时取提供商设置
+    idle_timeout = db.Column(db.Float)  # token间隔超时（秒），为空时取提供商设置
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -204,6 +295,25 @@ class Model(db.Model):
         provider_obj = Provider.get_provider_by_key(provider)
         return provider_obj.default_base_url if provider_obj else ''
     
+    @classmethod
+    def get_timeouts(cls, model_name, provider):
+        """
+        获取调用模型时使用的分阶段超时，模型上未设置的阶段取提供商的设置
+        
+        Returns:
+            作为调用参数传给客户端的超时字典，都未设置的阶段不包含在内，由客户端取配置
+        """
+        model = cls.query.filter_by(model_name=model_name, model_provider=provider, is_active=True).first()
+        provider_obj = Provider.get_provider_by_key(provider)
+        timeouts = {}
+        for field in TIMEOUT_FIELDS:
+            value = getattr(model, field, None) if model else None
+            if value is None and provider_obj:
+                value = getattr(provider_obj, field)
+            if value is not None:
+                timeouts[field] = value
+        return timeouts
+    
     def to_dict(self):
         from utils.time_utils import to_beijing_iso
         return {
@@ -221,7 +331,76 @@ class Model(db.Model):
             'description': self.description,
             'is_active': self.is_active,
             'sort_order': self.sort_order,
+            'similarity_cache': bool(self.similarity_cache),
+            'connect_timeout': self.connect_timeout,
+            'first_token_timeout': self.first_token_timeout,
+            'idle_timeout': self.idle_timeout,
             'default_base_url': self.get_default_base_url(self.model_provider),
             'created_at': to_beijing_iso(self.created_at),
             'updated_at': to_beijing_iso(self.updated_at)
+        }
+
+class BatchJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.String(100), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    model_provider = db.Column(db.String(100), nullable=False)
+    mode = db.Column(db.String(20), default='local')  # 'local'（本地工作线程池）或 'native'（提供商批处理接口）
+    status = db.Column(db.String(20), default='pending')  # pending, running, paused, completed, failed, cancelled
+    concurrency = db.Column(db.Integer, default=4)  # 本地执行时的并发数
+    total_count = db.Column(db.Integer, default=0)
+    completed_count = db.Column(db.Integer, default=0)
+    failed_count = db.Column(db.Integer, default=0)
+    provider_batch_id = db.Column(db.String(200))  # 提供商返回的批处理ID，提交后记录，恢复时不再重复提交
+    provider_status = db.Column(db.String(50))  # 提供商返回的批处理状态
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        from utils.time_utils import to_beijing_iso
+        return {
+            'id': self.id,
+            'batch_id': self.batch_id,
+            'user_id': self.user_id,
+            'model': self.model,
+            'model_provider': self.model_provider,
+            'mode': self.mode,
+            'status': self.status,
+            'concurrency': self.concurrency,
+            'total_count': self.total_count,
+            'completed_count': self.completed_count,
+            'failed_count': self.failed_count,
+            'pending_count': self.total_count - self.completed_count - self.failed_count,
+            'provider_batch_id': self.provider_batch_id,
+            'provider_status': self.provider_status,
+            'error': self.error,
+            'created_at': to_beijing_iso(self.created_at),
+            'updated_at': to_beijing_iso(self.updated_at),
+            'finished_at': to_beijing_iso(self.finished_at)
+        }
+
+class BatchItem(db.Model):
+    __table_args__ = (db.Index('ix_batch_item_batch_status', 'batch_id', 'status'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.String(100), nullable=False)
+    custom_id = db.Column(db.String(200), nullable=False)  # 上传文件中的custom_id，用于对应结果
+    message = db.Column(db.Text, nullable=False)
+    params = db.Column(db.Text)  # 生成参数的JSON
+    status = db.Column(db.String(20), default='pending')  # pending, completed, failed
+    response = db.Column(db.Text)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, default=0)
+    completed_at = db.Column(db.DateTime)
+    
+    def to_result(self):
+        """结果文件中的一行"""
+        return {
+            'custom_id': self.custom_id,
+            'status': self.status,
+            'response': self.response,
+            'error': self.error
         }
\ No newline at end of file
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
-from models.models import db, Model, Provider
+from models.models import db, Model, Provider, parse_timeouts
 from utils.auth import admin_required
 from utils.constants import DEFAULT_API_PROVIDER
 
@@ -48,10 +48,18 @@ def create_model(current_user):
             if not data.get(field):
                 return jsonify({'error': f'{field} 不能为空'}), 400
         
-        # 检查模型名称是否已存在
-        existing_model = Model.query.filter_by(model_name=data['model_name']).first()
+        # 同一模型可以配置在多个提供商下（用于对冲请求和熔断切换），只检查同一提供商下是否重复
+        existing_model = Model.query.filter_by(
+            model_name=data['model_name'],
+            model_provider=data['model_provider']
+        ).first()
         if existing_model:
-            return jsonify({'error': '模型名称已存在'}), 400
+            return jsonify({'error': '该提供商下模型名称已存在'}), 400
+        
+        try:
+            timeouts = parse_timeouts(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # 创建新模型
         new_model = Model(
@@ -67,7 +75,9 @@ def create_model(current_user):
             output_price_per_1k=data.get('output_price_per_1k', 0.0),
             description=data.get('description', ''),
             is_active=data.get('is_active', True),
-            sort_order=data.get('sort_order', 0)
+            sort_order=data.get('sort_order', 0),
+            similarity_cache=bool(data.get('similarity_cache', False)),
+            **timeouts
         )
         
         db.session.add(new_model)
@@ -89,23 +99,37 @@ def update_model(current_user, model_id):
         model = Model.query.get_or_404(model_id)
         data = request.get_json()
         
+        try:
+            timeouts = parse_timeouts(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # 更新模型名称或提供商时，需要检查同一提供商下是否重复
+        model_name = data.get('model_name', model.model_name)
+        model_provider = data.get('model_provider', model.model_provider)
+        if (model_name, model_provider) != (model.model_name, model.model_provider):
+            existing_model = Model.query.filter(
+                Model.model_name == model_name,
+                Model.model_provider == model_provider,
+                Model.id != model.id
+            ).first()
+            if existing_model:
+                return jsonify({'error': '该提供商下模型名称已存在'}), 400
+            model.model_name = model_name
+        
         # 更新字段
         updatable_fields = [
             'display_name', 'model_provider', 'model_type', 'max_tokens',
             'supports_streaming', 'supports_function_calling', 'supports_vision',
-            'input_price_per_1k', 'output_price_per_1k', 'description', 'is_active', 'sort_order'
+            'input_price_per_1k', 'output_price_per_1k', 'description', 'is_active', 'sort_order',
+            'similarity_cache'
         ]
         
         for field in updatable_fields:
             if field in data:
                 setattr(model, field, data[field])
-        
-        # 如果更新模型名称，需要检查是否重复
-        if 'model_name' in data and data['model_name'] != model.model_name:
-            existing_model = Model.query.filter_by(model_name=data['model_name']).first()
-            if existing_model:
-                return jsonify({'error': '模型名称已存在'}), 400
-            model.model_name = data['model_name']
+        for field, value in timeouts.items():
+            setattr(model, field, value)
         
         model.updated_at = datetime.utcnow()
         db.session.commit()
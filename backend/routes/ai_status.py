@@ -0,0 +1,105 @@
+from flask import Blueprint, jsonify, request
+from ai.circuit_breaker import CircuitBreakerRegistry
+from ai.http_pool import HTTPPoolManager
+from ai.hedging import ttft_tracker
+from ai.key_pool import key_pool
+from ai.prompt_cache import prompt_cache_tracker
+from ai.rate_limiter import rate_limiter
+from ai.response_cache import response_cache
+from ai.similarity_cache import similarity_cache
+from ai.singleflight import singleflight
+from ai.token_estimator import token_estimator
+from models.models import ApiKey
+from utils.auth import admin_required
+
+ai_status_bp = Blueprint('ai_status', __name__)
+
+@ai_status_bp.route('/api/ai/pools', methods=['GET'])
+@admin_required
+def get_pool_stats(current_user):
+    """获取各提供商HTTP连接池统计（仅管理员）"""
+    return jsonify(HTTPPoolManager.get_stats())
+
+@ai_status_bp.route('/api/ai/ttft', methods=['GET'])
+@admin_required
+def get_ttft_stats(current_user):
+    """获取各提供商/模型最近的首token耗时统计（仅管理员）"""
+    return jsonify(ttft_tracker.get_stats())
+
+@ai_status_bp.route('/api/ai/prompt-cache', methods=['GET'])
+@admin_required
+def get_prompt_cache_stats(current_user):
+    """获取各提供商/模型的提示词前缀缓存命中统计（仅管理员）"""
+    return jsonify(prompt_cache_tracker.get_stats())
+
+@ai_status_bp.route('/api/ai/token-estimator', methods=['GET'])
+@admin_required
+def get_token_estimator_stats(current_user):
+    """获取各提供商/模型的token估算校准状态（仅管理员）"""
+    return jsonify(token_estimator.get_stats())
+
+@ai_status_bp.route('/api/ai/singleflight', methods=['GET'])
+@admin_required
+def get_singleflight_stats(current_user):
+    """获取请求合并统计（仅管理员）"""
+    return jsonify(singleflight.get_stats())
+
+@ai_status_bp.route('/api/ai/cache', methods=['GET'])
+@admin_required
+def get_cache_stats(current_user):
+    """获取响应缓存的命中统计（仅管理员）"""
+    return jsonify(response_cache.get_stats())
+
+@ai_status_bp.route('/api/ai/cache/clear', methods=['POST'])
+@admin_required
+def clear_cache(current_user):
+    """清空响应缓存和近似提示词缓存（仅管理员）"""
+    response_cache.clear()
+    similarity_cache.clear()
+    return jsonify({'message': '响应缓存已清空'})
+
+@ai_status_bp.route('/api/ai/similarity-cache', methods=['GET'])
+@admin_required
+def get_similarity_cache_stats(current_user):
+    """获取近似提示词缓存的命中统计（仅管理员）"""
+    return jsonify(similarity_cache.get_stats())
+
+@ai_status_bp.route('/api/ai/breakers', methods=['GET'])
+@admin_required
+def get_breaker_stats(current_user):
+    """获取各提供商端点的熔断器状态（仅管理员）"""
+    return jsonify(CircuitBreakerRegistry.get_stats())
+
+@ai_status_bp.route('/api/ai/breakers/reset', methods=['POST'])
+@admin_required
+def reset_breakers(current_user):
+    """手动恢复熔断器（仅管理员），可在请求体中指定provider"""
+    data = request.get_json(silent=True) or {}
+    CircuitBreakerRegistry.reset(data.get('provider'))
+    return jsonify({'message': '熔断器已恢复'})
+
+@ai_status_bp.route('/api/ai/keys', methods=['GET'])
+@admin_required
+def get_key_stats(current_user):
+    """获取各API密钥的在途请求数、请求数、错误数、限流次数、剩余冷却时间和RPM/TPM剩余额度（仅管理员）"""
+    stats = []
+    for record in ApiKey.query.order_by(ApiKey.model_provider, ApiKey.id).all():
+        item = {
+            'id': record.id,
+            'model_provider': record.model_provider,
+            'api_key': record.api_key[:8] + '****' if record.api_key else '',
+            'weight': record.weight or 1,
+            'is_active': record.is_active
+        }
+        item.update(key_pool.get_key_stats(record.api_key))
+        item.update(rate_limiter.get_stats(record.api_key))
+        stats.append(item)
+    return jsonify(stats)
+
+@ai_status_bp.route('/api/ai/keys/reset', methods=['POST'])
+@admin_required
+def reset_key_cooldowns(current_user):
+    """手动结束API密钥的冷却期（仅管理员），可在请求体中指定provider"""
+    data = request.get_json(silent=True) or {}
+    key_pool.reset(data.get('provider'))
+    return jsonify({'message': '密钥冷却已解除'})
\ No newline at end of file
@@ -2,9 +2,14 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime
 from models.models import db, ApiKey
 from utils.auth import admin_required, db_error_handler
+from ai import AIClientFactory
 
 apikeys_bp = Blueprint('apikeys', __name__)
 
+def is_valid_limit(value):
+    """RPM/TPM配额只能为空（不限）或非负整数"""
+    return value is None or (isinstance(value, int) and value >= 0)
+
 @apikeys_bp.route('/api/apikeys', methods=['GET'])
 @admin_required
 @db_error_handler
@@ -17,32 +22,45 @@ def get_api_keys(current_user):
 @admin_required
 @db_error_handler
 def create_api_key(current_user):
-    """创建或更新API密钥"""
+    """创建或更新API密钥，同一提供商可以添加多个密钥分摊请求"""
     data = request.get_json()
     model_provider = data.get('model_provider')
     api_key = data.get('api_key')
     base_url = data.get('base_url', '')
+    weight = data.get('weight', 1)
+    rpm_limit = data.get('rpm_limit')
+    tpm_limit = data.get('tpm_limit')
     
     if not model_provider or not api_key:
         return jsonify({'error': '模型提供商和API密钥不能为空'}), 400
+    if not isinstance(weight, int) or weight < 1:
+        return jsonify({'error': '权重必须是正整数'}), 400
+    if not is_valid_limit(rpm_limit) or not is_valid_limit(tpm_limit):
+        return jsonify({'error': 'RPM/TPM配额必须是非负整数'}), 400
     
-    # 检查是否已存在
-    existing_key = ApiKey.query.filter_by(model_provider=model_provider).first()
+    # 检查该提供商下是否已存在相同的密钥
+    existing_key = ApiKey.query.filter_by(model_provider=model_provider, api_key=api_key).first()
     if existing_key:
         # 更新现有密钥
-        existing_key.api_key = api_key
         existing_key.base_url = base_url
+        existing_key.weight = weight
+        existing_key.rpm_limit = rpm_limit
+        existing_key.tpm_limit = tpm_limit
         existing_key.updated_at = datetime.utcnow()
     else:
-        # 创建新密钥
+        # 创建新密钥，与该提供商已有的密钥一起参与负载均衡
         new_key = ApiKey(
             model_provider=model_provider,
             api_key=api_key,
-            base_url=base_url
+            base_url=base_url,
+            weight=weight,
+            rpm_limit=rpm_limit,
+            tpm_limit=tpm_limit
         )
         db.session.add(new_key)
     
     db.session.commit()
+    AIClientFactory.evict(model_provider)
     return jsonify({'message': 'API密钥保存成功'})
 
 @apikeys_bp.route('/api/apikeys/<int:key_id>', methods=['PUT'])
@@ -59,9 +77,19 @@ def update_api_key(current_user, key_id):
         api_key.base_url = data['base_url']
     if 'is_active' in data:
         api_key.is_active = data['is_active']
+    if 'weight' in data:
+        if not isinstance(data['weight'], int) or data['weight'] < 1:
+            return jsonify({'error': '权重必须是正整数'}), 400
+        api_key.weight = data['weight']
+    for field in ('rpm_limit', 'tpm_limit'):
+        if field in data:
+            if not is_valid_limit(data[field]):
+                return jsonify({'error': 'RPM/TPM配额必须是非负整数'}), 400
+            setattr(api_key, field, data[field])
     
     api_key.updated_at = datetime.utcnow()
     db.session.commit()
+    AIClientFactory.evict(api_key.model_provider)
     
     return jsonify({'message': 'API密钥更新成功'})
 
@@ -73,6 +101,7 @@ def delete_api_key(current_user, key_id):
     api_key = ApiKey.query.get_or_404(key_id)
     db.session.delete(api_key)
     db.session.commit()
+    AIClientFactory.evict(api_key.model_provider)
     
     return jsonify({'message': 'API密钥删除成功'})
 
@@ -85,6 +114,7 @@ def toggle_api_key(current_user, key_id):
     api_key.is_active = not api_key.is_active
     api_key.updated_at = datetime.utcnow()
     db.session.commit()
+    AIClientFactory.evict(api_key.model_provider)
     
     status = '启用' if api_key.is_active else '禁用'
     return jsonify({'message': f'API密钥已{status}'})
\ No newline at end of file
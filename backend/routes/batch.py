@@ -0,0 +1,151 @@
+from flask import Blueprint, request, jsonify, Response, current_app
+import json
+from models.models import db, ApiKey, BatchJob, BatchItem
+from utils.auth import token_required
+from utils.constants import ROLE_ADMIN
+from ai.batch import parse_batch_file, resolve_mode
+from utils.batch_jobs import batch_manager
+from routes.chat import get_model_provider
+
+batch_bp = Blueprint('batch', __name__)
+
+# 导出结果时每次从数据库读取的行数
+RESULT_PAGE_SIZE = 500
+
+def get_batch_job(batch_id, current_user):
+    """获取当前用户可访问的任务，管理员可以访问所有任务"""
+    job = BatchJob.query.filter_by(batch_id=batch_id).first()
+    if job and (job.user_id == current_user.id or current_user.role == ROLE_ADMIN):
+        return job
+    return None
+
+@batch_bp.route('/api/batches', methods=['POST'])
+@token_required
+def create_batch(current_user):
+    """
+    上传JSONL请求文件创建批处理任务
+    
+    multipart/form-data上传时文件字段为file，其余参数为表单字段；
+    也可以直接以请求体上传文件内容，参数放在查询字符串中
+    """
+    upload = request.files.get('file')
+    params = request.form if upload else request.args
+    model = params.get('model')
+    if not model:
+        return jsonify({'error': '缺少必要参数'}), 400
+    data = upload.read() if upload else request.get_data()
+    
+    try:
+        items = parse_batch_file(data)
+        provider = get_model_provider(model)
+        mode = resolve_mode(provider, params.get('mode'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not ApiKey.query.filter_by(model_provider=provider, is_active=True).first():
+        return jsonify({'error': f'请先在API密钥管理中配置 {provider} 平台的API密钥。'}), 400
+    
+    try:
+        job = batch_manager.create(current_user.id, model, provider, items, mode, params.get('concurrency', type=int))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'创建批处理任务失败: {str(e)}'}), 500
+    batch_manager.start(current_app._get_current_object(), job.batch_id)
+    return jsonify(job.to_dict()), 201
+
+@batch_bp.route('/api/batches', methods=['GET'])
+@token_required
+def get_batches(current_user):
+    """获取当前用户的批处理任务列表"""
+    jobs = BatchJob.query.filter_by(user_id=current_user.id).order_by(BatchJob.created_at.desc()).all()
+    return jsonify([job.to_dict() for job in jobs])
+
+@batch_bp.route('/api/batches/<batch_id>', methods=['GET'])
+@token_required
+def get_batch(current_user, batch_id):
+    """获取批处理任务的状态和进度"""
+    job = get_batch_job(batch_id, current_user)
+    if not job:
+        return jsonify({'error': '批处理任务不存在'}), 404
+    return jsonify(job.to_dict())
+
+@batch_bp.route('/api/batches/<batch_id>/pause', methods=['POST'])
+@token_required
+def pause_batch(current_user, batch_id):
+    """暂停批处理任务，进行中的请求完成后停止"""
+    job = get_batch_job(batch_id, current_user)
+    if not job:
+        return jsonify({'error': '批处理任务不存在'}), 404
+    if job.status not in ('pending', 'running'):
+        return jsonify({'error': f'任务状态为{job.status}，无法暂停'}), 400
+    batch_manager.pause(job)
+    return jsonify(job.to_dict())
+
+@batch_bp.route('/api/batches/<batch_id>/resume', methods=['POST'])
+@token_required
+def resume_batch(current_user, batch_id):
+    """
+    从最近的检查点继续执行批处理任务，请求体中retry_failed为true时重新执行失败的请求
+    
+    服务重启后仍显示为running的任务也通过该接口继续执行
+    """
+    job = get_batch_job(batch_id, current_user)
+    if not job:
+        return jsonify({'error': '批处理任务不存在'}), 404
+    data = request.get_json(silent=True) or {}
+    retry_failed = bool(data.get('retry_failed'))
+    if job.status == 'completed' and not retry_failed:
+        return jsonify({'error': '任务已完成'}), 400
+    if not batch_manager.resume(current_app._get_current_object(), job, retry_failed):
+        return jsonify({'error': '任务正在停止，请稍后重试'}), 409
+    return jsonify(job.to_dict())
+
+@batch_bp.route('/api/batches/<batch_id>/cancel', methods=['POST'])
+@token_required
+def cancel_batch(current_user, batch_id):
+    """取消批处理任务，已完成的请求结果保留"""
+    job = get_batch_job(batch_id, current_user)
+    if not job:
+        return jsonify({'error': '批处理任务不存在'}), 404
+    if job.status in ('completed', 'cancelled'):
+        return jsonify({'error': f'任务状态为{job.status}，无法取消'}), 400
+    batch_manager.cancel(job)
+    return jsonify(job.to_dict())
+
+@batch_bp.route('/api/batches/<batch_id>/results', methods=['GET'])
+@token_required
+def get_batch_results(current_user, batch_id):
+    """
+    以JSONL流式返回批处理结果，每行包含custom_id、status、response、error
+    
+    默认返回已完成和失败的请求，查询参数status可指定completed、failed或pending；
+    任务运行中也可以调用，返回已写入检查点的结果
+    """
+    job = get_batch_job(batch_id, current_user)
+    if not job:
+        return jsonify({'error': '批处理任务不存在'}), 404
+    status = request.args.get('status')
+    app = current_app._get_current_object()
+    
+    def generate_results():
+        with app.app_context():
+            query = BatchItem.query.filter(BatchItem.batch_id == batch_id)
+            if status:
+                query = query.filter(BatchItem.status == status)
+            else:
+                query = query.filter(BatchItem.status != 'pending')
+            # 按ID分页读取，结果文件再大也不会一次载入内存
+            last_id = 0
+            while True:
+                items = query.filter(BatchItem.id > last_id).order_by(BatchItem.id).limit(RESULT_PAGE_SIZE).all()
+                if not items:
+                    break
+                for item in items:
+                    yield json.dumps(item.to_result(), ensure_ascii=False) + '\n'
+                last_id = items[-1].id
+                db.session.expunge_all()
+    
+    return Response(
+        generate_results(),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename=batch-{batch_id}.jsonl'}
+    )
\ No newline at end of file
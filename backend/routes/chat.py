@@ -1,21 +1,36 @@
 from flask import Blueprint, request, jsonify, Response, current_app
 import uuid
 import json
+import time
 from datetime import datetime
-from models.models import db, Conversation, Message, ApiKey, Model
+from models.models import db, User, Conversation, Message, ApiKey, Model
+from models.config import Config
 from utils.auth import token_required
-from ai import AIClient
+from ai import AIClientFactory
+from ai.fanout import FanOutStream
+from ai.hedging import HedgedStream, ttft_tracker
+from ai.key_pool import key_pool
+from ai.response_cache import CachedStream
+from ai.rate_limiter import rate_limiter
+from ai.singleflight import make_key, singleflight
+from ai.timeouts import PhaseTimeoutError
 from utils.constants import DEFAULT_API_PROVIDER
 
 chat_bp = Blueprint('chat', __name__)
 
 def get_active_api_key(provider=DEFAULT_API_PROVIDER):
-    """获取活跃的API密钥"""
-    return ApiKey.query.filter_by(model_provider=provider, is_active=True).first()
+    """获取活跃的API密钥，提供商配置了多个密钥时由密钥池按负载选择"""
+    api_keys = ApiKey.query.filter_by(model_provider=provider, is_active=True).all()
+    api_key_record = key_pool.select(provider, api_keys)
+    if api_key_record:
+        # 刷新限流器中的配额，对冲请求的后台线程无法查询数据库
+        rate_limiter.set_limits(api_key_record.api_key, api_key_record.rpm_limit, api_key_record.tpm_limit)
+    return api_key_record
 
 def get_model_provider(model_name):
     """根据模型名称获取提供商"""
-    model = Model.query.filter_by(model_name=model_name, is_active=True).first()
+    # 同一模型配置在多个提供商下时，按排序取第一个作为主提供商
+    model = Model.query.filter_by(model_name=model_name, is_active=True).order_by(Model.sort_order, Model.id).first()
     if model:
         return model.model_provider
     # 如果数据库中没有找到，尝试根据模型名称推断
@@ -32,6 +47,107 @@ def get_model_provider(model_name):
     else:
         return 'siliconflow'  # 默认使用 siliconflow
 
+def get_generation_params(data):
+    """从请求体中提取生成参数，temperature为0或指定了seed的请求会使用响应缓存"""
+    extra_params = {}
+    if 'stop' in data and data['stop']:
+        extra_params['stop'] = data['stop']
+    for name in ('temperature', 'seed'):
+        if data.get(name) is not None:
+            extra_params[name] = data[name]
+    max_tokens = data.get('max_tokens')
+    if isinstance(max_tokens, int) and not isinstance(max_tokens, bool) and max_tokens > 0:
+        extra_params['max_tokens'] = max_tokens
+    return extra_params
+
+def clamp_max_tokens(model_name, provider, extra_params):
+    """请求指定的max_tokens超过模型管理中设置的最大token数时按模型设置截断"""
+    max_tokens = extra_params.get('max_tokens')
+    if max_tokens is None:
+        return extra_params
+    model = Model.query.filter_by(model_name=model_name, model_provider=provider, is_active=True).first()
+    if model and model.max_tokens and max_tokens > model.max_tokens:
+        return dict(extra_params, max_tokens=model.max_tokens)
+    return extra_params
+
+def use_similarity_cache(model_name, provider):
+    """模型是否在模型管理中开启了近似提示词缓存"""
+    model = Model.query.filter_by(model_name=model_name, model_provider=provider, is_active=True).first()
+    return bool(model and model.similarity_cache)
+
+def get_alternate_clients(model_name, primary_provider):
+    """获取同样提供该模型的备用提供商（已配置活跃API密钥），用于对冲请求和熔断时切换"""
+    candidates = []
+    models = Model.query.filter(
+        Model.model_name == model_name,
+        Model.model_provider != primary_provider,
+        Model.is_active == True
+    ).order_by(Model.sort_order, Model.id).all()
+    for item in models:
+        api_key_record = get_active_api_key(item.model_provider)
+        if api_key_record and api_key_record.api_key:
+            client = AIClientFactory.get_client(item.model_provider, api_key_record.api_key, api_key_record.base_url)
+            candidates.append((item.model_provider, item.model_name, client))
+    return candidates
+
+def select_available_client(model_name, provider, api_key_record):
+    """
+    获取主提供商的客户端；主提供商熔断时切换到未熔断的备用提供商
+    
+    Returns:
+        (提供商名称, 客户端)
+    """
+    client = AIClientFactory.get_client(provider, api_key_record.api_key, api_key_record.base_url)
+    if client.circuit_breaker.available():
+        return provider, client
+    for alternate_provider, _, alternate_client in get_alternate_clients(model_name, provider):
+        if alternate_client.circuit_breaker.available():
+            print(f"{provider} 已熔断，{model_name} 切换到 {alternate_provider}")
+            return alternate_provider, alternate_client
+    # 没有可用的备用提供商时仍使用主提供商，由熔断器直接返回错误
+    return provider, client
+
+def call_model(model_name, provider, api_key_record, message, **kwargs):
+    """选择可用的客户端发起同步调用，调用期间计入所用密钥的在途请求数"""
+    provider, client = select_available_client(model_name, provider, api_key_record)
+    with key_pool.lease(client.api_key):
+        return client.call_api(model_name, message, **kwargs)
+
+def open_model_stream(model_name, provider, api_key_record, message, hedge=False, **kwargs):
+    """
+    发起流式调用，从发起请求到流结束都计入所用密钥的在途请求数，供密钥池均衡负载
+    
+    Returns:
+        产出StreamDelta的迭代器，失败时返回None
+    
+    Raises:
+        PhaseTimeoutError: 连接或首token超时；迭代过程中超时时由迭代器抛出
+    """
+    # 开启对冲时，主提供商首个token迟迟未到则向备用提供商再发一次请求
+    # 主提供商熔断时会立即失败，由对冲请求或备用提供商接管
+    hedge_candidates = get_alternate_clients(model_name, provider) if hedge else []
+    if hedge_candidates:
+        primary = AIClientFactory.get_client(provider, api_key_record.api_key, api_key_record.base_url)
+        # 各请求发出时分别计入所用密钥的在途请求数
+        return HedgedStream([(provider, model_name, primary)] + hedge_candidates, message, **kwargs)
+    
+    # 获取流式响应，并记录首token耗时供对冲请求计算等待时间
+    provider, client = select_available_client(model_name, provider, api_key_record)
+    started = time.monotonic()
+    key_pool.acquire(client.api_key)
+    try:
+        stream_response = client.call_api(model_name, message, stream=True, **kwargs)
+    except Exception:
+        # 连接或首token超时时抛出异常，同样需要归还在途计数
+        key_pool.release(client.api_key)
+        raise
+    if not stream_response or isinstance(stream_response, CachedStream):
+        # 命中响应缓存时没有发出请求，也不计入首token耗时
+        key_pool.release(client.api_key)
+        return stream_response
+    stream_response = ttft_tracker.track(stream_response, provider, model_name, started)
+    return key_pool.track(stream_response, client.api_key)
+
 @chat_bp.route('/api/chat', methods=['POST'])
 @token_required
 def chat(current_user):
@@ -48,6 +164,7 @@ def chat(current_user):
     if not conversation_id:
         conversation_id = str(uuid.uuid4())
     user_id = current_user.id
+    coalesce = bool(data.get('coalesce', Config.AI_SINGLEFLIGHT_ENABLED))
     
     try:
         # 查找或创建对话
@@ -68,6 +185,8 @@ def chat(current_user):
             content=message
         )
         db.session.add(user_message)
+        # 先提交，避免等待模型响应期间一直占用SQLite写锁，使并发请求排队
+        db.session.commit()
         
         # 统一的模型API调用逻辑
         # 根据模型获取对应的提供商
@@ -75,12 +194,24 @@ def chat(current_user):
         api_key_record = get_active_api_key(provider)
         
         if api_key_record and api_key_record.api_key:
-            # 提取额外参数，包括stop参数
-            extra_params = {}
-            if 'stop' in data and data['stop']:
-                extra_params['stop'] = data['stop']
+            # 提取额外参数，包括stop、temperature、seed、max_tokens参数
+            extra_params = clamp_max_tokens(model, provider, get_generation_params(data))
+            similarity = use_similarity_cache(model, provider)
+            # 超时设置不影响生成结果，不计入合并键
+            timeouts = Model.get_timeouts(model, provider)
             
-            ai_response = AIClient.call_ai_api(provider, model, message, api_key_record, **extra_params)
+            try:
+                # 开启请求合并时，进行中的相同请求共享同一次上游调用，token用量只计入发起调用的请求
+                if coalesce:
+                    ai_response = singleflight.do(
+                        make_key(provider, model, message, extra_params),
+                        lambda: call_model(model, provider, api_key_record, message, similarity=similarity, **extra_params, **timeouts),
+                        shared=str
+                    )
+                else:
+                    ai_response = call_model(model, provider, api_key_record, message, similarity=similarity, **extra_params, **timeouts)
+            except Exception as e:
+                ai_response = f"抱歉，调用{provider} AI API时发生错误: {str(e)}"
         else:
             ai_response = f"请先在API密钥管理中配置 {provider} 平台的API密钥。"
         
@@ -89,9 +220,15 @@ def chat(current_user):
             conversation_id=conversation_id,
             role='assistant',
             content=ai_response,
-            reasoning=None
+            reasoning=None,
+            model=model
         )
+        # 记录提供商报告的token用量，错误信息和缓存命中的回复没有用量
+        ai_message.set_usage(getattr(ai_response, 'usage', None))
         db.session.add(ai_message)
+        User.add_usage(user_id, ai_message.total_tokens)
+        # 返回与历史消息相同格式的用量，提交后属性会过期，先取出
+        usage = ai_message.usage
         
         # 更新对话时间
         conversation.updated_at = datetime.utcnow()
@@ -102,9 +239,10 @@ def chat(current_user):
             'conversation_id': conversation_id,
             'response': ai_response,
             'model': model,
+            'usage': usage,
             'timestamp': to_beijing_iso(datetime.utcnow())
         })
-        
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'处理请求时发生错误: {str(e)}'}), 500
@@ -125,6 +263,8 @@ def chat_stream(current_user):
     if not conversation_id:
         conversation_id = str(uuid.uuid4())
     user_id = current_user.id
+    hedge = bool(data.get('hedge', Config.AI_HEDGING_ENABLED))
+    coalesce = bool(data.get('coalesce', Config.AI_SINGLEFLIGHT_ENABLED))
     
     # 在路由函数中获取应用实例
     app = current_app._get_current_object()
@@ -160,32 +300,41 @@ def chat_stream(current_user):
                 api_key_record = get_active_api_key(provider)
                 
                 if api_key_record and api_key_record.api_key:
-                    # 提取额外参数，包括stop参数
-                    extra_params = {}
-                    if 'stop' in data and data['stop']:
-                        extra_params['stop'] = data['stop']
+                    # 提取额外参数，包括stop、temperature、seed、max_tokens参数
+                    extra_params = clamp_max_tokens(model, provider, get_generation_params(data))
+                    similarity = use_similarity_cache(model, provider)
+                    # 超时设置不影响生成结果，不计入合并键
+                    timeouts = Model.get_timeouts(model, provider)
                     
-                    # 获取流式响应
-                    stream_response = AIClient.call_ai_api(provider, model, message, api_key_record, stream=True, **extra_params)
+                    # 开启请求合并时，进行中的相同请求订阅同一个上游流式响应
+                    if coalesce:
+                        stream_response = singleflight.stream(
+                            make_key(provider, model, message, extra_params),
+                            lambda: open_model_stream(model, provider, api_key_record, message, hedge, similarity=similarity, **extra_params, **timeouts)
+                        )
+                    else:
+                        stream_response = open_model_stream(model, provider, api_key_record, message, hedge, similarity=similarity, **extra_params, **timeouts)
                     
                     if stream_response:
                         complete_response = ""
                         complete_reasoning = ""
+                        usage = {}
                         
                         # 逐步接收并处理响应
                         for chunk in stream_response:
-                            if not chunk.choices:
-                                continue
+                            # 部分提供商分多次返回用量（如Anthropic的输入和输出），按键合并
+                            if chunk.usage:
+                                usage.update(chunk.usage)
                             
-                            # 处理普通内容 - delta.content
-                            if chunk.choices[0].delta.content:
-                                content = chunk.choices[0].delta.content
-                                complete_response += content
-                                yield f"data: {json.dumps({'type': 'content', 'content': content})}\n\n"
+                            # 推理模型在输出正文前可能思考很久，推理过程单独作为reasoning事件实时推送
+                            if chunk.reasoning:
+                                complete_reasoning += chunk.reasoning
+                                yield f"data: {json.dumps({'type': 'reasoning', 'content': chunk.reasoning})}\n\n"
                             
-                            # 注意：OpenAI API 的 ChoiceDelta 对象没有 reasoning_content 属性
-                            # 如果需要推理功能，需要使用支持推理的模型（如 o1 系列）
-                            # 并检查相应的属性名称
+                            # 所有提供商统一产出StreamDelta，处理普通内容
+                            if chunk.content:
+                                complete_response += chunk.content
+                                yield f"data: {json.dumps({'type': 'content', 'content': chunk.content})}\n\n"
                         
                         # 在新的应用上下文中保存数据
                         with app.app_context():
@@ -194,9 +343,14 @@ def chat_stream(current_user):
                                 conversation_id=conversation_id,
                                 role='assistant',
                                 content=complete_response,
-                                reasoning=complete_reasoning if complete_reasoning else None
+                                reasoning=complete_reasoning if complete_reasoning else None,
+                                model=model
                             )
+                            ai_message.set_usage(usage)
                             db.session.add(ai_message)
+                            User.add_usage(user_id, ai_message.total_tokens)
+                            # 结束事件返回与历史消息相同格式的用量，提交后属性会过期，先取出
+                            usage = ai_message.usage
                             
                             # 更新对话时间
                             conversation = Conversation.query.filter_by(conversation_id=conversation_id).first()
@@ -204,21 +358,24 @@ def chat_stream(current_user):
                                 conversation.updated_at = datetime.utcnow()
                             db.session.commit()
                         
-                        yield f"data: {json.dumps({'type': 'end', 'complete_response': complete_response, 'complete_reasoning': complete_reasoning})}\n\n"
+                        yield f"data: {json.dumps({'type': 'end', 'complete_response': complete_response, 'complete_reasoning': complete_reasoning, 'usage': usage})}\n\n"
                     else:
                         error_msg = "流式API调用失败"
                         yield f"data: {json.dumps({'type': 'error', 'content': error_msg})}\n\n"
                 else:
                     error_msg = f"请先在API密钥管理中配置 {provider} 平台的API密钥。"
                     yield f"data: {json.dumps({'type': 'error', 'content': error_msg})}\n\n"
-                    
+            
+            except PhaseTimeoutError as e:
+                # code区分连接超时、首token超时和响应中断，前端可以分别提示或自动重试
+                yield f"data: {json.dumps({'type': 'error', 'code': e.code, 'content': str(e)})}\n\n"
             except Exception as e:
                 try:
                     with app.app_context():
                         db.session.rollback()
                 except:
                     pass  # 忽略rollback错误
-                yield f"data: {json.dumps({'type': 'error', 'content': f'处理请求时发生错误: {str(e)}'})}.\n\n"
+                yield f"data: {json.dumps({'type': 'error', 'content': f'处理请求时发生错误: {str(e)}'})}\n\n"
     
     return Response(
         generate_stream(),
@@ -230,3 +387,155 @@ def chat_stream(current_user):
             'Access-Control-Allow-Headers': 'Content-Type,Authorization'
         }
     )
+
+@chat_bp.route('/api/chat/compare', methods=['POST'])
+@token_required
+def chat_compare(current_user):
+    """
+    多模型对比：同一条消息并发发给多个模型，通过一个SSE流返回各模型的回复
+    
+    每个事件的model字段标明所属模型，总耗时取决于最慢的模型而不是各模型耗时之和；
+    所有回复保存在同一个对话中，消息的model字段区分各模型
+    """
+    data = request.get_json()
+    
+    # 验证请求数据
+    if not data or 'message' not in data or not isinstance(data.get('models'), list) or not data['models']:
+        return jsonify({'error': '缺少必要参数'}), 400
+    
+    message = data['message']
+    # 去掉重复的模型，保持请求中的顺序
+    models = list(dict.fromkeys(str(model) for model in data['models'] if model))
+    if len(models) > Config.AI_COMPARE_MAX_MODELS:
+        return jsonify({'error': f'最多同时对比 {Config.AI_COMPARE_MAX_MODELS} 个模型'}), 400
+    conversation_id = data.get('conversation_id')
+    if not conversation_id:
+        conversation_id = str(uuid.uuid4())
+    user_id = current_user.id
+    hedge = bool(data.get('hedge', Config.AI_HEDGING_ENABLED))
+    
+    # 在路由函数中获取应用实例
+    app = current_app._get_current_object()
+    
+    def make_opener(model, provider, api_key_record, extra_params):
+        """在后台线程中发起流式调用，熔断时查询备用提供商需要应用上下文"""
+        similarity = use_similarity_cache(model, provider)
+        timeouts = Model.get_timeouts(model, provider)
+        extra_params = clamp_max_tokens(model, provider, extra_params)
+        
+        def open_stream():
+            with app.app_context():
+                return open_model_stream(model, provider, api_key_record, message, hedge, similarity=similarity, **extra_params, **timeouts)
+        return open_stream
+    
+    def generate_stream():
+        with app.app_context():
+            try:
+                # 查找或创建对话
+                conversation = Conversation.query.filter_by(conversation_id=conversation_id).first()
+                if not conversation:
+                    conversation = Conversation(
+                        user_id=user_id,
+                        conversation_id=conversation_id,
+                        model=models[0],
+                        title=message[:50] + '...' if len(message) > 50 else message
+                    )
+                    db.session.add(conversation)
+                
+                # 保存用户消息
+                user_message = Message(
+                    conversation_id=conversation_id,
+                    role='user',
+                    content=message
+                )
+                db.session.add(user_message)
+                db.session.commit()
+                
+                # 发送初始响应
+                yield f"data: {json.dumps({'type': 'start', 'conversation_id': conversation_id, 'models': models})}\n\n"
+                
+                # 提取额外参数，包括stop、temperature、seed、max_tokens参数
+                extra_params = get_generation_params(data)
+                started_models = []
+                openers = []
+                for model in models:
+                    provider = get_model_provider(model)
+                    api_key_record = get_active_api_key(provider)
+                    if api_key_record and api_key_record.api_key:
+                        started_models.append(model)
+                        openers.append(make_opener(model, provider, api_key_record, extra_params))
+                    else:
+                        error_msg = f"请先在API密钥管理中配置 {provider} 平台的API密钥。"
+                        yield f"data: {json.dumps({'type': 'error', 'model': model, 'content': error_msg})}\n\n"
+                
+                # 各模型并发调用，增量按到达顺序推送
+                started = time.monotonic()
+                complete_responses = {model: "" for model in started_models}
+                complete_reasonings = {model: "" for model in started_models}
+                usages = {model: {} for model in started_models}
+                ai_messages = {}
+                
+                def new_message(model):
+                    """用模型已收到的回复和用量构造AI消息，推理过程和结果分别存储"""
+                    ai_message = Message(
+                        conversation_id=conversation_id,
+                        role='assistant',
+                        content=complete_responses[model],
+                        reasoning=complete_reasonings[model] or None,
+                        model=model
+                    )
+                    ai_message.set_usage(usages[model])
+                    return ai_message
+                
+                for index, kind, payload in FanOutStream(openers):
+                    model = started_models[index]
+                    if kind == 'delta':
+                        if payload.usage:
+                            usages[model].update(payload.usage)
+                        if payload.reasoning:
+                            complete_reasonings[model] += payload.reasoning
+                            yield f"data: {json.dumps({'type': 'reasoning', 'model': model, 'content': payload.reasoning})}\n\n"
+                        if payload.content:
+                            complete_responses[model] += payload.content
+                            yield f"data: {json.dumps({'type': 'content', 'model': model, 'content': payload.content})}\n\n"
+                    elif isinstance(payload, PhaseTimeoutError):
+                        yield f"data: {json.dumps({'type': 'error', 'model': model, 'code': payload.code, 'content': str(payload)})}\n\n"
+                    elif payload:
+                        yield f"data: {json.dumps({'type': 'error', 'model': model, 'content': payload})}\n\n"
+                    else:
+                        # 结束事件返回与历史消息相同格式的用量
+                        ai_messages[model] = new_message(model)
+                        yield f"data: {json.dumps({'type': 'end', 'model': model, 'complete_response': complete_responses[model], 'complete_reasoning': complete_reasonings[model], 'usage': ai_messages[model].usage, 'elapsed': round(time.monotonic() - started, 3)})}\n\n"
+                
+                # 保存各模型的回复，出错中断的模型也保存已收到的部分
+                for model in started_models:
+                    if complete_responses[model] or complete_reasonings[model]:
+                        ai_message = ai_messages.get(model) or new_message(model)
+                        db.session.add(ai_message)
+                        User.add_usage(user_id, ai_message.total_tokens)
+                
+                # 更新对话时间
+                conversation = Conversation.query.filter_by(conversation_id=conversation_id).first()
+                if conversation:
+                    conversation.updated_at = datetime.utcnow()
+                db.session.commit()
+                
+                yield f"data: {json.dumps({'type': 'done', 'conversation_id': conversation_id})}\n\n"
+            
+            except Exception as e:
+                try:
+                    db.session.rollback()
+                except:
+                    pass  # 忽略rollback错误
+                yield f"data: {json.dumps({'type': 'error', 'content': f'处理请求时发生错误: {str(e)}'})}\n\n"
+    
+    return Response(
+        generate_stream(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type,Authorization'
+        }
+    )
\ No newline at end of file
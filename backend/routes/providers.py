@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify
-from models.models import db, Provider
+from models.models import db, Provider, parse_timeouts
 from utils.auth import token_required
 from sqlalchemy.exc import IntegrityError
+from ai import AIClientFactory
 
 providers_bp = Blueprint('providers', __name__)
 
@@ -52,17 +53,27 @@ def create_provider(current_user):
                 'message': f'提供商标识 {data["provider_key"]} 已存在'
             }), 400
         
+        try:
+            timeouts = parse_timeouts(data)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        
         # 创建新提供商
         provider = Provider(
             provider_key=data['provider_key'],
             display_name=data['display_name'],
             default_base_url=data['default_base_url'],
             is_active=data.get('is_active', True),
-            sort_order=data.get('sort_order', 0)
+            sort_order=data.get('sort_order', 0),
+            **timeouts
         )
         
         db.session.add(provider)
         db.session.commit()
+        AIClientFactory.evict(provider.provider_key)
         
         return jsonify({
             'success': True,
@@ -103,6 +114,15 @@ def update_provider(current_user, provider_id):
             }), 404
         
         data = request.get_json()
+        old_provider_key = provider.provider_key
+        
+        try:
+            timeouts = parse_timeouts(data)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
         
         # 更新字段
         if 'display_name' in data:
@@ -113,6 +133,8 @@ def update_provider(current_user, provider_id):
             provider.is_active = data['is_active']
         if 'sort_order' in data:
             provider.sort_order = data['sort_order']
+        for field, value in timeouts.items():
+            setattr(provider, field, value)
         
         # 检查provider_key是否重复（如果要更新的话）
         if 'provider_key' in data and data['provider_key'] != provider.provider_key:
@@ -125,6 +147,8 @@ def update_provider(current_user, provider_id):
             provider.provider_key = data['provider_key']
         
         db.session.commit()
+        AIClientFactory.evict(old_provider_key)
+        AIClientFactory.evict(provider.provider_key)
         
         return jsonify({
             'success': True,
@@ -167,6 +191,7 @@ def delete_provider(current_user, provider_id):
         # 软删除：设置为不活跃状态
         provider.is_active = False
         db.session.commit()
+        AIClientFactory.evict(provider.provider_key)
         
         return jsonify({
             'success': True,
@@ -36,6 +36,7 @@ setup(
         "Werkzeug==3.0.1",
         "openai==1.99.5",
         "requests==2.31.0",
+        "httpx==0.28.1",
         "PyJWT==2.8.0",
     ],
     extras_require={
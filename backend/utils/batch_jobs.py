@@ -0,0 +1,371 @@
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from models.config import Config
+from models.models import db, ApiKey, BatchItem, BatchJob
+from ai.batch import NATIVE, NATIVE_FINAL_STATUSES, BatchKey, execute_request
+from ai.factory import AIClientFactory
+from ai.rate_limiter import rate_limiter
+
+class _JobControl:
+    """运行中任务的停止信号，用于中断工作线程的等待"""
+    
+    __slots__ = ('event',)
+    
+    def __init__(self):
+        self.event = threading.Event()
+
+class BatchManager:
+    """
+    批处理任务执行器
+    
+    每个运行中的任务由一个后台线程协调。本地模式按任务的并发数把待处理请求分发给有界工作线程池，
+    每次只从数据库预取两倍并发数的请求；请求与聊天接口一样经过密钥池、RPM/TPM限流、熔断和重试，
+    额度不足或熔断时等待恢复后重试，不计为失败。原生模式把请求上传到提供商的批处理接口，
+    定期查询状态，完成后导入结果文件。
+    
+    结果按检查点批量写入数据库，暂停、取消或进程退出后恢复时只执行尚未完成的请求，
+    最近一个检查点之后完成的请求会重新执行。暂停和取消通过数据库中的任务状态传达，
+    其他worker中运行的任务在下一个检查点停止。
+    """
+    
+    def __init__(self):
+        self._jobs: Dict[str, _JobControl] = {}
+        self._lock = threading.Lock()
+    
+    def create(self, user_id: int, model: str, provider: str, items: List[dict], mode: str,
+               concurrency: Optional[int] = None) -> BatchJob:
+        """
+        保存任务及其请求
+        
+        Args:
+            user_id: 用户ID
+            model: 模型名称
+            provider: 提供商名称
+            items: parse_batch_file解析出的请求
+            mode: native或local
+            concurrency: 本地执行时的并发数，为空时取配置，不超过AI_BATCH_MAX_CONCURRENCY
+        
+        Returns:
+            新建的任务
+        """
+        concurrency = min(max(int(concurrency or Config.AI_BATCH_CONCURRENCY), 1), Config.AI_BATCH_MAX_CONCURRENCY)
+        job = BatchJob(
+            batch_id=str(uuid.uuid4()),
+            user_id=user_id,
+            model=model,
+            model_provider=provider,
+            mode=mode,
+            status='pending',
+            concurrency=concurrency,
+            total_count=len(items)
+        )
+        db.session.add(job)
+        db.session.bulk_insert_mappings(BatchItem, [{
+            'batch_id': job.batch_id,
+            'custom_id': item['custom_id'],
+            'message': item['message'],
+            'params': json.dumps(item['params'], ensure_ascii=False) if item['params'] else None,
+            'status': 'pending'
+        } for item in items])
+        db.session.commit()
+        return job
+    
+    def start(self, app, batch_id: str) -> bool:
+        """
+        在后台线程中执行任务
+        
+        Args:
+            app: Flask应用实例
+            batch_id: 任务ID
+        
+        Returns:
+            是否已启动，任务已在当前进程中运行时返回False
+        """
+        with self._lock:
+            if batch_id in self._jobs:
+                return False
+            control = self._jobs[batch_id] = _JobControl()
+        threading.Thread(target=self._run, args=(app, batch_id, control),
+                         name=f"batch-{batch_id[:8]}", daemon=True).start()
+        return True
+    
+    def is_running(self, batch_id: str) -> bool:
+        """任务是否正在当前进程中运行"""
+        with self._lock:
+            return batch_id in self._jobs
+    
+    def pause(self, job: BatchJob):
+        """
+        暂停任务：不再分发新的请求，进行中的请求完成后写入结果；原生批处理在提供商侧继续执行
+        
+        Args:
+            job: 任务
+        """
+        job.status = 'paused'
+        db.session.commit()
+        self._signal(job.batch_id)
+    
+    def cancel(self, job: BatchJob):
+        """
+        取消任务，原生批处理同时取消提供商侧的批处理
+        
+        Args:
+            job: 任务
+        """
+        if job.mode == NATIVE and job.provider_batch_id and job.provider_status not in NATIVE_FINAL_STATUSES:
+            try:
+                batch = self._get_native_client(job.model_provider).cancel_batch(job.provider_batch_id)
+                job.provider_status = batch.get('status')
+            except Exception as e:
+                print(f"取消提供商批处理 {job.provider_batch_id} 失败: {e}")
+        job.status = 'cancelled'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        self._signal(job.batch_id)
+    
+    def resume(self, app, job: BatchJob, retry_failed: bool = False) -> bool:
+        """
+        从最近的检查点继续执行任务
+        
+        Args:
+            app: Flask应用实例
+            job: 任务
+            retry_failed: 是否重新执行失败的请求
+        
+        Returns:
+            是否已启动，任务仍在当前进程中运行（如暂停后尚未停止）时返回False
+        """
+        if self.is_running(job.batch_id):
+            return False
+        if retry_failed:
+            reset = BatchItem.query.filter_by(batch_id=job.batch_id, status='failed').update(
+                {'status': 'pending', 'response': None, 'error': None, 'completed_at': None},
+                synchronize_session=False
+            )
+            job.failed_count = max((job.failed_count or 0) - reset, 0)
+        # 已结束的提供商批处理不能继续，剩余请求重新提交
+        if job.provider_status in NATIVE_FINAL_STATUSES:
+            job.provider_batch_id = None
+            job.provider_status = None
+        job.status = 'pending'
+        job.error = None
+        job.finished_at = None
+        db.session.commit()
+        return self.start(app, job.batch_id)
+    
+    def _signal(self, batch_id: str):
+        """通知当前进程中运行的任务停止等待"""
+        with self._lock:
+            control = self._jobs.get(batch_id)
+        if control is not None:
+            control.event.set()
+    
+    def _run(self, app, batch_id: str, control: _JobControl):
+        """后台线程入口：执行任务并记录最终状态"""
+        try:
+            with app.app_context():
+                job = BatchJob.query.filter_by(batch_id=batch_id).first()
+                if job is None or job.status != 'pending':
+                    return
+                job.status = 'running'
+                db.session.commit()
+                try:
+                    if job.mode == NATIVE:
+                        status, error = self._run_native(job, control)
+                    else:
+                        status, error = self._run_local(job, control), None
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"批处理任务 {batch_id} 执行失败: {e}")
+                    status, error = 'failed', str(e)
+                # 任务已被暂停或取消时保留该状态
+                if status is not None:
+                    BatchJob.query.filter_by(id=job.id, status='running').update(
+                        {'status': status, 'error': error, 'finished_at': datetime.utcnow()},
+                        synchronize_session=False
+                    )
+                    db.session.commit()
+        finally:
+            with self._lock:
+                self._jobs.pop(batch_id, None)
+    
+    def _run_local(self, job: BatchJob, control: _JobControl) -> Optional[str]:
+        """
+        用有界工作线程池执行待处理的请求
+        
+        Returns:
+            completed；任务被暂停或取消时返回None
+        """
+        batch_id, provider, model = job.batch_id, job.model_provider, job.model
+        keys = self._load_keys(provider)
+        concurrency = job.concurrency or Config.AI_BATCH_CONCURRENCY
+        futures = {}
+        results = []
+        last_id = 0
+        exhausted = stopped = False
+        last_checkpoint = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"batch-{batch_id[:8]}") as executor:
+            while True:
+                # 预取的请求不超过两倍并发数，工作线程空闲时立即有请求可执行，内存占用与任务大小无关
+                if not stopped and not exhausted and len(futures) < concurrency * 2:
+                    limit = concurrency * 2 - len(futures)
+                    items = BatchItem.query.filter(
+                        BatchItem.batch_id == batch_id,
+                        BatchItem.status == 'pending',
+                        BatchItem.id > last_id
+                    ).order_by(BatchItem.id).limit(limit).all()
+                    exhausted = len(items) < limit
+                    for item in items:
+                        params = json.loads(item.params) if item.params else {}
+                        future = executor.submit(execute_request, provider, model, keys, item.message, params, control.event)
+                        futures[future] = item.id
+                        last_id = item.id
+                if not futures:
+                    break
+                
+                done, _ = wait(futures, timeout=Config.AI_BATCH_CHECKPOINT_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item_id = futures.pop(future)
+                    outcome = future.result()
+                    if outcome is not None:
+                        results.append((item_id,) + outcome)
+                
+                if (len(results) >= Config.AI_BATCH_CHECKPOINT_SIZE
+                        or time.monotonic() - last_checkpoint >= Config.AI_BATCH_CHECKPOINT_INTERVAL):
+                    self._checkpoint(job.id, batch_id, results)
+                    results = []
+                    last_checkpoint = time.monotonic()
+                    if not stopped and (control.event.is_set() or self._get_status(job.id) != 'running'):
+                        # 尚未开始的请求保持待处理，进行中的请求完成后写入结果
+                        stopped = True
+                        control.event.set()
+                        for future in list(futures):
+                            if future.cancel():
+                                del futures[future]
+        self._checkpoint(job.id, batch_id, results)
+        return None if stopped else 'completed'
+    
+    def _run_native(self, job: BatchJob, control: _JobControl) -> Tuple[Optional[str], Optional[str]]:
+        """
+        提交到提供商批处理接口，等待完成后导入结果
+        
+        Returns:
+            (最终状态, 错误信息)；任务被暂停或取消时状态为None
+        """
+        client = self._get_native_client(job.model_provider)
+        if not job.provider_batch_id:
+            items = BatchItem.query.filter_by(batch_id=job.batch_id, status='pending').order_by(BatchItem.id).all()
+            if not items:
+                return 'completed', None
+            # custom_id使用请求的数据库ID，导入结果时直接定位
+            batch = client.create_batch(job.model, [
+                (str(item.id), item.message, json.loads(item.params) if item.params else {}) for item in items
+            ])
+            job.provider_batch_id = batch['id']
+            job.provider_status = batch.get('status')
+            db.session.commit()
+            # 提交期间任务被取消时，取消操作还不知道提供商批处理ID
+            if self._get_status(job.id) == 'cancelled':
+                client.cancel_batch(job.provider_batch_id)
+                return None, None
+        
+        while True:
+            batch = client.retrieve_batch(job.provider_batch_id)
+            if batch.get('status') != job.provider_status:
+                job.provider_status = batch.get('status')
+                db.session.commit()
+            if job.provider_status in NATIVE_FINAL_STATUSES:
+                break
+            if control.event.wait(Config.AI_BATCH_POLL_INTERVAL) or self._get_status(job.id) != 'running':
+                return None, None
+        
+        results = []
+        for file_id in (batch.get('output_file_id'), batch.get('error_file_id')):
+            if not file_id:
+                continue
+            for custom_id, content, error in client.iter_batch_results(file_id):
+                if not custom_id.isdigit():
+                    continue
+                if error is None and not content:
+                    error = "模型没有返回有效响应"
+                results.append((int(custom_id), 'completed' if error is None else 'failed', content, error))
+                if len(results) >= Config.AI_BATCH_CHECKPOINT_SIZE:
+                    self._checkpoint(job.id, job.batch_id, results)
+                    results = []
+        self._checkpoint(job.id, job.batch_id, results)
+        
+        if job.provider_status != 'completed':
+            # 未返回结果的请求保持待处理，恢复任务时重新提交
+            return 'failed', f"提供商批处理状态为{job.provider_status}"
+        missing = BatchItem.query.filter_by(batch_id=job.batch_id, status='pending').update(
+            {'status': 'failed', 'error': "提供商没有返回结果", 'completed_at': datetime.utcnow()},
+            synchronize_session=False
+        )
+        if missing:
+            BatchJob.query.filter_by(id=job.id).update(
+                {'failed_count': BatchJob.failed_count + missing}, synchronize_session=False
+            )
+        db.session.commit()
+        return 'completed', None
+    
+    def _checkpoint(self, job_id: int, batch_id: str, results: List[Tuple[int, str, Optional[str], Optional[str]]]):
+        """
+        写入一批请求结果并更新任务计数，只更新仍处于待处理状态的请求，重复导入不会重复计数
+        
+        Args:
+            job_id: 任务的数据库ID
+            batch_id: 任务ID
+            results: [(请求ID, 状态, 回复内容, 错误信息)]
+        """
+        if not results:
+            return
+        now = datetime.utcnow()
+        counts = {'completed': 0, 'failed': 0}
+        for item_id, status, response, error in results:
+            updated = BatchItem.query.filter_by(id=item_id, batch_id=batch_id, status='pending').update(
+                {'status': status, 'response': response, 'error': error, 'completed_at': now},
+                synchronize_session=False
+            )
+            counts[status] += updated
+        BatchJob.query.filter_by(id=job_id).update({
+            'completed_count': BatchJob.completed_count + counts['completed'],
+            'failed_count': BatchJob.failed_count + counts['failed'],
+            'updated_at': now
+        }, synchronize_session=False)
+        db.session.commit()
+    
+    @staticmethod
+    def _get_status(job_id: int) -> Optional[str]:
+        """读取数据库中的任务状态，其他worker可能已将其暂停或取消"""
+        return db.session.query(BatchJob.status).filter_by(id=job_id).scalar()
+    
+    @staticmethod
+    def _load_keys(provider: str) -> List[BatchKey]:
+        """
+        读取提供商的活跃密钥并刷新限流器中的配额
+        
+        Raises:
+            ValueError: 没有配置活跃密钥
+        """
+        keys = []
+        for record in ApiKey.query.filter_by(model_provider=provider, is_active=True).order_by(ApiKey.id).all():
+            if record.api_key:
+                rate_limiter.set_limits(record.api_key, record.rpm_limit, record.tpm_limit)
+                keys.append(BatchKey(record.api_key, record.base_url, record.weight))
+        if not keys:
+            raise ValueError(f"请先在API密钥管理中配置 {provider} 平台的API密钥。")
+        return keys
+    
+    def _get_native_client(self, provider: str):
+        """原生批处理绑定在创建它的密钥上，固定使用提供商的第一个活跃密钥"""
+        key = self._load_keys(provider)[0]
+        return AIClientFactory.get_client(provider, key.api_key, key.base_url)
+
+# 进程内共享的批处理任务执行器
+batch_manager = BatchManager()
\ No newline at end of file